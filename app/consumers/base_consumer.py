@@ -1,7 +1,17 @@
+import time
 from abc import ABC, abstractmethod
+from typing import Any
 
 
 class BaseConsumer(ABC):
+    # Shared memory value set by the worker supervisor, consumers running in
+    # a supervised worker process refresh it on every loop iteration
+    heartbeat_value: Any = None
+
+    def heartbeat(self) -> None:
+        if self.heartbeat_value is not None:
+            self.heartbeat_value.value = time.time()
+
     @abstractmethod
     def start(self) -> None:
         pass
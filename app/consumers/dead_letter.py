@@ -0,0 +1,279 @@
+import base64
+import heapq
+import itertools
+import json
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable
+
+from confluent_kafka import Message, Producer
+from core.config import settings
+from core.consts import consts
+from core.metrics import metrics
+from core.retry import BackoffPolicy
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class DeadLetter:
+    topic: str
+    partition: int
+    offset: int
+    value: bytes | None
+    error: str
+    attempts: int
+    timestamp: float
+
+    @classmethod
+    def from_message(
+        cls, msg: Message, error: Exception, attempts: int
+    ) -> "DeadLetter":
+        return cls(
+            topic=msg.topic(),
+            partition=msg.partition(),
+            offset=msg.offset(),
+            value=msg.value(),
+            error=str(error) or type(error).__name__,
+            attempts=attempts,
+            timestamp=time.time(),
+        )
+
+    def to_json(self) -> str:
+        entry = asdict(self)
+        # Tombstones have no value, it is kept as null
+        if self.value is not None:
+            entry["value"] = base64.b64encode(self.value).decode()
+        return json.dumps(entry)
+
+    @classmethod
+    def from_json(cls, line: str) -> "DeadLetter":
+        entry = json.loads(line)
+        if entry["value"] is not None:
+            entry["value"] = base64.b64decode(entry["value"])
+        return cls(**entry)
+
+
+class DeadLetterSink(ABC):
+    @abstractmethod
+    def write(self, letter: DeadLetter) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class FileDeadLetterSink(DeadLetterSink):
+    """Appends the dead letters to a file, one JSON document per line"""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def write(self, letter: DeadLetter) -> None:
+        line = letter.to_json() + "\n"
+        with self._lock, self.path.open("a", encoding="utf-8") as file:
+            file.write(line)
+
+
+class KafkaDeadLetterSink(DeadLetterSink):
+    """Produces the dead letters to a topic of the local Kafka cluster"""
+
+    def __init__(self, topic: str) -> None:
+        self.topic = topic
+        self.producer = Producer(
+            {
+                "client.id": consts.KAFKA_CONSUMER_CLIENT_ID,
+                "bootstrap.servers": settings.KAFKA_CONSUMER_BOOTSTRAP_SERVERS,
+            }
+        )
+
+    def write(self, letter: DeadLetter) -> None:
+        self.producer.produce(
+            self.topic,
+            value=letter.to_json().encode(),
+            key=f"{letter.topic}:{letter.partition}:{letter.offset}".encode(),
+        )
+        self.producer.poll(0)
+
+    def close(self) -> None:
+        remaining = self.producer.flush(settings.SHUTDOWN_GRACE_PERIOD_SECONDS)
+        if remaining:
+            logger.error("%d dead letters were not delivered to Kafka", remaining)
+
+
+def create_dead_letter_sink() -> DeadLetterSink | None:
+    if settings.DEAD_LETTER_SINK == "FILE":
+        return FileDeadLetterSink(settings.DEAD_LETTER_FILE_PATH)
+    if settings.DEAD_LETTER_SINK == "KAFKA":
+        return KafkaDeadLetterSink(settings.DEAD_LETTER_TOPIC)
+    return None
+
+
+@dataclass(order=True)
+class _PendingRetry:
+    due_at: float
+    sequence: int
+    msg: Message
+    error: Exception
+    attempts: int
+
+
+class FailedMessageHandler:
+    """Retries the messages that failed processing, then dead-letters them.
+
+    Retries wait for their backoff on a background thread so a message that
+    keeps failing doesn't hold the poll loop. Malformed messages, which fail
+    with a `ValueError`, are dead-lettered without retrying. At most
+    `max_pending` retries wait at a time, failures beyond that and the
+    retries still waiting at shutdown are dead-lettered right away.
+    """
+
+    def __init__(
+        self,
+        msg_process: Callable[[Message], None],
+        sink: DeadLetterSink | None,
+        max_retries: int,
+        backoff: BackoffPolicy,
+        max_pending: int,
+    ) -> None:
+        self.msg_process = msg_process
+        self.sink = sink
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_pending = max_pending
+        self._pending: list[_PendingRetry] = []
+        self._sequence = itertools.count()
+        self._changed = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(
+            target=self._run, name="kafka-retries", daemon=True
+        )
+
+    @classmethod
+    def from_settings(
+        cls, msg_process: Callable[[Message], None]
+    ) -> "FailedMessageHandler":
+        return cls(
+            msg_process,
+            create_dead_letter_sink(),
+            settings.KAFKA_CONSUMER_MAX_RETRIES,
+            BackoffPolicy(
+                initial_seconds=settings.KAFKA_CONSUMER_RETRY_INITIAL_BACKOFF_SECONDS,
+                max_seconds=settings.KAFKA_CONSUMER_RETRY_MAX_BACKOFF_SECONDS,
+                factor=2.0,
+                jitter_factor=0.1,
+            ),
+            settings.KAFKA_CONSUMER_MAX_PENDING_RETRIES,
+        )
+
+    def start(self) -> None:
+        if self.max_retries > 0:
+            self._thread.start()
+
+    def stop(self) -> None:
+        with self._changed:
+            self._stopped = True
+            pending, self._pending = self._pending, []
+            self._changed.notify_all()
+        if self._thread.is_alive():
+            self._thread.join()
+        for retry in sorted(pending):
+            self._dead_letter(retry.msg, retry.error, retry.attempts)
+        if self.sink is not None:
+            self.sink.close()
+
+    def handle(self, msg: Message, error: Exception, attempts: int = 1) -> None:
+        """Handle a message whose processing failed `attempts` times"""
+        if isinstance(error, ValueError) or attempts > self.max_retries:
+            self._dead_letter(msg, error, attempts)
+            return
+
+        with self._changed:
+            if not self._stopped and len(self._pending) < self.max_pending:
+                heapq.heappush(
+                    self._pending,
+                    _PendingRetry(
+                        time.monotonic() + self.backoff.delay(attempts - 1),
+                        next(self._sequence),
+                        msg,
+                        error,
+                        attempts,
+                    ),
+                )
+                metrics.set("kafka_consumer.pending_retries", len(self._pending))
+                self._changed.notify_all()
+                return
+        self._dead_letter(msg, error, attempts)
+
+    def _next_due(self) -> _PendingRetry | None:
+        with self._changed:
+            while not self._stopped:
+                if self._pending:
+                    remaining = self._pending[0].due_at - time.monotonic()
+                    if remaining <= 0:
+                        retry = heapq.heappop(self._pending)
+                        metrics.set(
+                            "kafka_consumer.pending_retries", len(self._pending)
+                        )
+                        return retry
+                    self._changed.wait(remaining)
+                else:
+                    self._changed.wait()
+            return None
+
+    def _run(self) -> None:
+        while (retry := self._next_due()) is not None:
+            metrics.increment("kafka_consumer.retries")
+            try:
+                self.msg_process(retry.msg)
+            except Exception as error:
+                logger.warning(
+                    "Retry %d failed for message from topic %s, partition %d, "
+                    "offset %d: %s",
+                    retry.attempts,
+                    retry.msg.topic(),
+                    retry.msg.partition(),
+                    retry.msg.offset(),
+                    str(error),
+                )
+                self.handle(retry.msg, error, retry.attempts + 1)
+
+    def _dead_letter(self, msg: Message, error: Exception, attempts: int) -> None:
+        if self.sink is None:
+            if self.max_retries > 0:
+                logger.error(
+                    "Giving up on message from topic %s, partition %d, offset %d "
+                    "after %d attempts: %s",
+                    msg.topic(),
+                    msg.partition(),
+                    msg.offset(),
+                    attempts,
+                    str(error),
+                )
+            return
+        metrics.increment("kafka_consumer.dead_letters")
+        try:
+            self.sink.write(DeadLetter.from_message(msg, error, attempts))
+            logger.warning(
+                "Dead-lettered message from topic %s, partition %d, offset %d "
+                "after %d attempts",
+                msg.topic(),
+                msg.partition(),
+                msg.offset(),
+                attempts,
+            )
+        except Exception as sink_error:
+            logger.error(
+                "Failed to dead-letter message from topic %s, partition %d, "
+                "offset %d: %s",
+                msg.topic(),
+                msg.partition(),
+                msg.offset(),
+                str(sink_error),
+            )
@@ -0,0 +1,207 @@
+import base64
+import json
+import logging
+import signal
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, cast
+
+from confluent_kafka import TIMESTAMP_NOT_AVAILABLE, Message
+from consumers.base_consumer import BaseConsumer
+from core.config import settings
+from core.shutdown import shutdown_coordinator
+
+logging.basicConfig(level=settings.LOG_LEVEL)
+logger = logging.getLogger(__name__)
+
+
+class RecordedMessage:
+    """A recorded Kafka message, shaped like the messages the consumer polls"""
+
+    def __init__(
+        self, topic: str, partition: int, offset: int, value: bytes | None
+    ) -> None:
+        self._topic = topic
+        self._partition = partition
+        self._offset = offset
+        self._value = value
+
+    def topic(self) -> str:
+        return self._topic
+
+    def partition(self) -> int:
+        return self._partition
+
+    def offset(self) -> int:
+        return self._offset
+
+    def value(self) -> bytes | None:
+        return self._value
+
+    def error(self) -> None:
+        return None
+
+    def timestamp(self) -> tuple[int, int]:
+        return TIMESTAMP_NOT_AVAILABLE, 0
+
+
+def _topic_of(value: Any) -> str:
+    if isinstance(value, dict) and "changelogDestination" in value:
+        return settings.KAFKA_CHANGE_LOG_TOPIC
+    return settings.KAFKA_RUNS_TOPIC
+
+
+def parse_recorded_message(line: bytes, offset: int) -> RecordedMessage:
+    """Parse a recorded message.
+
+    A line is either the message value itself or an entry with the `topic`,
+    `partition`, `offset` and base64 encoded `value` of the message, the
+    format of the dead letters.
+    """
+    document = json.loads(line)
+    if isinstance(document, dict) and isinstance(document.get("value"), str):
+        return RecordedMessage(
+            document.get("topic") or settings.KAFKA_RUNS_TOPIC,
+            document.get("partition", 0),
+            document.get("offset", offset),
+            base64.b64decode(document["value"]),
+        )
+    # The line is kept as is, it holds the bytes Port signed
+    return RecordedMessage(_topic_of(document), 0, offset, line)
+
+
+def read_recorded_messages(path: Path) -> Iterator[RecordedMessage | None]:
+    """The messages of a JSON lines file or of every file of a directory.
+
+    A `.json` file holds a single message. Invalid messages are logged and
+    come as `None`.
+    """
+    paths = [path]
+    if path.is_dir():
+        paths = sorted(child for child in path.iterdir() if child.is_file())
+
+    offset = 0
+    for file_path in paths:
+        with file_path.open("rb") as file:
+            lines: Iterable[bytes]
+            if file_path.suffix == ".json":
+                # A single captured message, possibly spread over lines
+                lines = [file.read().strip()]
+            else:
+                lines = (line.rstrip(b"\r\n") for line in file)
+            for line in lines:
+                if not line.strip():
+                    continue
+                try:
+                    yield parse_recorded_message(line, offset)
+                except ValueError as error:
+                    logger.error(
+                        "Skipping invalid recorded message %d of %s: %s",
+                        offset,
+                        file_path,
+                        str(error),
+                    )
+                    yield None
+                offset += 1
+
+
+@dataclass
+class ReplayStats:
+    processed: int = 0
+    failed: int = 0
+    elapsed_seconds: float = 0
+    durations: list[float] = field(default_factory=list)
+
+    def percentile(self, percent: float) -> float:
+        if not self.durations:
+            return 0
+        ordered = sorted(self.durations)
+        return ordered[min(int(len(ordered) * percent / 100), len(ordered) - 1)]
+
+    def log(self) -> None:
+        throughput = (
+            self.processed / self.elapsed_seconds if self.elapsed_seconds else 0
+        )
+        logger.info(
+            "Replayed %d messages (%d failed) in %.3f seconds, %.1f messages per"
+            " second - processing time p50: %.1fms, p95: %.1fms, p99: %.1fms,"
+            " max: %.1fms",
+            self.processed,
+            self.failed,
+            self.elapsed_seconds,
+            throughput,
+            self.percentile(50) * 1000,
+            self.percentile(95) * 1000,
+            self.percentile(99) * 1000,
+            max(self.durations, default=0) * 1000,
+        )
+
+
+class FileConsumer(BaseConsumer):
+    """Feeds recorded Kafka messages to the message processing.
+
+    The messages are read from a JSON lines file or from every file of a
+    directory, a `.json` file holding a single message. They are processed
+    one by one, as fast as possible or at the given rate.
+    """
+
+    def __init__(
+        self,
+        msg_process: Callable[[Message], None],
+        path: Path,
+        rate_per_second: float = 0,
+    ) -> None:
+        self.running = False
+        self.msg_process = msg_process
+        self.path = path
+        self.rate_per_second = rate_per_second
+        self.stats = ReplayStats()
+
+        signal.signal(signal.SIGINT, self.exit_gracefully)
+        signal.signal(signal.SIGTERM, self.exit_gracefully)
+
+    def _messages(self) -> Iterator[RecordedMessage]:
+        for msg in read_recorded_messages(self.path):
+            if msg is None:
+                self.stats.failed += 1
+            else:
+                yield msg
+
+    def start(self) -> None:
+        self.running = True
+        interval = 1 / self.rate_per_second if self.rate_per_second > 0 else 0
+        started_at = time.monotonic()
+        try:
+            for index, msg in enumerate(self._messages()):
+                if not self.running:
+                    break
+                self.heartbeat()
+                if interval:
+                    delay = started_at + index * interval - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+
+                processing_started_at = time.monotonic()
+                try:
+                    self.msg_process(cast(Message, msg))
+                except Exception as process_error:
+                    logger.error(
+                        "Failed process message from topic %s, partition %d, "
+                        "offset %d: %s",
+                        msg.topic(),
+                        msg.partition(),
+                        msg.offset(),
+                        str(process_error),
+                    )
+                    self.stats.failed += 1
+                self.stats.durations.append(time.monotonic() - processing_started_at)
+                self.stats.processed += 1
+        finally:
+            shutdown_coordinator.drain()
+            self.stats.elapsed_seconds = time.monotonic() - started_at
+            self.stats.log()
+
+    def exit_gracefully(self, *_: Any) -> None:
+        logger.info("Exiting gracefully...")
+        self.running = False
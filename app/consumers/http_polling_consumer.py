@@ -7,6 +7,8 @@ from typing import Any, Callable
 
 from consumers.base_consumer import BaseConsumer
 from core.config import settings
+from core.shutdown import shutdown_coordinator
+from core.tracing import tracer
 from port_client import (
     ack_runs,
     ack_wf_node_run,
@@ -28,6 +30,8 @@ class _RunConfig:
     ack_fn: Callable[[str], Any]
     process_fn: Callable[[dict], None]
     report_failure_fn: Callable[[str], None]
+    # Processes the whole batch and returns an error or None for each run
+    process_batch_fn: Callable[[list[dict]], list[Exception | None]] | None = None
 
 
 class HttpPollingConsumer(BaseConsumer):
@@ -35,10 +39,16 @@ class HttpPollingConsumer(BaseConsumer):
         self,
         msg_process: Callable[[dict], None],
         wf_node_run_process: Callable[[dict], None] | None = None,
+        runs_process: Callable[[list[dict]], list[Exception | None]] | None = None,
+        wf_node_runs_process: (
+            Callable[[list[dict]], list[Exception | None]] | None
+        ) = None,
     ) -> None:
         self.running = False
         self.msg_process = msg_process
         self.wf_node_run_process = wf_node_run_process
+        self.runs_process = runs_process
+        self.wf_node_runs_process = wf_node_runs_process
         self.backoff_seconds = 0
         self.max_backoff = settings.POLLING_MAX_BACKOFF_SECONDS
         self.initial_backoff = settings.POLLING_INITIAL_BACKOFF_SECONDS
@@ -95,6 +105,7 @@ class HttpPollingConsumer(BaseConsumer):
                 claim_fn=claim_pending_runs,
                 ack_fn=lambda run_id: ack_runs([run_id]),
                 process_fn=self.msg_process,
+                process_batch_fn=self.runs_process,
                 report_failure_fn=lambda run_id: report_run_status(
                     run_id,
                     {
@@ -112,6 +123,7 @@ class HttpPollingConsumer(BaseConsumer):
                     claim_fn=claim_pending_wf_node_runs,
                     ack_fn=ack_wf_node_run,
                     process_fn=self.wf_node_run_process,
+                    process_batch_fn=self.wf_node_runs_process,
                     report_failure_fn=lambda run_id: report_wf_node_run_status(
                         run_id,
                         {"status": "COMPLETED", "result": "FAILED"},
@@ -123,50 +135,56 @@ class HttpPollingConsumer(BaseConsumer):
     def _poll_runs(self, config: _RunConfig) -> int:
         if settings.DETAILED_LOGGING:
             logger.info("Polling for pending %ss...", config.label)
-        runs = config.claim_fn(limit=settings.POLLING_RUNS_BATCH_SIZE)
+        with tracer.span("polling.claim", {"polling.kind": config.label}) as span:
+            runs = config.claim_fn(limit=settings.POLLING_RUNS_BATCH_SIZE)
+            span.set_attribute("polling.claimed_count", len(runs))
 
         if runs:
             logger.info("Claimed %d pending %ss", len(runs), config.label)
 
-            acked_runs: list[tuple[dict, str]] = []
-            for run in runs:
-                run_id_raw = run.get(config.id_field)
-                if not run_id_raw:
-                    logger.error(
-                        "%s missing %s field: %s",
-                        config.label.capitalize(),
-                        config.id_field,
-                        run,
-                    )
-                    continue
-
-                run_id = str(run_id_raw)
-                try:
-                    if not config.ack_fn(run_id):
-                        logger.warning("Failed to ack %s %s", config.label, run_id)
+            # A trace for the claimed runs, the run of each one is a trace of its
+            # own linked to it
+            with tracer.span("polling.process", {"polling.kind": config.label}):
+                acked_runs: list[tuple[dict, str]] = []
+                for run in runs:
+                    run_id_raw = run.get(config.id_field)
+                    if not run_id_raw:
+                        logger.error(
+                            "%s missing %s field: %s",
+                            config.label.capitalize(),
+                            config.id_field,
+                            run,
+                        )
                         continue
-                    logger.info("Acked %s %s", config.label, run_id)
-                    acked_runs.append((run, run_id))
-                except Exception as ack_error:
-                    logger.error(
-                        "Failed to ack %s %s: %s",
-                        config.label,
-                        run_id,
-                        str(ack_error),
-                        exc_info=True,
-                    )
 
-            for run, run_id in acked_runs:
-                try:
-                    logger.info("Processing %s %s", config.label, run_id)
-                    config.process_fn(run)
-                except Exception as process_error:
+                    run_id = str(run_id_raw)
+                    try:
+                        with tracer.span("polling.ack", {"run.id": run_id}):
+                            acked = config.ack_fn(run_id)
+                        if not acked:
+                            logger.warning("Failed to ack %s %s", config.label, run_id)
+                            continue
+                        logger.info("Acked %s %s", config.label, run_id)
+                        acked_runs.append((run, run_id))
+                    except Exception as ack_error:
+                        logger.error(
+                            "Failed to ack %s %s: %s",
+                            config.label,
+                            run_id,
+                            str(ack_error),
+                            exc_info=True,
+                        )
+
+                errors = self._process_runs(config, acked_runs)
+                for (run, run_id), process_error in zip(acked_runs, errors):
+                    if process_error is None:
+                        continue
                     logger.error(
                         "Failed to process %s %s: %s",
                         config.label,
                         run_id,
                         str(process_error),
-                        exc_info=True,
+                        exc_info=process_error,
                     )
                     try:
                         config.report_failure_fn(run_id)
@@ -182,11 +200,34 @@ class HttpPollingConsumer(BaseConsumer):
 
         return len(runs)
 
+    @staticmethod
+    def _process_runs(
+        config: _RunConfig, acked_runs: list[tuple[dict, str]]
+    ) -> list[Exception | None]:
+        if not acked_runs:
+            return []
+        if config.process_batch_fn is not None:
+            try:
+                return config.process_batch_fn([run for run, _ in acked_runs])
+            except Exception as error:
+                return [error] * len(acked_runs)
+
+        errors: list[Exception | None] = []
+        for run, run_id in acked_runs:
+            try:
+                logger.info("Processing %s %s", config.label, run_id)
+                config.process_fn(run)
+                errors.append(None)
+            except Exception as process_error:
+                errors.append(process_error)
+        return errors
+
     def start(self) -> None:
         self.running = True
         run_configs = self._build_run_configs()
 
         while self.running:
+            self.heartbeat()
             has_more = False
             errored = False
             for config in run_configs:
@@ -210,6 +251,8 @@ class HttpPollingConsumer(BaseConsumer):
             if not has_more and self.running:
                 time.sleep(settings.POLLING_INTERVAL_SECONDS)
 
+        shutdown_coordinator.drain()
+
     def exit_gracefully(self, *_: Any) -> None:
         logger.info("Exiting gracefully...")
         self.running = False
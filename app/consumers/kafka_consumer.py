@@ -1,26 +1,135 @@
 import logging
 import signal
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from typing import Any, Callable
 
-from confluent_kafka import Consumer, KafkaException, Message
+from confluent_kafka import (
+    TIMESTAMP_NOT_AVAILABLE,
+    Consumer,
+    KafkaError,
+    KafkaException,
+    Message,
+    TopicPartition,
+)
 from consumers.base_consumer import BaseConsumer
+from consumers.dead_letter import FailedMessageHandler
+from consumers.kafka_stats import KafkaStatsCollector
 from core.config import settings
 from core.consts import consts
+from core.metrics import MetricsReporter, metrics
+from core.shutdown import shutdown_coordinator
+from core.tracing import tracer
 from port_client import get_kafka_credentials
 
 logging.basicConfig(level=settings.LOG_LEVEL)
 logger = logging.getLogger(__name__)
 
 
+def _masked_config(conf: dict[str, Any]) -> dict[str, Any]:
+    return {
+        key: "****" if "password" in key or "secret" in key else value
+        for key, value in conf.items()
+    }
+
+
+class _OffsetTracker:
+    """Offsets of the messages handed to the workers, per partition.
+
+    Workers finish out of order, only the offsets before the first unfinished
+    message of a partition are safe to commit.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._started: dict[tuple[str, int], deque[int]] = {}
+        self._finished: dict[tuple[str, int], set[int]] = {}
+        self._generations: dict[tuple[str, int], int] = {}
+        self._in_flight = 0
+
+    @property
+    def in_flight(self) -> int:
+        with self._lock:
+            return self._in_flight
+
+    def start(self, msg: Message) -> int:
+        """Track the message, returns the generation of its partition"""
+        with self._lock:
+            key = (msg.topic(), msg.partition())
+            self._started.setdefault(key, deque()).append(msg.offset())
+            self._in_flight += 1
+            return self._generations.get(key, 0)
+
+    def finish(self, msg: Message, generation: int) -> None:
+        """Mark the message done, ignored if its partition was revoked since"""
+        with self._lock:
+            self._mark_finished(msg, generation)
+            self._in_flight -= 1
+
+    def settle(self, msg: Message, generation: int) -> None:
+        """Let the message be committed while it is still in flight"""
+        with self._lock:
+            self._mark_finished(msg, generation)
+
+    def _mark_finished(self, msg: Message, generation: int) -> None:
+        key = (msg.topic(), msg.partition())
+        started = self._started.get(key)
+        # A settled message may have been committed before it finishes
+        if (
+            started
+            and msg.offset() >= started[0]
+            and generation == self._generations.get(key, 0)
+        ):
+            self._finished.setdefault(key, set()).add(msg.offset())
+
+    def committable(self) -> list[TopicPartition]:
+        """The offsets to commit, each partition is returned once per advance"""
+        offsets = []
+        with self._lock:
+            for (topic, partition), started in self._started.items():
+                finished = self._finished.get((topic, partition), set())
+                last = None
+                while started and started[0] in finished:
+                    last = started.popleft()
+                    finished.discard(last)
+                if last is not None:
+                    offsets.append(TopicPartition(topic, partition, last + 1))
+        return offsets
+
+    def forget(self, partitions: list[TopicPartition]) -> None:
+        with self._lock:
+            for tp in partitions:
+                key = (tp.topic, tp.partition)
+                self._started.pop(key, None)
+                self._finished.pop(key, None)
+                # The messages started before finish under the old generation
+                # even if the partition is assigned again
+                self._generations[key] = self._generations.get(key, 0) + 1
+
+
 class KafkaConsumer(BaseConsumer):
     def __init__(
-        self, msg_process: Callable[[Message], None], consumer: Consumer = None
+        self,
+        msg_process: Callable[[Message], None],
+        consumer: Consumer = None,
+        kafka_credentials: tuple[list[str], str, str] | None = None,
+        msg_process_batch: (
+            Callable[[list[Message]], list[tuple[Message, Exception]]] | None
+        ) = None,
     ) -> None:
         self.running = False
         signal.signal(signal.SIGINT, self.exit_gracefully)
         signal.signal(signal.SIGTERM, self.exit_gracefully)
 
         self.msg_process = msg_process
+        self.msg_process_batch = msg_process_batch
+        self._offsets: _OffsetTracker | None = None
+        self._paused = False
+        self._stats_collector: KafkaStatsCollector | None = None
+        self._failures = FailedMessageHandler.from_settings(msg_process)
 
         if consumer:
             self.consumer = consumer
@@ -38,17 +147,35 @@ class KafkaConsumer(BaseConsumer):
                 logger.info("Using local Port instance for Kafka credentials")
                 conf["bootstrap.servers"] = settings.KAFKA_CONSUMER_BOOTSTRAP_SERVERS
             else:
-                logger.info("Getting Kafka credentials")
-                brokers, username, password = get_kafka_credentials()
+                if kafka_credentials is None:
+                    logger.info("Getting Kafka credentials")
+                    kafka_credentials = get_kafka_credentials()
+                brokers, username, password = kafka_credentials
                 conf["sasl.username"] = username
                 conf["sasl.password"] = password
                 conf["bootstrap.servers"] = ",".join(brokers)
 
+            if settings.KAFKA_CONSUMER_PRESET:
+                conf.update(
+                    consts.KAFKA_CONSUMER_CONFIG_PRESETS[settings.KAFKA_CONSUMER_PRESET]
+                )
+            conf.update(settings.KAFKA_CONSUMER_EXTRA_CONFIG)
+            logger.info("Kafka consumer config: %s", _masked_config(conf))
+
+            if settings.KAFKA_CONSUMER_STATISTICS_INTERVAL_MS > 0:
+                self._stats_collector = KafkaStatsCollector(metrics)
+                conf["statistics.interval.ms"] = (
+                    settings.KAFKA_CONSUMER_STATISTICS_INTERVAL_MS
+                )
+                conf["stats_cb"] = self._stats_collector
+
             self.consumer = Consumer(conf)
 
     def _on_assign(self, consumer: Consumer, partitions: Any) -> None:
         logger.info("Assignment: %s", partitions)
-        if not partitions:
+        # With cooperative rebalancing only the added partitions are passed, a
+        # rebalance that adds none leaves the current assignment in place
+        if not partitions and not consumer.assignment():
             logger.error(
                 "No partitions assigned. This usually means that there is"
                 " already a consumer with the same group id running. To run"
@@ -57,8 +184,28 @@ class KafkaConsumer(BaseConsumer):
                 " value prefixed with your organization id."
             )
             self.exit_gracefully()
+        elif self._paused:
+            # Partitions assigned while the workers are saturated wait as well
+            consumer.pause(partitions)
+            self._update_paused_metrics()
+
+    def _on_revoke(self, consumer: Consumer, partitions: Any) -> None:
+        if self._offsets is None:
+            return
+        self._commit_finished(self._offsets)
+        # The unfinished messages of the revoked partitions will be consumed
+        # again by their new owner
+        self._offsets.forget(partitions)
 
     def start(self) -> None:
+        executor: ThreadPoolExecutor | None = None
+        reporter: MetricsReporter | None = None
+        if settings.METRICS_LOG_INTERVAL_SECONDS > 0:
+            reporter = MetricsReporter(metrics, settings.METRICS_LOG_INTERVAL_SECONDS)
+            reporter.start()
+        if self._stats_collector is not None:
+            self._stats_collector.start()
+        self._failures.start()
         try:
             self.consumer.subscribe(
                 [
@@ -66,40 +213,214 @@ class KafkaConsumer(BaseConsumer):
                     settings.KAFKA_CHANGE_LOG_TOPIC,
                 ],
                 on_assign=self._on_assign,
+                on_revoke=self._on_revoke,
             )
             self.running = True
+            if settings.KAFKA_CONSUMER_MAX_IN_FLIGHT_MESSAGES > 0:
+                self._offsets = _OffsetTracker()
+                executor = ThreadPoolExecutor(
+                    max(settings.WEBHOOK_INVOKER_MAX_CONCURRENCY, 1),
+                    thread_name_prefix="kafka-consumer",
+                )
+            msg_process_batch = (
+                self.msg_process_batch
+                if settings.KAFKA_CONSUMER_BATCH_SIZE > 1
+                else None
+            )
             while self.running:
-                try:
-                    msg = self.consumer.poll(timeout=1.0)
-                    if msg is None:
-                        continue
-                    if msg.error():
-                        raise KafkaException(msg.error())
-                    else:
-                        try:
-                            logger.info(
-                                "Process message"
-                                " from topic %s, partition %d, offset %d",
-                                msg.topic(),
-                                msg.partition(),
-                                msg.offset(),
-                            )
-                            self.msg_process(msg)
-                        except Exception as process_error:
-                            logger.error(
-                                "Failed process message"
-                                " from topic %s, partition %d, offset %d: %s",
-                                msg.topic(),
-                                msg.partition(),
-                                msg.offset(),
-                                str(process_error),
-                            )
-                        finally:
-                            self.consumer.commit(asynchronous=False)
-                except Exception as message_error:
-                    logger.error(str(message_error))
+                self.heartbeat()
+                if executor is not None and self._offsets is not None:
+                    self._poll_concurrently(executor, self._offsets)
+                elif msg_process_batch is not None:
+                    self._consume_batch(msg_process_batch)
+                else:
+                    self._poll_message()
         finally:
+            if executor is not None:
+                # Queued messages are left uncommitted and consumed again
+                executor.shutdown(wait=False, cancel_futures=True)
+            shutdown_coordinator.drain()
+            if self._offsets is not None:
+                self._commit_finished(self._offsets)
+            else:
+                self._commit_final_offsets()
+            self._failures.stop()
             self.consumer.close()
+            if self._stats_collector is not None:
+                self._stats_collector.stop()
+            if reporter is not None:
+                reporter.stop()
+
+    @staticmethod
+    def _span_attributes(msg: Message) -> dict[str, Any]:
+        return {
+            "messaging.destination.name": msg.topic(),
+            "messaging.kafka.partition": msg.partition(),
+            "messaging.kafka.offset": msg.offset(),
+        }
+
+    def _process_message(self, msg: Message) -> None:
+        try:
+            logger.info(
+                "Process message from topic %s, partition %d, offset %d",
+                msg.topic(),
+                msg.partition(),
+                msg.offset(),
+            )
+            self.msg_process(msg)
+        except Exception as process_error:
+            logger.error(
+                "Failed process message from topic %s, partition %d, offset %d: %s",
+                msg.topic(),
+                msg.partition(),
+                msg.offset(),
+                str(process_error),
+            )
+            self._failures.handle(msg, process_error)
+        finally:
+            self._record_processed(msg)
+
+    def _record_processed(self, msg: Message) -> None:
+        metrics.increment("kafka_consumer.processed_messages")
+        timestamp_type, timestamp = msg.timestamp()
+        if timestamp_type != TIMESTAMP_NOT_AVAILABLE:
+            # End to end, from the time the message was produced
+            metrics.observe("kafka_consumer.latency_ms", time.time() * 1000 - timestamp)
+
+    def _poll_message(self) -> None:
+        try:
+            msg = self.consumer.poll(timeout=1.0)
+            if msg is None:
+                return
+            if msg.error():
+                raise KafkaException(msg.error())
+            else:
+                with tracer.span("kafka.receive", self._span_attributes(msg)):
+                    try:
+                        self._process_message(msg)
+                    finally:
+                        with tracer.span("kafka.commit"):
+                            self.consumer.commit(asynchronous=False)
+        except Exception as message_error:
+            logger.error(str(message_error))
+
+    def _poll_concurrently(
+        self, executor: ThreadPoolExecutor, offsets: _OffsetTracker
+    ) -> None:
+        """Hand the polled message to the workers without waiting for it.
+
+        Polling goes on while the partitions are paused so the consumer stays
+        in the group, it just returns no messages until they are resumed.
+        """
+        try:
+            self._commit_finished(offsets)
+            self._apply_backpressure(offsets)
+            msg = self.consumer.poll(timeout=1.0)
+            if msg is None:
+                return
+            if msg.error():
+                raise KafkaException(msg.error())
+
+            generation = offsets.start(msg)
+            executor.submit(self._process_in_worker, msg, offsets, generation)
+            self._apply_backpressure(offsets)
+        except Exception as message_error:
+            logger.error(str(message_error))
+
+    def _process_in_worker(
+        self, msg: Message, offsets: _OffsetTracker, generation: int
+    ) -> None:
+        try:
+            # A run reported as failed on shutdown is committed rather than
+            # invoked again after the restart
+            with tracer.span(
+                "kafka.receive", self._span_attributes(msg)
+            ), shutdown_coordinator.on_failure_reported(
+                partial(offsets.settle, msg, generation)
+            ):
+                self._process_message(msg)
+        finally:
+            offsets.finish(msg, generation)
+
+    def _apply_backpressure(self, offsets: _OffsetTracker) -> None:
+        in_flight = offsets.in_flight
+        metrics.set("kafka_consumer.in_flight_messages", in_flight)
+        if not self._paused and (
+            in_flight >= settings.KAFKA_CONSUMER_MAX_IN_FLIGHT_MESSAGES
+        ):
+            self.consumer.pause(self.consumer.assignment())
+            self._paused = True
+            metrics.increment("kafka_consumer.pauses")
+            logger.info("Pausing partitions, %d messages in flight", in_flight)
+        elif self._paused and (
+            in_flight <= settings.KAFKA_CONSUMER_RESUME_IN_FLIGHT_MESSAGES
+        ):
+            self.consumer.resume(self.consumer.assignment())
+            self._paused = False
+            logger.info("Resuming partitions, %d messages in flight", in_flight)
+        else:
+            return
+        self._update_paused_metrics()
+
+    def _update_paused_metrics(self) -> None:
+        paused = len(self.consumer.assignment()) if self._paused else 0
+        metrics.set("kafka_consumer.paused_partitions", paused)
+
+    def _commit_finished(self, offsets: _OffsetTracker) -> None:
+        committable = offsets.committable()
+        if committable:
+            with tracer.span("kafka.commit"):
+                self.consumer.commit(offsets=committable, asynchronous=False)
+
+    def _consume_batch(
+        self,
+        msg_process_batch: Callable[[list[Message]], list[tuple[Message, Exception]]],
+    ) -> None:
+        try:
+            msgs = self.consumer.consume(
+                num_messages=settings.KAFKA_CONSUMER_BATCH_SIZE,
+                timeout=settings.KAFKA_CONSUMER_BATCH_MAX_WAIT_SECONDS,
+            )
+            if not msgs:
+                return
+
+            batch: list[Message] = []
+            for msg in msgs:
+                if msg.error():
+                    logger.error(str(KafkaException(msg.error())))
+                else:
+                    batch.append(msg)
+            with tracer.span(
+                "kafka.receive_batch", {"messaging.batch.message_count": len(batch)}
+            ):
+                try:
+                    if batch:
+                        logger.info("Process batch of %d messages", len(batch))
+                        for msg, error in msg_process_batch(batch):
+                            self._failures.handle(msg, error)
+                except Exception as process_error:
+                    logger.error(
+                        "Failed process batch of %d messages: %s",
+                        len(batch),
+                        str(process_error),
+                    )
+                    for msg in batch:
+                        self._failures.handle(msg, process_error)
+                finally:
+                    for msg in batch:
+                        self._record_processed(msg)
+                    # A single commit covers the offsets of the whole batch
+                    with tracer.span("kafka.commit"):
+                        self.consumer.commit(asynchronous=False)
+        except Exception as message_error:
+            logger.error(str(message_error))
+
+    def _commit_final_offsets(self) -> None:
+        try:
+            self.consumer.commit(asynchronous=False)
+        except KafkaException as error:
+            if error.args[0].code() != KafkaError._NO_OFFSET:
+                logger.error("Failed to commit final offsets: %s", str(error))
 
     def exit_gracefully(self, *_: Any) -> None:
         logger.info("Exiting gracefully...")
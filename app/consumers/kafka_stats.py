@@ -0,0 +1,87 @@
+import json
+import logging
+import queue
+import threading
+
+from core.metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+
+class KafkaStatsCollector:
+    """Publishes the consumer lag from the librdkafka statistics as metrics.
+
+    librdkafka emits its statistics from `poll` as a JSON document, the
+    callback only hands it over to a background thread so parsing stays off
+    the poll loop. Only the latest document is kept if parsing falls behind.
+    """
+
+    def __init__(self, registry: Metrics) -> None:
+        self.registry = registry
+        self._queue: queue.Queue[str | None] = queue.Queue(maxsize=1)
+        self._thread = threading.Thread(
+            target=self._run, name="kafka-stats", daemon=True
+        )
+        self._published: set[str] = set()
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread.is_alive():
+            # Waits for the pending statistics to be parsed
+            self._queue.put(None)
+            self._thread.join()
+
+    def __call__(self, stats_json: str) -> None:
+        try:
+            self._queue.put_nowait(stats_json)
+        except queue.Full:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(stats_json)
+            except queue.Full:
+                pass
+
+    def _run(self) -> None:
+        while True:
+            stats_json = self._queue.get()
+            if stats_json is None:
+                return
+            try:
+                self.collect(stats_json)
+            except Exception as error:
+                logger.warning("Failed to parse Kafka statistics: %s", str(error))
+
+    def collect(self, stats_json: str) -> None:
+        stats = json.loads(stats_json)
+        published: set[str] = set()
+        total_lag = 0
+        for topic_name, topic in stats.get("topics", {}).items():
+            for partition_id, partition in topic.get("partitions", {}).items():
+                lag = partition.get("consumer_lag", -1)
+                # The -1 partition holds the messages not assigned yet and
+                # partitions without a committed offset have no lag
+                if partition_id == "-1" or lag < 0:
+                    continue
+                labels = f"{topic_name}.{partition_id}"
+                values = {
+                    f"kafka_consumer.lag.{labels}": lag,
+                    f"kafka_consumer.high_watermark.{labels}": partition["hi_offset"],
+                    f"kafka_consumer.committed_offset.{labels}": partition[
+                        "committed_offset"
+                    ],
+                }
+                for name, value in values.items():
+                    self.registry.set(name, value)
+                published.update(values)
+                total_lag += lag
+
+        # Partitions that were revoked since the previous statistics
+        for name in self._published - published:
+            self.registry.remove(name)
+        self._published = published
+        self.registry.set("kafka_consumer.lag", total_lag)
@@ -0,0 +1,53 @@
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class AdminServer:
+    """Serves the admin endpoints from a background thread.
+
+    `POST /profile` starts a profile capture, it answers 409 when one is
+    running already.
+    """
+
+    def __init__(self, host: str, port: int, capture_profile: Callable[[], bool]):
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self) -> None:
+                if self.path != "/profile":
+                    self._reply(404, {"error": "Not found"})
+                elif capture_profile():
+                    self._reply(202, {"status": "capturing"})
+                else:
+                    self._reply(409, {"error": "A profile is being captured"})
+
+            def _reply(self, status: int, body: dict[str, Any]) -> None:
+                content = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                logger.info("Admin request - " + format, *args)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="admin-server", daemon=True
+        )
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self) -> None:
+        logger.info("Admin server listening on port %d", self.port)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
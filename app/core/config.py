@@ -1,12 +1,16 @@
+import importlib.util
 from pathlib import Path
 from typing import Any, Optional
 
+from core.consts import consts
+from core.jq_analysis import referenced_keys_union
 from dotenv import find_dotenv
 from pydantic import (
     AnyHttpUrl,
     BaseModel,
     BaseSettings,
     Field,
+    PrivateAttr,
     parse_file_as,
     parse_obj_as,
     validator,
@@ -19,6 +23,26 @@ class ActionReport(BaseModel):
     summary: str | None = None
     external_run_id: str | None = Field(None, alias="externalRunId")
 
+    _context_keys: frozenset[str] | None = PrivateAttr(None)
+    _template: dict[str, Any] = PrivateAttr(default_factory=dict)
+
+    def __init__(self, **data: Any) -> None:
+        super().__init__(**data)
+        self._template = self.dict(exclude_none=True)
+        # Analyzed once when the config is loaded, so each run only builds the
+        # parts of the report context the expressions actually read
+        self._context_keys = referenced_keys_union(self._template.values())
+
+    @property
+    def context_keys(self) -> frozenset[str] | None:
+        """The report context keys the mapping reads, `None` if it may read all"""
+        return self._context_keys
+
+    @property
+    def template(self) -> dict[str, Any]:
+        """The fields of the report to evaluate, shared so not to be mutated"""
+        return self._template
+
 
 class Mapping(BaseModel):
     enabled: bool | str = True
@@ -30,11 +54,35 @@ class Mapping(BaseModel):
     report: ActionReport | None = None
     fieldsToDecryptPaths: list[str] = []
 
+    _payload_template: dict[str, Any] = PrivateAttr(default_factory=dict)
+
+    def __init__(self, **data: Any) -> None:
+        super().__init__(**data)
+        # Serialized once, the runs only read it
+        self._payload_template = self.dict(
+            exclude_none=True, exclude={"enabled", "report", "fieldsToDecryptPaths"}
+        )
+
+    @property
+    def payload_template(self) -> dict[str, Any]:
+        """The fields of the request to evaluate, shared so not to be mutated"""
+        return self._payload_template
+
 
 class Settings(BaseSettings):
     USING_LOCAL_PORT_INSTANCE: bool = False
     LOG_LEVEL: str = "INFO"
+    # TEXT or JSON, one object per line
+    LOG_FORMAT: str = "TEXT"
+    # Writes the logs from a background thread, the processing threads only
+    # queue the records
+    LOG_ASYNC: bool = True
     DETAILED_LOGGING: bool = True
+    # Characters of a detailed field logged, like a body or a response, longer
+    # values are truncated, 0 for no limit
+    DETAILED_LOGGING_MAX_FIELD_LENGTH: int = 2000
+    # Share of the log events including their detailed field
+    DETAILED_LOGGING_SAMPLE_RATE: float = 1.0
 
     PORT_ORG_ID: str
     PORT_API_BASE_URL: AnyHttpUrl = parse_obj_as(AnyHttpUrl, "https://api.getport.io")
@@ -42,12 +90,68 @@ class Settings(BaseSettings):
     PORT_CLIENT_SECRET: str
     STREAMER_NAME: str = "KAFKA"
 
+    WORKERS_COUNT: int = 1
+    WORKERS_HEALTH_CHECK_INTERVAL_SECONDS: float = 1
+    WORKERS_HEARTBEAT_TIMEOUT_SECONDS: int = 600
+    WORKERS_RESTART_MAX_BACKOFF_SECONDS: int = 60
+    WORKERS_SHUTDOWN_TIMEOUT_SECONDS: int = 30
+
+    SHUTDOWN_GRACE_PERIOD_SECONDS: int = 25
+
+    # Where the spans of the runs are exported, FILE (JSON lines) or HTTP (posted
+    # to a collector), tracing is off when empty
+    TRACING_EXPORTER: str = ""
+    TRACING_FILE_PATH: Path = Path("/tmp/port-agent/traces.jsonl")
+    TRACING_ENDPOINT: str = ""
+    TRACING_EXPORT_TIMEOUT_SECONDS: float = 5
+
+    # Profiles captured on SIGUSR1 or through the admin server, sent to the
+    # workers when there are several
+    PROFILING_DURATION_SECONDS: float = 30
+    PROFILING_SAMPLE_INTERVAL_SECONDS: float = 0.01
+    PROFILING_MEMORY_TRACEBACK_FRAMES: int = 1
+    PROFILING_OUTPUT_DIR: Path = Path("/tmp/port-agent/profiles")
+    # Port of the admin HTTP server, 0 disables it
+    ADMIN_PORT: int = 0
+    ADMIN_HOST: str = "127.0.0.1"
+
+    # Interval of the metrics logs, 0 disables them
+    METRICS_LOG_INTERVAL_SECONDS: float = 60
+
     KAFKA_CONSUMER_SECURITY_PROTOCOL: str = "plaintext"
     KAFKA_CONSUMER_AUTHENTICATION_MECHANISM: str = "none"
     KAFKA_CONSUMER_SESSION_TIMEOUT_MS: int = 45000
     KAFKA_CONSUMER_AUTO_OFFSET_RESET: str = "earliest"
     KAFKA_CONSUMER_GROUP_ID: str = ""
     KAFKA_CONSUMER_BOOTSTRAP_SERVERS: str = ""
+    # Messages fetched per consume call, 1 keeps polling a message at a time.
+    # Can't be used with KAFKA_CONSUMER_MAX_IN_FLIGHT_MESSAGES
+    KAFKA_CONSUMER_BATCH_SIZE: int = 1
+    KAFKA_CONSUMER_BATCH_MAX_WAIT_SECONDS: float = 1.0
+    # Messages handed to the workers and not finished yet above which the
+    # partitions are paused, 0 processes the messages one by one in the poll
+    # loop instead
+    KAFKA_CONSUMER_MAX_IN_FLIGHT_MESSAGES: int = 0
+    # In-flight messages under which the partitions resume, 0 for half the max
+    KAFKA_CONSUMER_RESUME_IN_FLIGHT_MESSAGES: int = 0
+    # One of the presets in `consts.KAFKA_CONSUMER_CONFIG_PRESETS`, the extra
+    # config options take precedence over it
+    KAFKA_CONSUMER_PRESET: str = ""
+    # librdkafka options, as a JSON object, for the tunable options only
+    KAFKA_CONSUMER_EXTRA_CONFIG: dict[str, Any] = {}
+    # librdkafka statistics interval the consumer lag is read from, 0 disables
+    KAFKA_CONSUMER_STATISTICS_INTERVAL_MS: int = 30000
+    # Retries of a message that failed processing before it is dead-lettered,
+    # they run in the background so the poll loop moves on
+    KAFKA_CONSUMER_MAX_RETRIES: int = 0
+    KAFKA_CONSUMER_RETRY_INITIAL_BACKOFF_SECONDS: float = 1
+    KAFKA_CONSUMER_RETRY_MAX_BACKOFF_SECONDS: float = 60
+    KAFKA_CONSUMER_MAX_PENDING_RETRIES: int = 100
+
+    # Where the messages that failed processing are kept, FILE or KAFKA
+    DEAD_LETTER_SINK: str = ""
+    DEAD_LETTER_FILE_PATH: Path = Path("/tmp/port-agent/dead_letters.jsonl")
+    DEAD_LETTER_TOPIC: str = ""
 
     KAFKA_RUNS_TOPIC: str = ""
 
@@ -59,7 +163,49 @@ class Settings(BaseSettings):
     POLLING_BACKOFF_JITTER_FACTOR: float = 0.1
     POLLING_MAX_FAILURE_DURATION_SECONDS: int = 3600
 
+    # Recorded messages replayed by the FILE streamer, a JSON lines file or a
+    # directory of them, at a rate of messages per second (0 for no limit)
+    FILE_STREAMER_PATH: Path = Path("./messages.jsonl")
+    FILE_STREAMER_RATE_PER_SECOND: float = 0
+
+    # Skips the Port API calls made while processing messages, for load tests
+    # against a mock webhook target
+    PORT_API_OFFLINE: bool = False
+    PORT_API_MAX_RETRIES: int = 5
+    PORT_API_RETRY_BUDGET: int = 100
+    PORT_API_RETRY_BUDGET_WINDOW_SECONDS: int = 60
+
     CONTROL_THE_PAYLOAD_CONFIG_PATH: Path = Path("./control_the_payload_config.json")
+    # Runs the jq expressions of the mappings: PYTHON evaluates the plain paths
+    # and literals in Python and the rest with pyjq, PYJQ and JQ (the jq
+    # package, installed separately) run them all
+    JQ_BACKEND: str = "PYTHON"
+
+    @validator("LOG_FORMAT")
+    def validate_log_format(cls, v: str) -> str:
+        if v not in consts.VALID_LOG_FORMATS:
+            raise ValueError(f"LOG_FORMAT must be one of {consts.VALID_LOG_FORMATS}")
+        return v
+
+    @validator("DETAILED_LOGGING_SAMPLE_RATE")
+    def validate_detailed_logging_sample_rate(cls, v: float) -> float:
+        if not 0 <= v <= 1:
+            raise ValueError("DETAILED_LOGGING_SAMPLE_RATE must be between 0 and 1")
+        return v
+
+    @validator("TRACING_EXPORTER")
+    def validate_tracing_exporter(cls, v: str) -> str:
+        if v and v not in consts.VALID_TRACING_EXPORTERS:
+            raise ValueError(
+                f"TRACING_EXPORTER must be one of {consts.VALID_TRACING_EXPORTERS}"
+            )
+        return v
+
+    @validator("TRACING_ENDPOINT", always=True)
+    def validate_tracing_endpoint(cls, v: str, values: dict) -> str:
+        if values.get("TRACING_EXPORTER") == "HTTP" and not v:
+            raise ValueError("TRACING_ENDPOINT must be set when TRACING_EXPORTER=HTTP")
+        return v
 
     @validator("KAFKA_CONSUMER_BOOTSTRAP_SERVERS", always=True)
     def set_kafka_consumer_bootstrap_servers(
@@ -83,6 +229,92 @@ class Settings(BaseSettings):
 
         return ""
 
+    @validator("KAFKA_CONSUMER_MAX_IN_FLIGHT_MESSAGES")
+    def validate_kafka_consumer_max_in_flight_messages(
+        cls, v: int, values: dict
+    ) -> int:
+        if v > 0 and (values.get("KAFKA_CONSUMER_BATCH_SIZE") or 1) > 1:
+            raise ValueError(
+                "KAFKA_CONSUMER_MAX_IN_FLIGHT_MESSAGES and "
+                "KAFKA_CONSUMER_BATCH_SIZE can't be used together"
+            )
+        return v
+
+    @validator("KAFKA_CONSUMER_RESUME_IN_FLIGHT_MESSAGES", always=True)
+    def set_kafka_consumer_resume_in_flight_messages(cls, v: int, values: dict) -> int:
+        max_in_flight = values.get("KAFKA_CONSUMER_MAX_IN_FLIGHT_MESSAGES") or 0
+        if max_in_flight <= 0:
+            return v
+        if not v:
+            return max_in_flight // 2
+        if v >= max_in_flight:
+            raise ValueError(
+                "KAFKA_CONSUMER_RESUME_IN_FLIGHT_MESSAGES must be lower than "
+                "KAFKA_CONSUMER_MAX_IN_FLIGHT_MESSAGES"
+            )
+        return v
+
+    @validator("KAFKA_CONSUMER_PRESET")
+    def validate_kafka_consumer_preset(cls, v: str) -> str:
+        if v and v not in consts.KAFKA_CONSUMER_CONFIG_PRESETS:
+            raise ValueError(
+                "KAFKA_CONSUMER_PRESET must be one of "
+                f"{', '.join(consts.KAFKA_CONSUMER_CONFIG_PRESETS)}"
+            )
+        return v
+
+    @validator("KAFKA_CONSUMER_EXTRA_CONFIG")
+    def validate_kafka_consumer_extra_config(cls, v: dict[str, Any]) -> dict[str, Any]:
+        unsupported = sorted(set(v) - consts.KAFKA_CONSUMER_TUNABLE_CONFIG_KEYS)
+        if unsupported:
+            raise ValueError(
+                "KAFKA_CONSUMER_EXTRA_CONFIG does not support "
+                f"{', '.join(unsupported)}, the supported options are "
+                f"{', '.join(sorted(consts.KAFKA_CONSUMER_TUNABLE_CONFIG_KEYS))}"
+            )
+        invalid = sorted(
+            key
+            for key, value in v.items()
+            if not isinstance(value, (str, int, float, bool))
+        )
+        if invalid:
+            raise ValueError(
+                "KAFKA_CONSUMER_EXTRA_CONFIG values must be strings, numbers or "
+                f"booleans, got another type for {', '.join(invalid)}"
+            )
+        return v
+
+    @validator("DEAD_LETTER_SINK")
+    def validate_dead_letter_sink(cls, v: str) -> str:
+        if v and v not in consts.VALID_DEAD_LETTER_SINKS:
+            raise ValueError(
+                f"DEAD_LETTER_SINK must be one of {consts.VALID_DEAD_LETTER_SINKS}"
+            )
+        return v
+
+    @validator("DEAD_LETTER_TOPIC", always=True)
+    def validate_dead_letter_topic(cls, v: str, values: dict) -> str:
+        if values.get("DEAD_LETTER_SINK") != "KAFKA":
+            return v
+        # Port's brokers only let the agent consume its topics
+        if not values.get("USING_LOCAL_PORT_INSTANCE"):
+            raise ValueError(
+                "DEAD_LETTER_SINK=KAFKA works only with USING_LOCAL_PORT_INSTANCE=True"
+            )
+        if not v:
+            raise ValueError(
+                "DEAD_LETTER_TOPIC must be set when DEAD_LETTER_SINK=KAFKA"
+            )
+        return v
+
+    @validator("JQ_BACKEND")
+    def validate_jq_backend(cls, v: str) -> str:
+        if v not in consts.VALID_JQ_BACKENDS:
+            raise ValueError(f"JQ_BACKEND must be one of {consts.VALID_JQ_BACKENDS}")
+        if v == "JQ" and importlib.util.find_spec("jq") is None:
+            raise ValueError("JQ_BACKEND=JQ requires the jq package to be installed")
+        return v
+
     @validator("KAFKA_RUNS_TOPIC", always=True)
     def set_kafka_runs_topic(cls, v: Optional[str], values: dict) -> str:
         if isinstance(v, str) and v:
@@ -104,6 +336,8 @@ class Settings(BaseSettings):
 
     WEBHOOK_INVOKER_TIMEOUT: float = 30
     WEBHOOK_VERIFY_SSL: bool = True
+    WEBHOOK_MAX_RESPONSE_BODY_BYTES: int = 1024 * 1024
+    WEBHOOK_INVOKER_MAX_CONCURRENCY: int = 1
 
 
 settings = Settings()
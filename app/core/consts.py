@@ -2,10 +2,53 @@ class Consts:
     KAFKA_CONSUMER_CLIENT_ID = "port-agent"
     DEFAULT_HTTP_METHOD = "POST"
     MISSING_VALUE = "MISSING"
-    VALID_STREAMER_TYPES = ["KAFKA", "POLLING"]
+    # The streamers Port knows about, FILE only replays recorded messages
+    PORT_STREAMER_TYPES = ["KAFKA", "POLLING"]
+    VALID_STREAMER_TYPES = [*PORT_STREAMER_TYPES, "FILE"]
+    VALID_DEAD_LETTER_SINKS = ["FILE", "KAFKA"]
+    VALID_JQ_BACKENDS = ["PYTHON", "PYJQ", "JQ"]
+    VALID_LOG_FORMATS = ["TEXT", "JSON"]
+    VALID_TRACING_EXPORTERS = ["FILE", "HTTP"]
+    LOG_TRUNCATION_MARKER = "...[truncated]"
     PORT_EXEC_AGENT_CLAIMING_KEY = "_PORT_EXEC_AGENT"
     ACTION_RUN_ID_PREFIX = "r_"
     WF_NODE_RUN_ID_PREFIX = "wfnr_"
+    RESPONSE_READ_CHUNK_SIZE = 64 * 1024
+    RESPONSE_TRUNCATION_MARKER = "...[truncated]"
+    # librdkafka options that can be tuned through KAFKA_CONSUMER_EXTRA_CONFIG,
+    # the ones the agent sets itself (security, group, commits) are left out
+    KAFKA_CONSUMER_TUNABLE_CONFIG_KEYS = frozenset(
+        {
+            "client.rack",
+            "fetch.error.backoff.ms",
+            "fetch.max.bytes",
+            "fetch.min.bytes",
+            "fetch.wait.max.ms",
+            "group.instance.id",
+            "heartbeat.interval.ms",
+            "max.partition.fetch.bytes",
+            "max.poll.interval.ms",
+            "partition.assignment.strategy",
+            "queued.max.messages.kbytes",
+            "queued.min.messages",
+            "reconnect.backoff.max.ms",
+            "reconnect.backoff.ms",
+            "socket.keepalive.enable",
+            "socket.receive.buffer.bytes",
+        }
+    )
+    KAFKA_CONSUMER_CONFIG_PRESETS: dict[str, dict[str, str | int]] = {
+        "low-latency": {
+            "fetch.min.bytes": 1,
+            "fetch.wait.max.ms": 10,
+        },
+        "high-throughput": {
+            "fetch.min.bytes": 64 * 1024,
+            "fetch.wait.max.ms": 500,
+            "max.partition.fetch.bytes": 4 * 1024 * 1024,
+            "queued.max.messages.kbytes": 256 * 1024,
+        },
+    }
 
 
 consts = Consts()
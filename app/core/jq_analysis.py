@@ -0,0 +1,230 @@
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Iterable
+
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<space>\s+|\#[^\n]*)
+  | (?P<number>(?:[0-9]+(?:\.[0-9]*)?|\.[0-9]+)(?:[eE][+-]?[0-9]+)?)
+  | (?P<recurse>\.\.)
+  | (?P<field>\.[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<dot>\.)
+  | (?P<variable>\$[A-Za-z_][A-Za-z0-9_]*(?:::[A-Za-z_][A-Za-z0-9_]*)*)
+  | (?P<ident>[A-Za-z_][A-Za-z0-9_]*(?:::[A-Za-z_][A-Za-z0-9_]*)*)
+  | (?P<format>@[A-Za-z0-9_]+)
+  | (?P<op>\?//|//=?|\|=|\+=|-=|\*=|/=|%=|==|!=|<=|>=|[|,;:()\[\]{}+\-*/%<>=?])
+    """,
+    re.VERBOSE,
+)
+
+KEYWORDS = frozenset(
+    {
+        "if",
+        "then",
+        "elif",
+        "else",
+        "end",
+        "as",
+        "and",
+        "or",
+        "try",
+        "catch",
+        "reduce",
+        "foreach",
+        "label",
+    }
+)
+# Builtins that never read their input
+INPUTLESS_BUILTINS = frozenset({"true", "false", "null", "empty", "env", "now"})
+_POSTFIX_AFTER = frozenset({"field", "dot", "variable", "string", "number"})
+_POSTFIX_AFTER_OPS = frozenset({")", "]", "}", "?"})
+
+
+class JqSyntaxError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Token:
+    kind: str
+    value: str
+    # Only set for strings, the literal text between interpolations and the
+    # tokens of every `\(...)` interpolation
+    fragments: tuple[str, ...] = ()
+    interpolations: tuple[tuple["Token", ...], ...] = field(default=())
+
+
+def _read_string(expression: str, start: int) -> tuple[Token, int]:
+    fragments: list[str] = []
+    interpolations: list[tuple[Token, ...]] = []
+    raw: list[str] = []
+    position = start + 1
+    while position < len(expression):
+        char = expression[position]
+        if char == '"':
+            fragments.append(json.loads('"' + "".join(raw) + '"'))
+            end = position + 1
+            token = Token(
+                "string",
+                expression[start:end],
+                tuple(fragments),
+                tuple(interpolations),
+            )
+            return token, end
+        following = expression[position + 1] if position + 1 < len(expression) else ""
+        if char == "\\" and following == "(":
+            fragments.append(json.loads('"' + "".join(raw) + '"'))
+            raw = []
+            tokens, position = _tokenize(expression, position + 2, closing=")")
+            interpolations.append(tuple(tokens))
+            continue
+        if char == "\\":
+            raw.append(char + following)
+            position += 2
+            continue
+        raw.append(char)
+        position += 1
+    raise JqSyntaxError("Unterminated string literal")
+
+
+def _tokenize(
+    expression: str, position: int = 0, closing: str | None = None
+) -> tuple[list[Token], int]:
+    tokens: list[Token] = []
+    depth = 0
+    while position < len(expression):
+        if expression[position] == '"':
+            token, position = _read_string(expression, position)
+            tokens.append(token)
+            continue
+
+        match = _TOKEN_RE.match(expression, position)
+        if match is None:
+            raise JqSyntaxError(f"Unexpected character at {position}")
+        position = match.end()
+        kind = match.lastgroup or ""
+        value = match.group()
+        if kind == "space":
+            continue
+        if closing and kind == "op" and value in "([{":
+            depth += 1
+        elif closing and kind == "op" and value in ")]}":
+            if depth == 0 and value == closing:
+                return tokens, position
+            depth -= 1
+        tokens.append(Token(kind, value))
+
+    if closing:
+        raise JqSyntaxError("Unterminated string interpolation")
+    return tokens, position
+
+
+def tokenize(expression: str) -> list[Token]:
+    return _tokenize(expression)[0]
+
+
+def _is_postfix_position(previous: Token | None) -> bool:
+    if previous is None:
+        return False
+    if previous.kind in _POSTFIX_AFTER:
+        return True
+    if previous.kind == "op":
+        return previous.value in _POSTFIX_AFTER_OPS
+    return previous.kind == "ident" and previous.value not in KEYWORDS
+
+
+def _root_keys(tokens: tuple[Token, ...] | list[Token]) -> set[str] | None:
+    keys: set[str] = set()
+    binding = False
+    pipe_from_binding = False
+    previous: Token | None = None
+    for index, token in enumerate(tokens):
+        following = tokens[index + 1] if index + 1 < len(tokens) else None
+
+        if token.kind == "field":
+            if not _is_postfix_position(previous):
+                keys.add(token.value[1:])
+        elif token.kind in ("dot", "recurse"):
+            indexes_term = following is not None and (
+                following.kind == "string" or following.value == "["
+            )
+            if not (
+                token.kind == "dot" and indexes_term and _is_postfix_position(previous)
+            ):
+                return None
+        elif token.kind == "format":
+            if (following is None or following.kind != "string") and (
+                previous is None or previous.value != "|" or pipe_from_binding
+            ):
+                return None
+        elif token.kind == "ident":
+            if token.value == "as":
+                binding = True
+            elif token.value == "def":
+                return None
+            elif following is not None and following.value == ":":
+                pass
+            elif token.value in KEYWORDS or token.value in INPUTLESS_BUILTINS:
+                pass
+            elif (
+                previous is None
+                or previous.value != "|"
+                or previous.kind != "op"
+                or pipe_from_binding
+            ):
+                return None
+        elif token.kind == "string":
+            for interpolation in token.interpolations:
+                interpolation_keys = _root_keys(interpolation)
+                if interpolation_keys is None:
+                    return None
+                keys |= interpolation_keys
+            # `{"key"}` is the shorthand of `{"key": .key}`, it may be an array
+            # element as well which only reports a key too many
+            if (
+                previous is not None
+                and previous.kind == "op"
+                and previous.value in ("{", ",")
+                and following is not None
+                and following.kind == "op"
+                and following.value in (",", "}")
+            ):
+                if token.interpolations:
+                    return None
+                keys.add(token.fragments[0])
+
+        pipe_from_binding = False
+        if token.kind == "op" and token.value == "(":
+            binding = False
+        elif token.kind == "op" and token.value == "|" and binding:
+            binding = False
+            pipe_from_binding = True
+        previous = token
+    return keys
+
+
+def referenced_root_keys(expression: str) -> frozenset[str] | None:
+    """The keys of its input a jq expression may read.
+
+    Returns `None` when the expression may read its input in any other way
+    than `.<key>`, e.g. `.`, `..`, `.[...]`, `keys` or a function definition.
+    The analysis is conservative, it may report keys that aren't read but it
+    never misses one.
+    """
+    try:
+        keys = _root_keys(tokenize(expression))
+    except JqSyntaxError:
+        return None
+    return None if keys is None else frozenset(keys)
+
+
+def referenced_keys_union(expressions: Iterable[str]) -> frozenset[str] | None:
+    """The keys read by any of the expressions, `None` if any reads more"""
+    keys: set[str] = set()
+    for expression in expressions:
+        expression_keys = referenced_root_keys(expression)
+        if expression_keys is None:
+            return None
+        keys |= expression_keys
+    return frozenset(keys)
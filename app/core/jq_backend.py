@@ -0,0 +1,87 @@
+import importlib
+import json
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Any, Callable
+
+import pyjq
+from core.jq_fast_path import compile_fast_path
+
+
+class JqBackend(ABC):
+    """Compiles and runs the jq programs of the mappings.
+
+    `prepare_input` converts a context once for all the programs that run on
+    it, `first` gives the first output of a program, `None` when it has none.
+    Like pyjq, `first` fails when the program fails after its first output.
+    """
+
+    @abstractmethod
+    def compile(self, expression: str) -> Any:
+        """The program, raises a `ValueError` when it doesn't compile"""
+
+    def prepare_input(self, value: Any) -> Any:
+        return value
+
+    @abstractmethod
+    def first(self, program: Any, prepared_input: Any) -> Any:
+        pass
+
+    def fast_path(self, expression: str) -> Callable[[Any], Any] | None:
+        """A Python function evaluating the expression, if the backend has one"""
+        return None
+
+
+class PyjqBackend(JqBackend):
+    def compile(self, expression: str) -> Any:
+        return pyjq.compile(expression)
+
+    def first(self, program: Any, prepared_input: Any) -> Any:
+        return program.first(prepared_input)
+
+
+class PythonBackend(PyjqBackend):
+    """Evaluates plain paths, literals and interpolations of those in Python.
+
+    The other expressions, and the inputs the fast path doesn't handle, run
+    on pyjq.
+    """
+
+    def fast_path(self, expression: str) -> Callable[[Any], Any] | None:
+        return compile_fast_path(expression)
+
+
+class JqBindingsBackend(JqBackend):
+    """Runs the programs with the `jq` package, installed separately.
+
+    The context is serialized to JSON once and parsed by each program. The
+    package bundles a newer jq, numbers differ from pyjq: integral numbers come
+    back as ints whatever their size and `tostring` keeps the text of the
+    parsed numbers, `0.0` instead of `0`.
+    """
+
+    def __init__(self) -> None:
+        self._jq = importlib.import_module("jq")
+
+    def compile(self, expression: str) -> Any:
+        return self._jq.compile(expression)
+
+    def prepare_input(self, value: Any) -> Any:
+        return json.dumps(value)
+
+    def first(self, program: Any, prepared_input: Any) -> Any:
+        outputs = program.input_text(prepared_input).all()
+        return outputs[0] if outputs else None
+
+
+_BACKENDS: dict[str, Callable[[], JqBackend]] = {
+    "PYTHON": PythonBackend,
+    "PYJQ": PyjqBackend,
+    "JQ": JqBindingsBackend,
+}
+
+
+@lru_cache(maxsize=None)
+def get_jq_backend(name: str) -> JqBackend:
+    # Shared, the compiled programs are cached per backend
+    return _BACKENDS[name]()
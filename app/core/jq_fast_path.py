@@ -0,0 +1,214 @@
+import math
+from functools import partial
+from typing import Any, Callable, Sequence
+
+from core.jq_analysis import Token, tokenize
+
+# jq numbers are doubles, pyjq only returns the integral ones in this range as
+# ints
+_INT_MIN, _INT_MAX = -(2**31), 2**31 - 1
+_LITERAL_IDENTS = {"true": True, "false": False, "null": None}
+
+Step = str | int
+
+
+class FastPathUnsupported(Exception):
+    """The expression must run on jq to get its exact result for this input.
+
+    Raised for the inputs the fast path doesn't mirror, e.g. indexing a
+    value of the wrong type, which jq reports with its own error.
+    """
+
+
+def _as_jq_number(number: float) -> int | float:
+    if number.is_integer() and _INT_MIN <= number <= _INT_MAX:
+        return int(number)
+    return number
+
+
+def _as_jq_value(value: Any) -> Any:
+    """The value as it comes back from a jq program, always a copy"""
+    if value is None or isinstance(value, (str, bool)):
+        return value
+    if isinstance(value, (int, float)):
+        try:
+            number = float(value)
+        except OverflowError:
+            raise FastPathUnsupported() from None
+        if not math.isfinite(number):
+            raise FastPathUnsupported()
+        return _as_jq_number(number)
+    if isinstance(value, dict):
+        if not all(isinstance(key, str) for key in value):
+            raise FastPathUnsupported()
+        return {key: _as_jq_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_as_jq_value(item) for item in value]
+    raise FastPathUnsupported()
+
+
+def _as_jq_string(value: Any) -> str:
+    """The value as interpolated in a jq string"""
+    if isinstance(value, str):
+        return value
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        number = _as_jq_value(value)
+        if isinstance(number, int):
+            return str(number)
+    # jq has its own formatting of the other numbers and of the JSON texts
+    raise FastPathUnsupported()
+
+
+def _follow(path: tuple[Step, ...], value: Any) -> Any:
+    for step in path:
+        if value is None:
+            continue
+        if isinstance(step, str):
+            if not isinstance(value, dict):
+                raise FastPathUnsupported()
+            value = value.get(step)
+        else:
+            if not isinstance(value, list):
+                raise FastPathUnsupported()
+            index = step + len(value) if step < 0 else step
+            value = value[index] if 0 <= index < len(value) else None
+    return value
+
+
+def _plain_string(token: Token) -> str | None:
+    if token.kind != "string" or token.interpolations:
+        return None
+    return token.fragments[0]
+
+
+def _parse_literal(tokens: Sequence[Token]) -> tuple[Any] | None:
+    """The value of a literal in a 1-tuple, `None` if it's not a literal"""
+    values = [token.value for token in tokens]
+    if len(tokens) == 1 and (string := _plain_string(tokens[0])) is not None:
+        return (string,)
+    if len(tokens) == 1 and tokens[0].kind == "ident":
+        if values[0] in _LITERAL_IDENTS:
+            return (_LITERAL_IDENTS[values[0]],)
+        return None
+    if [token.kind for token in tokens] == ["number"]:
+        return (_as_jq_number(float(values[0])),)
+    if [token.kind for token in tokens] == ["op", "number"] and values[0] == "-":
+        return (_as_jq_number(-float(values[1])),)
+    return None
+
+
+def _parse_subscript(tokens: Sequence[Token], position: int) -> tuple[Step, int]:
+    """The `[...]` subscript starting at `position` and the position after it"""
+    inside = []
+    for end in range(position + 1, len(tokens)):
+        if tokens[end].kind == "op" and tokens[end].value == "]":
+            break
+        inside.append(tokens[end])
+    else:
+        raise ValueError("Unterminated subscript")
+
+    kinds = [token.kind for token in inside]
+    if kinds == ["string"] and (key := _plain_string(inside[0])) is not None:
+        return key, end + 1
+    if kinds == ["number"] and inside[0].value.isdigit():
+        return int(inside[0].value), end + 1
+    if kinds == ["op", "number"] and inside[0].value == "-":
+        if inside[1].value.isdigit():
+            return -int(inside[1].value), end + 1
+    raise ValueError("Unsupported subscript")
+
+
+def _parse_path(tokens: Sequence[Token]) -> tuple[Step, ...] | None:
+    """The keys and indexes of a path like `.a.b[0]["c"]`, `None` otherwise"""
+    if not tokens or tokens[0].kind not in ("dot", "field"):
+        return None
+    steps: list[Step] = []
+    position = 0
+    while position < len(tokens):
+        token = tokens[position]
+        following = tokens[position + 1] if position + 1 < len(tokens) else None
+        if token.kind == "field":
+            steps.append(token.value[1:])
+            position += 1
+        elif token.kind == "dot" and following is not None:
+            if (key := _plain_string(following)) is not None:
+                steps.append(key)
+                position += 2
+            elif position == 0 and following.value == "[":
+                position += 1
+            else:
+                return None
+        elif token.kind == "dot" and position == 0:
+            position += 1
+        elif token.kind == "op" and token.value == "[":
+            try:
+                step, position = _parse_subscript(tokens, position)
+            except ValueError:
+                return None
+            steps.append(step)
+        else:
+            return None
+    return tuple(steps)
+
+
+def _evaluate_path(path: tuple[Step, ...], context: Any) -> Any:
+    return _as_jq_value(_follow(path, context))
+
+
+def _evaluate_literal(value: Any, _context: Any) -> Any:
+    return value
+
+
+def _evaluate_string(
+    fragments: tuple[str, ...],
+    interpolations: tuple[Callable[[Any], Any], ...],
+    context: Any,
+) -> str:
+    parts = [fragments[0]]
+    for interpolation, fragment in zip(interpolations, fragments[1:]):
+        parts.append(_as_jq_string(interpolation(context)))
+        parts.append(fragment)
+    return "".join(parts)
+
+
+def _compile_value(tokens: Sequence[Token]) -> Callable[[Any], Any] | None:
+    """Reads a path or a literal, without converting it like jq does"""
+    if (literal := _parse_literal(tokens)) is not None:
+        return partial(_evaluate_literal, literal[0])
+    if (path := _parse_path(tokens)) is not None:
+        return partial(_follow, path)
+    return None
+
+
+def compile_fast_path(expression: str) -> Callable[[Any], Any] | None:
+    """A Python function giving the first output of a simple jq expression.
+
+    Handles literals, paths made of keys and integer indexes like
+    `.payload.properties.branch` or `.items[-1]["name"]`, and strings
+    interpolating those, e.g. `"\\(.context.runId)"`. Returns `None` for
+    any other expression. The function raises `FastPathUnsupported` for the
+    inputs jq must handle. It doesn't check the syntax the way jq does, use
+    it for expressions known to compile.
+    """
+    try:
+        tokens = tokenize(expression)
+    except ValueError:
+        return None
+
+    if (literal := _parse_literal(tokens)) is not None:
+        return partial(_evaluate_literal, literal[0])
+    if (path := _parse_path(tokens)) is not None:
+        return partial(_evaluate_path, path)
+    if len(tokens) == 1 and tokens[0].kind == "string":
+        interpolations = []
+        for interpolation_tokens in tokens[0].interpolations:
+            interpolation = _compile_value(interpolation_tokens)
+            if interpolation is None:
+                return None
+            interpolations.append(interpolation)
+        return partial(_evaluate_string, tokens[0].fragments, tuple(interpolations))
+    return None
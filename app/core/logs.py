@@ -0,0 +1,197 @@
+import atexit
+import json
+import logging
+import random
+from copy import copy
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from typing import Any, Callable, Iterator
+
+from core.config import settings
+from core.consts import consts
+
+
+class LazyLogValue:
+    """A logged value only computed when the log record is formatted"""
+
+    __slots__ = ("_compute",)
+
+    def __init__(self, compute: Callable[[], Any]) -> None:
+        self._compute = compute
+
+    def __str__(self) -> str:
+        return str(self._compute())
+
+
+def _chunks(value: Any, limit: int) -> Iterator[str]:
+    # The repr of the value in pieces, the strings are cut after `limit`
+    # characters since the rest is never logged
+    if isinstance(value, dict):
+        yield "{"
+        for index, (key, item) in enumerate(value.items()):
+            if index:
+                yield ", "
+            yield from _chunks(key, limit)
+            yield ": "
+            yield from _chunks(item, limit)
+        yield "}"
+    elif isinstance(value, list):
+        yield "["
+        for index, item in enumerate(value):
+            if index:
+                yield ", "
+            yield from _chunks(item, limit)
+        yield "]"
+    elif isinstance(value, (str, bytes)):
+        yield repr(value[:limit])
+    else:
+        yield repr(value)
+
+
+def truncate_log_value(value: Any, max_length: int) -> str:
+    """`str(value)`, truncated to `max_length` characters when above, 0 for
+    no limit. Objects and lists are only rendered up to the limit."""
+    if max_length <= 0:
+        return str(value)
+    if isinstance(value, str):
+        text = value[: max_length + 1]
+    elif isinstance(value, (dict, list, bytes)):
+        parts: list[str] = []
+        length = 0
+        for chunk in _chunks(value, max_length + 1):
+            parts.append(chunk)
+            length += len(chunk)
+            if length > max_length:
+                break
+        text = "".join(parts)
+    else:
+        text = str(value)
+    if len(text) <= max_length:
+        return text
+    return text[:max_length] + consts.LOG_TRUNCATION_MARKER
+
+
+class DetailedLogValue:
+    """A detailed field of a log, like a body or a response.
+
+    Rendered when the record is formatted and truncated to
+    `DETAILED_LOGGING_MAX_FIELD_LENGTH` characters.
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any) -> None:
+        self.value = value
+
+    def __str__(self) -> str:
+        return truncate_log_value(
+            self.value, settings.DETAILED_LOGGING_MAX_FIELD_LENGTH
+        )
+
+
+def sample_detailed_log() -> bool:
+    """Whether a log event includes its detailed field"""
+    rate = settings.DETAILED_LOGGING_SAMPLE_RATE
+    return rate >= 1 or random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(
+                record.created, tz=timezone.utc
+            ).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "process": record.process,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+# Arguments that can't change once logged, their records are formatted by the
+# writer thread. The detailed values are the pipeline's messages, responses and
+# payloads, which aren't modified after they are created.
+_IMMUTABLE_ARG_TYPES = (
+    str,
+    bytes,
+    int,
+    float,
+    type(None),
+    DetailedLogValue,
+    LazyLogValue,
+)
+
+
+class _QueueHandler(QueueHandler):
+    """Queues the records for the writer thread.
+
+    The records are formatted on the logging thread only when their arguments
+    could change before the writer gets to them.
+    """
+
+    _exception_formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        args = record.args
+        if not isinstance(record.msg, str) or (
+            args
+            and not (
+                isinstance(args, tuple)
+                and all(isinstance(arg, _IMMUTABLE_ARG_TYPES) for arg in args)
+            )
+        ):
+            return super().prepare(record)
+        record = copy(record)
+        if record.exc_info:
+            # The traceback keeps the frames alive, it's rendered right away
+            record.exc_text = self._exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_listener: QueueListener | None = None
+
+
+def configure_logging() -> None:
+    """Set up the handler of the root logger, once per process.
+
+    Replaces the handlers set up so far, like the one of `basicConfig`.
+    """
+    global _listener
+    handler: logging.Handler = logging.StreamHandler()
+    if settings.LOG_FORMAT == "JSON":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    stop_logging()
+    if settings.LOG_ASYNC:
+        queue: SimpleQueue = SimpleQueue()
+        _listener = QueueListener(queue, handler, respect_handler_level=True)
+        _listener.start()
+        handler = _QueueHandler(queue)
+    root.addHandler(handler)
+    root.setLevel(settings.LOG_LEVEL)
+
+
+def stop_logging() -> None:
+    """Write the queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
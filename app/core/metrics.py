@@ -0,0 +1,104 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Metrics:
+    """Gauges and counters of the agent, kept in memory.
+
+    Components update them as they work and reporters read a consistent
+    snapshot of all of them.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._gauges: dict[str, float] = {}
+        self._counters: dict[str, float] = {}
+
+    def set(self, name: str, value: float) -> None:
+        with self._lock:
+            self._gauges[name] = value
+
+    def remove(self, name: str) -> None:
+        with self._lock:
+            self._gauges.pop(name, None)
+
+    def increment(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float) -> None:
+        """Record a sample, as the `<name>.count` and `<name>.sum` counters"""
+        with self._lock:
+            count, total = f"{name}.count", f"{name}.sum"
+            self._counters[count] = self._counters.get(count, 0) + 1
+            self._counters[total] = self._counters.get(total, 0) + value
+
+    def get(self, name: str) -> float | None:
+        with self._lock:
+            return self._gauges.get(name, self._counters.get(name))
+
+    def counters(self) -> dict[str, float]:
+        with self._lock:
+            return dict(self._counters)
+
+    def snapshot(self) -> dict[str, float]:
+        with self._lock:
+            return {**self._counters, **self._gauges}
+
+
+class MetricsReporter:
+    """Logs the metrics periodically.
+
+    Each report adds the per second rate of the counters and the average of
+    the samples recorded since the previous report.
+    """
+
+    def __init__(self, registry: Metrics, interval: float) -> None:
+        self.registry = registry
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="metrics-reporter", daemon=True
+        )
+        self._previous_counters = registry.counters()
+        self._previous_at = time.monotonic()
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                logger.info("Metrics: %s", self.report())
+            except Exception as error:
+                logger.warning("Failed to report metrics: %s", str(error))
+
+    def report(self) -> dict[str, float]:
+        now = time.monotonic()
+        elapsed = max(now - self._previous_at, 1e-9)
+        counters = self.registry.counters()
+        values = self.registry.snapshot()
+
+        for name, value in counters.items():
+            delta = value - self._previous_counters.get(name, 0)
+            values[f"{name}.rate"] = round(delta / elapsed, 3)
+            if name.endswith(".count") and delta:
+                sample = name.removesuffix(".count")
+                total = counters.get(f"{sample}.sum", 0)
+                total_delta = total - self._previous_counters.get(f"{sample}.sum", 0)
+                values[f"{sample}.avg"] = round(total_delta / delta, 3)
+
+        self._previous_counters = counters
+        self._previous_at = now
+        return values
+
+
+metrics = Metrics()
@@ -0,0 +1,132 @@
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+from types import FrameType
+from typing import Any
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _frame_name(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+class Profiler:
+    """Profiles the process on demand, nothing runs until a capture starts.
+
+    A capture samples the stacks of all the threads from a background thread
+    and traces the memory allocations, then writes the sampled stacks in the
+    collapsed format of flame graphs and the allocations of the capture by
+    line, largest first.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def capture(self, duration: float | None = None) -> bool:
+        """Start a capture in the background, `False` if one is running.
+
+        Never blocks, it is called from the signal handler which may have
+        interrupted a capture being started on the main thread.
+        """
+        if not self._lock.acquire(blocking=False):
+            logger.warning("A profile capture is being started already, skipping")
+            return False
+        try:
+            if self.running:
+                logger.warning("A profile is being captured already, skipping")
+                return False
+            self._thread = threading.Thread(
+                target=self._run,
+                args=(duration or settings.PROFILING_DURATION_SECONDS,),
+                name="profiler",
+                daemon=True,
+            )
+            self._thread.start()
+            return True
+        finally:
+            self._lock.release()
+
+    def install_signal_handler(self) -> None:
+        """Capture a profile on SIGUSR1, from the main thread"""
+        signal.signal(signal.SIGUSR1, self._on_signal)
+
+    def _on_signal(self, *_: Any) -> None:
+        self.capture()
+
+    def _run(self, duration: float) -> None:
+        logger.info("Capturing a profile for %s seconds", duration)
+        output_dir = settings.PROFILING_OUTPUT_DIR
+        prefix = f"profile-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}"
+        was_tracing = tracemalloc.is_tracing()
+        try:
+            if not was_tracing:
+                tracemalloc.start(settings.PROFILING_MEMORY_TRACEBACK_FRAMES)
+            memory_before = tracemalloc.take_snapshot()
+            stacks = self._sample(duration, settings.PROFILING_SAMPLE_INTERVAL_SECONDS)
+            memory_after = tracemalloc.take_snapshot()
+        except Exception as error:
+            logger.error("Failed to capture a profile: %s", str(error))
+            return
+        finally:
+            if not was_tracing:
+                tracemalloc.stop()
+
+        try:
+            output_dir.mkdir(parents=True, exist_ok=True)
+            stacks_path = output_dir / f"{prefix}.collapsed"
+            stacks_path.write_text(
+                "".join(
+                    f"{';'.join(stack)} {count}\n"
+                    for stack, count in stacks.most_common()
+                )
+            )
+            memory_path = output_dir / f"{prefix}.memory.txt"
+            memory_path.write_text(
+                "".join(
+                    f"{stat}\n"
+                    for stat in memory_after.compare_to(memory_before, "lineno")
+                    if stat.size_diff
+                )
+            )
+        except OSError as error:
+            logger.error("Failed to write the profile: %s", str(error))
+            return
+        logger.info("Profile written to %s and %s", stacks_path, memory_path)
+
+    @staticmethod
+    def _sample(duration: float, interval: float) -> Counter[tuple[str, ...]]:
+        own_id = threading.get_ident()
+        stacks: Counter[tuple[str, ...]] = Counter()
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack: list[str] = []
+                current: FrameType | None = frame
+                while current is not None:
+                    stack.append(_frame_name(current))
+                    current = current.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                stacks[tuple(reversed(stack))] += 1
+            time.sleep(interval)
+        return stacks
+
+
+profiler = Profiler()
@@ -0,0 +1,49 @@
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+
+from core.config import settings
+
+
+@dataclass(frozen=True)
+class BackoffPolicy:
+    initial_seconds: float
+    max_seconds: float
+    factor: float
+    jitter_factor: float
+
+    @classmethod
+    def from_settings(cls) -> "BackoffPolicy":
+        return cls(
+            initial_seconds=settings.POLLING_INITIAL_BACKOFF_SECONDS,
+            max_seconds=settings.POLLING_MAX_BACKOFF_SECONDS,
+            factor=settings.POLLING_BACKOFF_FACTOR,
+            jitter_factor=settings.POLLING_BACKOFF_JITTER_FACTOR,
+        )
+
+    def delay(self, attempt: int) -> float:
+        """Seconds to wait before the given retry attempt (starting at 0)"""
+        base = min(self.initial_seconds * self.factor**attempt, self.max_seconds)
+        return base + random.uniform(0, base * self.jitter_factor)
+
+
+class RetryBudget:
+    """Caps the number of retries allowed within a sliding time window"""
+
+    def __init__(self, max_retries: int, window_seconds: float) -> None:
+        self.max_retries = max_retries
+        self.window_seconds = window_seconds
+        self._retries: deque[float] = deque()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            while self._retries and now - self._retries[0] > self.window_seconds:
+                self._retries.popleft()
+            if len(self._retries) >= self.max_retries:
+                return False
+            self._retries.append(now)
+            return True
@@ -0,0 +1,134 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Callable, Iterator
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class _InFlightRun:
+    run_id: str | None
+    report_failure: Callable[[], None] | None
+    on_failure_reported: Callable[[], None] | None
+
+
+class ShutdownCoordinator:
+    """Keeps track of the runs being processed so shutdown can wait for them.
+
+    Consumers stop taking new work once a shutdown is requested and then call
+    `drain`, which waits for the in-flight runs up to a deadline, flushes the
+    registered buffers and reports a failure for the runs that didn't finish.
+    """
+
+    def __init__(self) -> None:
+        self._idle = threading.Condition()
+        self._in_flight: dict[int, _InFlightRun] = {}
+        self._next_token = 0
+        self._flush_callbacks: list[Callable[[float], None]] = []
+        self._on_failure_reported: ContextVar[Callable[[], None] | None] = ContextVar(
+            "on_failure_reported", default=None
+        )
+        self.stopping = threading.Event()
+
+    @property
+    def in_flight_count(self) -> int:
+        with self._idle:
+            return len(self._in_flight)
+
+    @contextmanager
+    def track(
+        self,
+        run_id: str | None = None,
+        report_failure: Callable[[], None] | None = None,
+    ) -> Iterator[None]:
+        with self._idle:
+            token = self._next_token
+            self._next_token += 1
+            self._in_flight[token] = _InFlightRun(
+                run_id, report_failure, self._on_failure_reported.get()
+            )
+        try:
+            yield
+        finally:
+            with self._idle:
+                self._in_flight.pop(token, None)
+                if not self._in_flight:
+                    self._idle.notify_all()
+
+    @contextmanager
+    def on_failure_reported(self, callback: Callable[[], None]) -> Iterator[None]:
+        """Call `callback` once a run tracked in the block is reported as failed.
+
+        The consumers use it to settle the message of the run, so the run
+        isn't consumed and invoked again after the restart.
+        """
+        token = self._on_failure_reported.set(callback)
+        try:
+            yield
+        finally:
+            self._on_failure_reported.reset(token)
+
+    def register_flush(self, callback: Callable[[float], None]) -> None:
+        """Register a callback flushing a buffer, it gets the remaining seconds"""
+        self._flush_callbacks.append(callback)
+
+    def request_shutdown(self) -> None:
+        self.stopping.set()
+
+    def _wait_for_in_flight(self, deadline: float) -> list[_InFlightRun]:
+        with self._idle:
+            while self._in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._idle.wait(remaining)
+            unfinished = list(self._in_flight.values())
+            self._in_flight.clear()
+            return unfinished
+
+    def drain(self, timeout: float | None = None) -> None:
+        if timeout is None:
+            timeout = settings.SHUTDOWN_GRACE_PERIOD_SECONDS
+        deadline = time.monotonic() + timeout
+        self.request_shutdown()
+
+        if self.in_flight_count:
+            logger.info(
+                "Waiting up to %d seconds for %d in-flight runs to finish",
+                timeout,
+                self.in_flight_count,
+            )
+        unfinished = self._wait_for_in_flight(deadline)
+
+        for callback in self._flush_callbacks:
+            try:
+                callback(max(deadline - time.monotonic(), 0))
+            except Exception as error:
+                logger.error("Failed to flush buffer on shutdown: %s", str(error))
+
+        for run in unfinished:
+            logger.warning(
+                "Run %s did not finish before shutdown",
+                run.run_id or "(no run id)",
+            )
+            if run.report_failure is None:
+                continue
+            try:
+                run.report_failure()
+                if run.on_failure_reported is not None:
+                    run.on_failure_reported()
+            except Exception as error:
+                logger.error(
+                    "Failed to report failure for unfinished run %s: %s",
+                    run.run_id,
+                    str(error),
+                )
+
+
+shutdown_coordinator = ShutdownCoordinator()
@@ -0,0 +1,256 @@
+import atexit
+import json
+import logging
+import secrets
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from queue import Empty, SimpleQueue
+from typing import Any, Iterator
+
+import requests
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    """A timed stage of the processing, in the trace of its parent.
+
+    Exported as a JSON object with the OpenTelemetry field names.
+    """
+
+    __slots__ = (
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "links",
+        "attributes",
+        "start_ns",
+        "end_ns",
+        "error",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        parent: "Span | None",
+        attributes: dict[str, Any],
+        link: "Span | None" = None,
+    ) -> None:
+        self.name = name
+        self.trace_id: str = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id: str = secrets.token_hex(8)
+        self.parent_id: str | None = parent.span_id if parent else None
+        self.links: list[dict[str, str]] = (
+            [{"traceId": link.trace_id, "spanId": link.span_id}] if link else []
+        )
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns: int | None = None
+        self.error: str | None = None
+
+    def set_attribute(self, name: str, value: Any) -> None:
+        self.attributes[name] = value
+
+    def set_error(self, error: str) -> None:
+        self.error = error
+
+    @property
+    def traceparent(self) -> str:
+        """The W3C trace context header of the span, sampled"""
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "links": self.links,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "attributes": self.attributes,
+            "status": (
+                {"code": "ERROR", "message": self.error}
+                if self.error is not None
+                else {"code": "OK"}
+            ),
+        }
+
+
+class _NoopSpan(Span):
+    """The span given when tracing is off, it records nothing"""
+
+    def __init__(self) -> None:
+        pass
+
+    def set_attribute(self, name: str, value: Any) -> None:
+        pass
+
+    def set_error(self, error: str) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class SpanExporter(ABC):
+    @abstractmethod
+    def export(self, spans: list[dict[str, Any]]) -> None:
+        pass
+
+
+class FileSpanExporter(SpanExporter):
+    """Appends the spans to a JSON lines file"""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def export(self, spans: list[dict[str, Any]]) -> None:
+        with self.path.open("a") as file:
+            for span in spans:
+                file.write(json.dumps(span, default=str) + "\n")
+
+
+class HttpSpanExporter(SpanExporter):
+    """Posts the spans to a collector, as `{"resource": ..., "spans": [...]}`"""
+
+    def __init__(self, endpoint: str) -> None:
+        self.endpoint = endpoint
+
+    def export(self, spans: list[dict[str, Any]]) -> None:
+        requests.post(
+            self.endpoint,
+            data=json.dumps(
+                {"resource": {"service.name": "port-agent"}, "spans": spans},
+                default=str,
+            ),
+            headers={"Content-Type": "application/json"},
+            timeout=settings.TRACING_EXPORT_TIMEOUT_SECONDS,
+        ).raise_for_status()
+
+
+class _SpanWriter:
+    """Exports the finished spans in batches from a background thread"""
+
+    def __init__(self, exporter: SpanExporter, max_batch_size: int = 512) -> None:
+        self.exporter = exporter
+        self.max_batch_size = max_batch_size
+        self._queue: SimpleQueue[Span | None] = SimpleQueue()
+        self._thread = threading.Thread(
+            target=self._run, name="span-writer", daemon=True
+        )
+        self._thread.start()
+
+    def add(self, span: Span) -> None:
+        self._queue.put(span)
+
+    def stop(self) -> None:
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _run(self) -> None:
+        stopped = False
+        while not stopped:
+            batch: list[Span] = []
+            span = self._queue.get()
+            while span is not None:
+                batch.append(span)
+                if len(batch) >= self.max_batch_size:
+                    break
+                try:
+                    span = self._queue.get_nowait()
+                except Empty:
+                    break
+            stopped = span is None
+            if batch:
+                try:
+                    self.exporter.export([span.to_dict() for span in batch])
+                except Exception as error:
+                    logger.warning(
+                        "Failed to export %d spans: %s", len(batch), str(error)
+                    )
+
+
+class Tracer:
+    """Traces the runs, a span per stage.
+
+    The current span is kept in a context variable, the spans started under
+    it are its children. Without an exporter the tracer is off and its spans
+    record nothing.
+    """
+
+    def __init__(self, exporter: SpanExporter | None = None) -> None:
+        self._writer = _SpanWriter(exporter) if exporter is not None else None
+        self._current: ContextVar[Span | None] = ContextVar(
+            "current_span", default=None
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self._writer is not None
+
+    def current_span(self) -> Span | None:
+        return self._current.get()
+
+    @contextmanager
+    def span(
+        self,
+        name: str,
+        attributes: dict[str, Any] | None = None,
+        parent: Span | None = None,
+        root: bool = False,
+    ) -> Iterator[Span]:
+        """Time the block as a child of the parent, the current span by default.
+
+        The span is the current one in the block. Without a parent it starts a
+        new trace, with `root` it does too and is linked to the parent rather
+        than its child. An exception raised in the block marks it as failed.
+        """
+        if self._writer is None:
+            yield _NOOP_SPAN
+            return
+        parent = parent or self._current.get()
+        if root:
+            span = Span(name, None, attributes or {}, link=parent)
+        else:
+            span = Span(name, parent, attributes or {})
+        token = self._current.set(span)
+        try:
+            yield span
+        except BaseException as error:
+            span.set_error(f"{type(error).__name__}: {error}")
+            raise
+        finally:
+            self._current.reset(token)
+            span.end_ns = time.time_ns()
+            self._writer.add(span)
+
+    def propagation_headers(self) -> dict[str, str]:
+        """The `traceparent` header of the current span, empty without one"""
+        span = self._current.get()
+        return {"traceparent": span.traceparent} if span is not None else {}
+
+    def stop(self) -> None:
+        """Export the finished spans"""
+        if self._writer is not None:
+            self._writer.stop()
+
+
+def _exporter_from_settings() -> SpanExporter | None:
+    if settings.TRACING_EXPORTER == "FILE":
+        return FileSpanExporter(settings.TRACING_FILE_PATH)
+    if settings.TRACING_EXPORTER == "HTTP":
+        return HttpSpanExporter(settings.TRACING_ENDPOINT)
+    return None
+
+
+tracer = Tracer(_exporter_from_settings())
+atexit.register(tracer.stop)
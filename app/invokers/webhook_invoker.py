@@ -1,12 +1,20 @@
+import hmac
 import json
 import logging
 import time
-from typing import Any, Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache, partial
+from typing import Any, Callable, Sequence
 
-import pyjq as jq
 import requests
 from core.config import Mapping, control_the_payload_config, settings
 from core.consts import consts
+from core.jq_backend import JqBackend, get_jq_backend
+from core.jq_fast_path import FastPathUnsupported
+from core.logs import LazyLogValue
+from core.shutdown import shutdown_coordinator
+from core.tracing import tracer
 from flatten_dict import flatten, unflatten
 from invokers.base_invoker import BaseInvoker
 from port_client import (
@@ -16,13 +24,14 @@ from port_client import (
     run_logger_factory,
     wf_node_run_logger_factory,
 )
-from pydantic import BaseModel, Field
 from requests import Response
 from utils import (
     decrypt_payload_fields,
     get_invocation_method_object,
     get_response_body,
     log_by_detail_level,
+    read_capped_response_body,
+    remove_json_member,
     response_to_dict,
     sign_sha_256,
 )
@@ -31,33 +40,181 @@ logging.basicConfig(level=settings.LOG_LEVEL)
 logger = logging.getLogger(__name__)
 
 
-class RequestPayload(BaseModel):
+@dataclass(slots=True)
+class RequestPayload:
     method: str
     url: str
     body: dict
     headers: dict
     query: dict
 
+    def to_dict(self) -> dict:
+        return {
+            "method": self.method,
+            "url": self.url,
+            "body": self.body,
+            "headers": self.headers,
+            "query": self.query,
+        }
+
 
-class ReportPayload(BaseModel):
+@dataclass(slots=True)
+class ReportPayload:
     status: Any | None = None
     link: Any | None = None
     summary: Any | None = None
-    external_run_id: Any | None = Field(None, alias="externalRunId")
+    external_run_id: Any | None = None
+
+    def to_dict(self) -> dict:
+        """The fields that are set, named as Port expects them"""
+        report = {
+            "status": self.status,
+            "link": self.link,
+            "summary": self.summary,
+            "externalRunId": self.external_run_id,
+        }
+        return {key: value for key, value in report.items() if value is not None}
+
+
+@dataclass
+class InvocationResult:
+    run_id: str | None
+    success: bool = False
+    error: Exception | None = None
+
+
+@lru_cache(maxsize=1024)
+def _compile_jq(backend: JqBackend, expression: str) -> Any:
+    # Compiling costs far more than running, the expressions come from the
+    # mappings so the compiled programs are shared by all the runs
+    return backend.compile(expression)
+
+
+@lru_cache(maxsize=1024)
+def _fast_path(backend: JqBackend, expression: str) -> Callable[[Any], Any] | None:
+    # Most mapping values are plain paths or literals, evaluating them in
+    # Python skips converting the context to a jq value
+    return backend.fast_path(expression)
+
+
+def _log_jq_error(expression: str, error_type: str, error: str) -> None:
+    log_by_detail_level(
+        logger.warning,
+        "WebhookInvoker - jq error - %s",
+        [error_type],
+        "details",
+        {"expression": expression, "error": error},
+    )
+
+
+_LEAF, _LIST, _DICT, _CONSTANT = range(4)
+
+
+def _mapping_shape(mapping: Any, expressions: list[str]) -> tuple[int, Any]:
+    """What `_apply_jq_on_field` builds, with expressions as their indexes"""
+    if isinstance(mapping, dict):
+        return _DICT, [
+            (key, _mapping_shape(value, expressions))
+            for key, value in flatten(mapping).items()
+        ]
+    if isinstance(mapping, list):
+        return _LIST, [_mapping_shape(item, expressions) for item in mapping]
+    if isinstance(mapping, str):
+        expressions.append(mapping)
+        return _LEAF, len(expressions) - 1
+    return _CONSTANT, mapping
+
+
+def _build_from_shape(shape: tuple[int, Any], values: list[Any]) -> Any:
+    kind, spec = shape
+    if kind == _LEAF:
+        return values[spec]
+    if kind == _DICT:
+        return unflatten({key: _build_from_shape(value, values) for key, value in spec})
+    if kind == _LIST:
+        return [_build_from_shape(item, values) for item in spec]
+    return spec
+
+
+@dataclass(frozen=True)
+class _FusedMapping:
+    """The jq expressions of a mapping evaluated by a single program.
+
+    Converting the context to a jq value costs about as much as running an
+    expression, so all the expressions of a mapping run in one program that
+    converts it once. Each expression outputs `[outputs]`, or `{error: ...}`
+    when it fails, so a failing expression only nulls its own field.
+    Expressions that don't compile on their own and the ones with a fast path
+    are left out of the program, there is no program when none is left.
+    """
+
+    fields: tuple[tuple[str, tuple[int, Any]], ...]
+    expressions: tuple[str, ...]
+    compile_errors: dict[int, str]
+    fast_paths: dict[int, Callable[[Any], Any]]
+    program: Any
+
+
+@lru_cache(maxsize=256)
+def _fuse_mapping(backend: JqBackend, template_json: str) -> _FusedMapping:
+    template: dict = json.loads(template_json)
+    expressions: list[str] = []
+    fields = tuple(
+        (key, _mapping_shape(value, expressions)) for key, value in template.items()
+    )
+
+    compile_errors: dict[int, str] = {}
+    fast_paths: dict[int, Callable[[Any], Any]] = {}
+    leaves = []
+    for index, expression in enumerate(expressions):
+        try:
+            _compile_jq(backend, expression)
+        except Exception as e:
+            compile_errors[index] = str(e)
+            leaves.append("null")
+            continue
+        fast_path = _fast_path(backend, expression)
+        if fast_path is not None:
+            fast_paths[index] = fast_path
+            leaves.append("null")
+            continue
+        # The line break ends a trailing comment of the expression
+        leaves.append(f"(try [({expression}\n)] catch {{error: .}})")
+
+    program = None
+    if len(compile_errors) + len(fast_paths) < len(expressions):
+        program = _compile_jq(backend, "[" + ",\n".join(leaves) + "]")
+    return _FusedMapping(
+        fields, tuple(expressions), compile_errors, fast_paths, program
+    )
 
 
 class WebhookInvoker(BaseInvoker):
-    def _jq_exec(self, expression: str, context: dict) -> dict | None:
+    def __init__(self, jq_backend: JqBackend | None = None) -> None:
+        self.jq_backend = jq_backend or get_jq_backend(settings.JQ_BACKEND)
+
+    def _evaluate_jq(
+        self, expression: str, context: dict, prepared_context: Any = None
+    ) -> Any:
+        """The first output of the expression, raises when it fails"""
+        program = _compile_jq(self.jq_backend, expression)
+        fast_path = _fast_path(self.jq_backend, expression)
+        if fast_path is not None:
+            try:
+                return fast_path(context)
+            except FastPathUnsupported:
+                pass
+        if prepared_context is None:
+            prepared_context = self.jq_backend.prepare_input(context)
+        return self.jq_backend.first(program, prepared_context)
+
+    def _jq_exec(
+        self, expression: str, context: dict, prepared_context: Any = None
+    ) -> dict | None:
         try:
-            return jq.first(expression, context)
+            return self._evaluate_jq(expression, context, prepared_context)
         except Exception as e:
-            log_by_detail_level(
-                logger.warning,
-                "WebhookInvoker - jq error - %s",
-                [type(e).__name__],
-                "details",
-                {"expression": expression, "error": str(e)},
-            )
+            _log_jq_error(expression, type(e).__name__, str(e))
             return None
 
     def _apply_jq_on_field(self, mapping: Any, body: dict) -> Any:
@@ -74,6 +231,46 @@ class WebhookInvoker(BaseInvoker):
             return self._jq_exec(mapping, body)
         return mapping
 
+    def _apply_jq_on_mapping(self, template: dict, context: dict) -> dict:
+        """Apply `_apply_jq_on_field` on every value of the template at once"""
+        try:
+            fused = _fuse_mapping(self.jq_backend, json.dumps(template))
+            outputs: Any = None
+            if fused.program is not None:
+                outputs = self.jq_backend.first(
+                    fused.program, self.jq_backend.prepare_input(context)
+                )
+        except Exception:
+            logger.warning(
+                "WebhookInvoker - could not evaluate the mapping as a single jq "
+                "program, evaluating its expressions one by one",
+                exc_info=True,
+            )
+            return {
+                key: self._apply_jq_on_field(value, context)
+                for key, value in template.items()
+            }
+
+        values: list[Any] = []
+        for index, expression in enumerate(fused.expressions):
+            if index in fused.compile_errors:
+                _log_jq_error(expression, "ValueError", fused.compile_errors[index])
+                values.append(None)
+                continue
+            if index in fused.fast_paths:
+                try:
+                    values.append(fused.fast_paths[index](context))
+                except FastPathUnsupported:
+                    values.append(self._jq_exec(expression, context))
+                continue
+            output = outputs[index]
+            if isinstance(output, list):
+                values.append(output[0] if output else None)
+            else:
+                _log_jq_error(expression, "ScriptRuntimeError", str(output["error"]))
+                values.append(None)
+        return {key: _build_from_shape(shape, values) for key, shape in fused.fields}
+
     def _prepare_payload(
         self, mapping: Mapping, body: dict, invocation_method: dict
     ) -> RequestPayload:
@@ -85,12 +282,8 @@ class WebhookInvoker(BaseInvoker):
             query={},
         )
 
-        raw_mapping: dict = mapping.dict(exclude_none=True)
-        raw_mapping.pop("enabled")
-        raw_mapping.pop("report", None)
-        raw_mapping.pop("fieldsToDecryptPaths", None)
-        for key, value in raw_mapping.items():
-            result = self._apply_jq_on_field(value, body)
+        template = mapping.payload_template
+        for key, result in self._apply_jq_on_mapping(template, body).items():
             setattr(request_payload, key, result)
 
         return request_payload
@@ -99,7 +292,7 @@ class WebhookInvoker(BaseInvoker):
         self,
         mapping: Mapping | None,
         response_context: Response,
-        request_context: dict,
+        request_payload: RequestPayload,
         body_context: dict,
     ) -> ReportPayload:
         # We don't want to update the run status if the request succeeded and the
@@ -121,32 +314,41 @@ class WebhookInvoker(BaseInvoker):
         if not mapping or not mapping.report:
             return report_payload
 
+        context_keys = mapping.report.context_keys
+        context_builders: dict[str, Callable[[], Any]] = {
+            "body": lambda: body_context,
+            "request": request_payload.to_dict,
+            "response": lambda: response_to_dict(response_context),
+        }
         context = {
-            "body": body_context,
-            "request": request_context,
-            "response": response_to_dict(response_context),
+            key: build()
+            for key, build in context_builders.items()
+            if context_keys is None or key in context_keys
         }
 
-        raw_mapping: dict = mapping.report.dict(exclude_none=True)
-        for key, value in raw_mapping.items():
-            result = self._apply_jq_on_field(value, context)
+        template = mapping.report.template
+        for key, result in self._apply_jq_on_mapping(template, context).items():
             setattr(report_payload, key, result)
 
         return report_payload
 
-    def _find_mapping(self, body: dict) -> Mapping | None:
-        return next(
-            (
-                action_mapping
-                for action_mapping in control_the_payload_config
-                if (
-                    type(action_mapping.enabled) != bool
-                    and self._jq_exec(action_mapping.enabled, body) is True
-                )
-                or action_mapping.enabled is True
-            ),
-            None,
-        )
+    def _find_mapping(
+        self, body: dict, mappings: list[Mapping] | None = None
+    ) -> Mapping | None:
+        # Converted once for all the `enabled` expressions
+        prepared_body = None
+        for action_mapping in (
+            control_the_payload_config if mappings is None else mappings
+        ):
+            if isinstance(action_mapping.enabled, bool):
+                if action_mapping.enabled:
+                    return action_mapping
+                continue
+            if prepared_body is None:
+                prepared_body = self.jq_backend.prepare_input(body)
+            if self._jq_exec(action_mapping.enabled, body, prepared_body) is True:
+                return action_mapping
+        return None
 
     @staticmethod
     def _request(
@@ -160,22 +362,54 @@ class WebhookInvoker(BaseInvoker):
             request_payload.body,
         )
         run_logger("Sending the request")
-        request_payload.headers["X-Port-Timestamp"] = str(int(time.time()))
-        request_payload.headers["X-Port-Signature"] = sign_sha_256(
-            json.dumps(request_payload.body, separators=(",", ":")),
-            settings.PORT_CLIENT_SECRET,
-            request_payload.headers["X-Port-Timestamp"],
-        )
-
-        res = requests.request(
-            request_payload.method,
-            request_payload.url,
-            json=request_payload.body,
-            headers=request_payload.headers,
-            params=request_payload.query,
-            timeout=settings.WEBHOOK_INVOKER_TIMEOUT,
-            verify=settings.WEBHOOK_VERIFY_SSL,
-        )
+        # The body is serialized once so the signed bytes are the sent bytes
+        serialized_body = json.dumps(
+            request_payload.body, separators=(",", ":"), allow_nan=False
+        ).encode("utf-8")
+        timestamp = str(int(time.time()))
+        with tracer.span(
+            "webhook.request",
+            {
+                "http.request.method": request_payload.method,
+                "url.full": request_payload.url,
+            },
+        ) as span:
+            # The payload is left as is, the sent headers are a new dict
+            headers = {
+                **request_payload.headers,
+                "X-Port-Timestamp": timestamp,
+                "X-Port-Signature": sign_sha_256(
+                    serialized_body, settings.PORT_CLIENT_SECRET, timestamp
+                ),
+            }
+            if not any(header.lower() == "traceparent" for header in headers):
+                headers.update(tracer.propagation_headers())
+            if request_payload.body is None:
+                data = None
+            else:
+                data = serialized_body
+                if not any(header.lower() == "content-type" for header in headers):
+                    headers["Content-Type"] = "application/json"
+
+            res = requests.request(
+                request_payload.method,
+                request_payload.url,
+                data=data,
+                headers=headers,
+                params=request_payload.query,
+                timeout=settings.WEBHOOK_INVOKER_TIMEOUT,
+                verify=settings.WEBHOOK_VERIFY_SSL,
+                stream=True,
+            )
+            if read_capped_response_body(res, settings.WEBHOOK_MAX_RESPONSE_BODY_BYTES):
+                logger.warning(
+                    "WebhookInvoker - request - response body exceeded %d bytes "
+                    "and was truncated",
+                    settings.WEBHOOK_MAX_RESPONSE_BODY_BYTES,
+                )
+            span.set_attribute("http.response.status_code", res.status_code)
+            if not res.ok:
+                span.set_error(f"Status code {res.status_code}")
 
         if res.ok:
             log_by_detail_level(
@@ -207,7 +441,7 @@ class WebhookInvoker(BaseInvoker):
     @staticmethod
     def _report_run_status(
         run_id: str, data_to_patch: dict, run_logger: Callable[[str], None]
-    ) -> Response:
+    ) -> Response | None:
         try:
             res = report_run_status(run_id, data_to_patch)
         except requests.HTTPError as e:
@@ -228,6 +462,13 @@ class WebhookInvoker(BaseInvoker):
             run_logger(user_msg)
             return res
 
+        if res is None:
+            logger.info(
+                "WebhookInvoker - report run - run_id: %s, retrying in background",
+                run_id,
+            )
+            return res
+
         logger.info(
             "WebhookInvoker - report run - run_id: %s, status_code: %s",
             run_id,
@@ -238,7 +479,7 @@ class WebhookInvoker(BaseInvoker):
     @staticmethod
     def _report_run_response(
         run_id: str, response_body: dict | str | None, run_logger: Callable[[str], None]
-    ) -> Response:
+    ) -> Response | None:
         log_by_detail_level(
             logger.info,
             "WebhookInvoker - report run response - run_id: %s",
@@ -250,7 +491,13 @@ class WebhookInvoker(BaseInvoker):
 
         res = report_run_response(run_id, response_body)
 
-        if res.ok:
+        if res is None:
+            logger.info(
+                "WebhookInvoker - report run response - "
+                "run_id: %s, retrying in background",
+                run_id,
+            )
+        elif res.ok:
             logger.info(
                 "WebhookInvoker - report run response - " "run_id: %s, status_code: %s",
                 run_id,
@@ -293,7 +540,8 @@ class WebhookInvoker(BaseInvoker):
     ) -> None:
         node_run_logger = wf_node_run_logger_factory(run_id)
         node_run_logger("A workflow node run has been received")
-        request_payload = self._prepare_payload(mapping, msg, invocation_method)
+        with tracer.span("payload.prepare"):
+            request_payload = self._prepare_payload(mapping, msg, invocation_method)
         try:
             res = self._request(request_payload, node_run_logger)
             res.raise_for_status()
@@ -312,9 +560,11 @@ class WebhookInvoker(BaseInvoker):
                     "data": get_response_body(res) or {},
                 }
             }
-            report_wf_node_run_status(
-                run_id, {"status": "COMPLETED", "result": "SUCCESS", "output": output}
-            )
+            with tracer.span("port.report_status"):
+                report_wf_node_run_status(
+                    run_id,
+                    {"status": "COMPLETED", "result": "SUCCESS", "output": output},
+                )
         node_run_logger("Port agent finished processing the workflow node run")
 
     def _invoke_run(
@@ -328,28 +578,30 @@ class WebhookInvoker(BaseInvoker):
             "WebhookInvoker - preparing mapping - run_id: %s",
             [run_id],
             "mapping",
-            mapping.dict() if mapping else None,
+            LazyLogValue(mapping.dict),
         )
         run_logger("Preparing the payload for the request")
-        request_payload = self._prepare_payload(mapping, body, invocation_method)
+        with tracer.span("payload.prepare"):
+            request_payload = self._prepare_payload(mapping, body, invocation_method)
         res = self._request(request_payload, run_logger)
 
         response_body = get_response_body(res)
         if invocation_method.get("synchronized") and response_body:
-            self._report_run_response(run_id, response_body, run_logger)
+            with tracer.span("port.report_response"):
+                self._report_run_response(run_id, response_body, run_logger)
 
-        report_payload = self._prepare_report(
-            mapping, res, request_payload.dict(), body
-        )
-        if report_dict := report_payload.dict(exclude_none=True, by_alias=True):
+        with tracer.span("report.prepare"):
+            report_payload = self._prepare_report(mapping, res, request_payload, body)
+        if report_dict := report_payload.to_dict():
             log_by_detail_level(
                 logger.info,
                 "WebhookInvoker - report mapping - run_id: %s",
                 [run_id],
                 "report_payload",
-                report_payload.dict(exclude_none=True, by_alias=True),
+                report_dict,
             )
-            self._report_run_status(run_id, report_dict, run_logger)
+            with tracer.span("port.report_status"):
+                self._report_run_status(run_id, report_dict, run_logger)
         else:
             logger.info(
                 "WebhookInvoker - report mapping "
@@ -359,48 +611,200 @@ class WebhookInvoker(BaseInvoker):
         res.raise_for_status()
         run_logger("Port agent finished processing the action run")
 
-    def validate_incoming_signature(
-        self, msg: dict, invocation_method_name: str
+    @staticmethod
+    def _verify_raw_signature(
+        raw_msg: bytes, port_signature: str, port_timestamp: Any
     ) -> bool:
+        """Verify the signature against the raw message bytes.
+
+        Port signs the compact dump of the message without its signature
+        headers, so when the message was produced in that same form, removing
+        the two header members from the raw bytes gives back the signed bytes
+        without re-serializing the message. Any other layout falls back to the
+        canonical dump.
+        """
+        without_signature = remove_json_member(raw_msg, "X-Port-Signature")
+        if without_signature is None or without_signature[1] != port_signature:
+            return False
+        without_timestamp = remove_json_member(without_signature[0], "X-Port-Timestamp")
+        if without_timestamp is None or without_timestamp[1] != str(port_timestamp):
+            return False
+
+        signed_bytes, timestamp = without_timestamp
+        expected_sig = sign_sha_256(
+            signed_bytes, settings.PORT_CLIENT_SECRET, timestamp
+        )
+        return hmac.compare_digest(expected_sig.encode(), port_signature.encode())
+
+    def verify_signature(
+        self,
+        msg: dict,
+        invocation_method_name: str,
+        raw_msg: bytes | None = None,
+    ) -> dict | None:
+        """Verify Port's signature of an incoming message.
+
+        Returns the message without Port's generated headers, which shouldn't
+        be used by the mappings, or `None` if the signature is invalid. The
+        given message isn't modified.
+        """
         if "changelogDestination" in msg:
-            return True
+            return msg
 
-        port_signature = msg.get("headers", {}).get("X-Port-Signature")
-        port_timestamp = msg.get("headers", {}).get("X-Port-Timestamp")
+        headers = msg.get("headers", {})
+        port_signature = headers.get("X-Port-Signature")
+        port_timestamp = headers.get("X-Port-Timestamp")
 
         if not port_signature or not port_timestamp:
             logger.warning(
                 "WebhookInvoker - Could not find the required headers, skipping the"
                 " event invocation method for the event"
             )
-            return False
+            return None
 
         # Remove Port's generated headers to avoid them being
         # used in the signature verification
         if invocation_method_name == "GITLAB":
-            del msg["headers"]
+            stripped_msg = {
+                key: value for key, value in msg.items() if key != "headers"
+            }
         else:
-            del msg["headers"]["X-Port-Signature"]
-            del msg["headers"]["X-Port-Timestamp"]
+            stripped_headers = {
+                key: value
+                for key, value in headers.items()
+                if key not in ("X-Port-Signature", "X-Port-Timestamp")
+            }
+            stripped_msg = {
+                key: stripped_headers if key == "headers" else value
+                for key, value in msg.items()
+            }
+            if (
+                raw_msg is not None
+                and isinstance(port_signature, str)
+                and self._verify_raw_signature(raw_msg, port_signature, port_timestamp)
+            ):
+                return stripped_msg
 
         expected_sig = sign_sha_256(
-            json.dumps(msg, separators=(",", ":"), ensure_ascii=False),
+            json.dumps(stripped_msg, separators=(",", ":"), ensure_ascii=False),
             settings.PORT_CLIENT_SECRET,
             port_timestamp,
         )
-        if expected_sig != port_signature:
+        if not hmac.compare_digest(expected_sig.encode(), str(port_signature).encode()):
             logger.warning(
                 "WebhookInvoker - Could not verify signature, skipping the event"
             )
-            return False
-        return True
+            return None
+        return stripped_msg
+
+    def validate_incoming_signature(
+        self, msg: dict, invocation_method_name: str
+    ) -> bool:
+        return self.verify_signature(msg, invocation_method_name) is not None
+
+    def _report_unfinished_run(self, run_id: str) -> None:
+        if run_id.startswith(consts.WF_NODE_RUN_ID_PREFIX):
+            self._report_wf_node_run_failure(run_id)
+        else:
+            report_run_status(
+                run_id,
+                {
+                    "status": "FAILURE",
+                    "summary": "The agent shut down before the run was processed",
+                },
+            )
 
     def invoke(
         self,
         msg: dict,
         invocation_method: dict,
         skip_signature_validation: bool = False,
+        raw_msg: bytes | None = None,
     ) -> bool:
+        run_id = msg.get("context", {}).get("runId")
+        # Each run is its own trace, linked to the batch or poll it came from,
+        # so the webhooks of unrelated runs don't share a trace
+        with tracer.span(
+            "run", {"run.id": run_id}, root=True
+        ), shutdown_coordinator.track(run_id, self._unfinished_run_reporter(run_id)):
+            resolved = self._resolve(
+                msg, invocation_method, skip_signature_validation, raw_msg
+            )
+            if resolved is None:
+                return False
+            return self._dispatch(*resolved, invocation_method)
+
+    def invoke_many(
+        self,
+        batch: Sequence[tuple[dict, dict]],
+        skip_signature_validation: bool = False,
+        raw_msgs: Sequence[bytes | None] | None = None,
+    ) -> list[InvocationResult]:
+        """Invoke a batch of `(message, invocation method)` pairs.
+
+        The messages are validated and their mappings selected for the whole
+        batch first, then the requests are sent concurrently. The dispatching
+        follows the order of the batch, so with a single worker the messages
+        are handled in the order they were received. Returns a result per
+        message, errors are returned rather than raised.
+        """
+        results = [
+            InvocationResult(msg.get("context", {}).get("runId")) for msg, _ in batch
+        ]
+        resolved_batch: list[tuple[int, dict, Mapping, dict]] = []
+        for index, (msg, invocation_method) in enumerate(batch):
+            try:
+                resolved = self._resolve(
+                    msg,
+                    invocation_method,
+                    skip_signature_validation,
+                    raw_msgs[index] if raw_msgs is not None else None,
+                )
+            except Exception as error:
+                results[index].error = error
+                continue
+            if resolved is not None:
+                resolved_msg, mapping = resolved
+                resolved_batch.append((index, resolved_msg, mapping, invocation_method))
+
+        batch_span = tracer.current_span()
+
+        def dispatch(
+            index: int, msg: dict, mapping: Mapping, invocation_method: dict
+        ) -> None:
+            run_id = results[index].run_id
+            try:
+                # The pool's threads don't have the batch's context
+                with tracer.span(
+                    "run", {"run.id": run_id}, parent=batch_span, root=True
+                ), shutdown_coordinator.track(
+                    run_id, self._unfinished_run_reporter(run_id)
+                ):
+                    results[index].success = self._dispatch(
+                        msg, mapping, invocation_method
+                    )
+            except Exception as error:
+                results[index].error = error
+
+        max_workers = max(settings.WEBHOOK_INVOKER_MAX_CONCURRENCY, 1)
+        with ThreadPoolExecutor(max_workers, "webhook-invoker") as executor:
+            for invocation in resolved_batch:
+                executor.submit(dispatch, *invocation)
+        return results
+
+    def _unfinished_run_reporter(self, run_id: str | None) -> Callable[[], None] | None:
+        if not run_id:
+            return None
+        return partial(self._report_unfinished_run, run_id)
+
+    def _resolve(
+        self,
+        msg: dict,
+        invocation_method: dict,
+        skip_signature_validation: bool,
+        raw_msg: bytes | None = None,
+    ) -> tuple[dict, Mapping] | None:
+        """Validate the message and select its mapping, `None` to skip it"""
         log_by_detail_level(
             logger.info,
             "WebhookInvoker - start - destination type: %s",
@@ -414,16 +818,19 @@ class WebhookInvoker(BaseInvoker):
         )
 
         invocation_method_name = invocation_method.get("type") or consts.MISSING_VALUE
-        if not skip_signature_validation and not self.validate_incoming_signature(
-            msg, invocation_method_name
-        ):
-            if is_wf_node_run:
-                self._report_wf_node_run_failure(run_id)
-            return False
+        if not skip_signature_validation:
+            verified_msg = self.verify_signature(msg, invocation_method_name, raw_msg)
+            if verified_msg is None:
+                if is_wf_node_run:
+                    self._report_wf_node_run_failure(run_id)
+                return None
+            msg = verified_msg
 
         logger.info("WebhookInvoker - validating signature")
 
-        mapping = self._find_mapping(msg)
+        with tracer.span("mapping.select") as span:
+            mapping = self._find_mapping(msg)
+            span.set_attribute("mapping.found", mapping is not None)
         if mapping is None:
             log_by_detail_level(
                 logger.info,
@@ -437,16 +844,19 @@ class WebhookInvoker(BaseInvoker):
             )
             if is_wf_node_run:
                 self._report_wf_node_run_failure(run_id)
-            return False
+            return None
 
-        self._replace_encrypted_fields(msg, mapping)
+        return self._replace_encrypted_fields(msg, mapping), mapping
 
-        if is_wf_node_run:
+    def _dispatch(self, msg: dict, mapping: Mapping, invocation_method: dict) -> bool:
+        run_id = msg.get("context", {}).get("runId")
+        if run_id and run_id.startswith(consts.WF_NODE_RUN_ID_PREFIX):
             self._invoke_wf_node_run(run_id, mapping, msg, invocation_method)
         elif run_id:
             self._invoke_run(run_id, mapping, msg, invocation_method)
         elif invocation_method.get("url"):
-            request_payload = self._prepare_payload(mapping, msg, invocation_method)
+            with tracer.span("payload.prepare"):
+                request_payload = self._prepare_payload(mapping, msg, invocation_method)
             res = self._request(request_payload, lambda _: None)
             res.raise_for_status()
         else:
@@ -458,19 +868,20 @@ class WebhookInvoker(BaseInvoker):
         logger.info("Finished processing the event")
         return True
 
-    def _replace_encrypted_fields(self, msg: dict, mapping: Mapping) -> None:
+    def _replace_encrypted_fields(self, msg: dict, mapping: Mapping) -> dict:
+        """The message with the mapping's encrypted fields decrypted.
+
+        The given message isn't modified, it may be shared with other runs.
+        """
         fields_to_decrypt = getattr(mapping, "fieldsToDecryptPaths", None)
         if not settings.PORT_CLIENT_SECRET or not fields_to_decrypt:
-            return
+            return msg
         if settings.DETAILED_LOGGING:
             logger.info(
                 "WebhookInvoker - decrypting fields - fields: %s", fields_to_decrypt
             )
         decryption_key = settings.PORT_CLIENT_SECRET
-        decrypted_payload = decrypt_payload_fields(
-            msg, fields_to_decrypt, decryption_key
-        )
-        msg.update(decrypted_payload)
+        return decrypt_payload_fields(msg, fields_to_decrypt, decryption_key)
 
 
 webhook_invoker = WebhookInvoker()
@@ -1,25 +1,52 @@
 import logging
+from typing import Callable
 
+from core.admin import AdminServer
 from core.config import settings
+from core.consts import consts
+from core.logs import configure_logging
+from core.profiling import profiler
 from port_client import patch_org_streamer_setting
 from streamers.streamer_factory import StreamerFactory
+from supervisor import WorkerSupervisor
 
 logging.basicConfig(level=settings.LOG_LEVEL)
 logger = logging.getLogger(__name__)
 
 
+def _start_admin_server(capture_profile: Callable[[], bool]) -> None:
+    if settings.ADMIN_PORT:
+        AdminServer(settings.ADMIN_HOST, settings.ADMIN_PORT, capture_profile).start()
+
+
 def main() -> None:
-    try:
+    configure_logging()
+    if settings.STREAMER_NAME in consts.PORT_STREAMER_TYPES:
+        try:
+            logger.info(
+                "Updating org streamer setting to match streamer type: %s",
+                settings.STREAMER_NAME,
+            )
+            patch_org_streamer_setting(settings.STREAMER_NAME)
+        except Exception as error:
+            logger.warning(
+                "Failed to update org streamer setting: %s. Continuing startup...",
+                str(error),
+            )
+
+    if settings.WORKERS_COUNT > 1:
         logger.info(
-            "Updating org streamer setting to match streamer type: %s",
+            "Starting %d workers with streamer type: %s",
+            settings.WORKERS_COUNT,
             settings.STREAMER_NAME,
         )
-        patch_org_streamer_setting(settings.STREAMER_NAME)
-    except Exception as error:
-        logger.warning(
-            "Failed to update org streamer setting: %s. Continuing startup...",
-            str(error),
-        )
+        supervisor = WorkerSupervisor(settings.WORKERS_COUNT)
+        _start_admin_server(supervisor.request_profile)
+        supervisor.run()
+        return
+
+    profiler.install_signal_handler()
+    _start_admin_server(profiler.capture)
 
     streamer_factory = StreamerFactory()
     streamer = streamer_factory.get_streamer(settings.STREAMER_NAME)
@@ -1,14 +1,269 @@
+import heapq
+import itertools
+import threading
+import time
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
 from logging import getLogger
 from typing import Callable
 
 import requests
 from core.config import settings
 from core.consts import consts
+from core.retry import BackoffPolicy, RetryBudget
+from core.shutdown import shutdown_coordinator
+from core.tracing import tracer
 from requests import Response
 from utils import log_by_detail_level
 
 logger = getLogger(__name__)
 
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+# PATCH is included as every PATCH sent by the agent sets an absolute value
+# (a run status or response), so sending it twice has the same effect
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "PUT", "PATCH", "DELETE"})
+
+
+def _retry_after_seconds(response: Response) -> float | None:
+    retry_after = response.headers.get("Retry-After")
+    if not retry_after:
+        return None
+    try:
+        return max(float(retry_after), 0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_retryable_response(response: Response) -> bool:
+    status_code = response.status_code
+    return isinstance(status_code, int) and status_code in RETRYABLE_STATUS_CODES
+
+
+@dataclass(order=True)
+class _PendingRetry:
+    due_at: float
+    sequence: int
+    key: str = field(compare=False)
+    send: Callable[[], Response] = field(compare=False)
+    attempt: int = field(compare=False)
+
+
+class PortApiRetrier:
+    """Retries failed Port API calls in a background thread.
+
+    The first attempt is made by the caller. When it fails with a retryable
+    error the call is handed over to the retry thread and the caller gets
+    `None` back, so retries never delay the processing of the next run.
+    Calls are keyed by their URL and the fields they set, a newer call to the
+    same URL supersedes the pending retries of the older ones whose fields it
+    sets too, so a stale status never overrides a newer one while the retry of
+    other fields goes on.
+    """
+
+    def __init__(
+        self, policy: BackoffPolicy, budget: RetryBudget, max_retries: int
+    ) -> None:
+        self.policy = policy
+        self.budget = budget
+        self.max_retries = max_retries
+        self._pending: list[_PendingRetry] = []
+        # The calls not superseded yet by URL, their sequence to their fields
+        self._latest: dict[str, dict[int, frozenset[str]]] = {}
+        self._sequence = itertools.count()
+        self._wakeup = threading.Condition()
+        self._thread: threading.Thread | None = None
+
+    def call(
+        self,
+        method: str,
+        key: str,
+        send: Callable[[], Response],
+        fields: frozenset[str] = frozenset(),
+    ) -> Response | None:
+        with self._wakeup:
+            sequence = next(self._sequence)
+            calls = self._latest.setdefault(key, {})
+            for superseded in [
+                older for older, older_fields in calls.items() if older_fields <= fields
+            ]:
+                del calls[superseded]
+            calls[sequence] = fields
+
+        try:
+            response = send()
+        except (requests.ConnectionError, requests.Timeout) as error:
+            if method in IDEMPOTENT_METHODS and self._schedule(
+                key, sequence, send, 0, None, str(error)
+            ):
+                return None
+            self._forget(key, sequence)
+            raise
+
+        if (
+            method in IDEMPOTENT_METHODS
+            and _is_retryable_response(response)
+            and self._schedule(
+                key,
+                sequence,
+                send,
+                0,
+                _retry_after_seconds(response),
+                f"status code {response.status_code}",
+            )
+        ):
+            return None
+        self._forget(key, sequence)
+        return response
+
+    def _forget(self, key: str, sequence: int) -> None:
+        with self._wakeup:
+            calls = self._latest.get(key)
+            if calls is not None and calls.pop(sequence, None) is not None:
+                if not calls:
+                    del self._latest[key]
+
+    @property
+    def pending_count(self) -> int:
+        with self._wakeup:
+            return len(self._pending)
+
+    def _schedule(
+        self,
+        key: str,
+        sequence: int,
+        send: Callable[[], Response],
+        attempt: int,
+        retry_after: float | None,
+        reason: str,
+    ) -> bool:
+        if attempt >= self.max_retries:
+            logger.error(
+                "Port API call to %s failed after %d retries: %s",
+                key,
+                attempt,
+                reason,
+            )
+            return False
+        if not self.budget.try_acquire():
+            logger.warning(
+                "Port API retry budget exhausted, not retrying call to %s: %s",
+                key,
+                reason,
+            )
+            return False
+
+        delay = self.policy.delay(attempt)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.policy.max_seconds))
+        logger.warning(
+            "Port API call to %s failed: %s, retrying in %.1f seconds",
+            key,
+            reason,
+            delay,
+        )
+        with self._wakeup:
+            heapq.heappush(
+                self._pending,
+                _PendingRetry(time.monotonic() + delay, sequence, key, send, attempt),
+            )
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="port-api-retrier", daemon=True
+                )
+                self._thread.start()
+            self._wakeup.notify()
+        return True
+
+    def _pop_due(self, block: bool) -> _PendingRetry | None:
+        with self._wakeup:
+            while True:
+                if self._pending and not block:
+                    return heapq.heappop(self._pending)
+                if not self._pending:
+                    if not block:
+                        return None
+                    self._wakeup.wait()
+                    continue
+                timeout = self._pending[0].due_at - time.monotonic()
+                if timeout <= 0:
+                    return heapq.heappop(self._pending)
+                self._wakeup.wait(timeout)
+
+    def _retry(self, pending: _PendingRetry) -> None:
+        with self._wakeup:
+            if pending.sequence not in self._latest.get(pending.key, {}):
+                logger.debug("Dropping superseded retry of %s", pending.key)
+                return
+
+        retry_after = None
+        try:
+            response = pending.send()
+            if not _is_retryable_response(response):
+                self._forget(pending.key, pending.sequence)
+                if response.ok:
+                    logger.info("Port API call to %s succeeded on retry", pending.key)
+                else:
+                    log_by_detail_level(
+                        logger.error,
+                        "Port API call to %s failed on retry - status: %s",
+                        [pending.key, response.status_code],
+                        "response",
+                        response.text,
+                    )
+                return
+            reason = f"status code {response.status_code}"
+            retry_after = _retry_after_seconds(response)
+        except (requests.ConnectionError, requests.Timeout) as error:
+            reason = str(error)
+        except Exception as error:
+            logger.error("Port API call to %s failed on retry: %s", pending.key, error)
+            self._forget(pending.key, pending.sequence)
+            return
+
+        if not self._schedule(
+            pending.key,
+            pending.sequence,
+            pending.send,
+            pending.attempt + 1,
+            retry_after,
+            reason,
+        ):
+            self._forget(pending.key, pending.sequence)
+
+    def _run(self) -> None:
+        while True:
+            pending = self._pop_due(block=True)
+            if pending is not None:
+                self._retry(pending)
+
+    def flush(self, timeout: float) -> None:
+        """Attempts the pending retries right away, used on shutdown"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            pending = self._pop_due(block=False)
+            if pending is None:
+                return
+            pending.attempt = self.max_retries
+            self._retry(pending)
+        if self.pending_count:
+            logger.warning(
+                "Dropping %d pending Port API retries on shutdown", self.pending_count
+            )
+
+
+port_api_retrier = PortApiRetrier(
+    BackoffPolicy.from_settings(),
+    RetryBudget(
+        settings.PORT_API_RETRY_BUDGET, settings.PORT_API_RETRY_BUDGET_WINDOW_SECONDS
+    ),
+    settings.PORT_API_MAX_RETRIES,
+)
+shutdown_coordinator.register_flush(port_api_retrier.flush)
+
 
 def get_port_api_headers() -> dict[str, str]:
     credentials = {
@@ -34,56 +289,76 @@ def get_port_api_headers() -> dict[str, str]:
     return {
         "Authorization": f"Bearer {token_response.json()['accessToken']}",
         "User-Agent": "port-agent",
+        **tracer.propagation_headers(),
     }
 
 
+def _skip_log(message: str) -> None:
+    pass
+
+
 def run_logger_factory(run_id: str) -> Callable[[str], None]:
+    if settings.PORT_API_OFFLINE:
+        return _skip_log
+
     def send_run_log(message: str) -> None:
-        headers = get_port_api_headers()
+        with tracer.span("port.send_log"):
+            headers = get_port_api_headers()
 
-        requests.post(
-            f"{settings.PORT_API_BASE_URL}/v1/actions/runs/{run_id}/logs",
-            json={"message": message},
-            headers=headers,
-        )
+            requests.post(
+                f"{settings.PORT_API_BASE_URL}/v1/actions/runs/{run_id}/logs",
+                json={"message": message},
+                headers=headers,
+            )
 
     return send_run_log
 
 
 def wf_node_run_logger_factory(node_run_id: str) -> Callable[[str], None]:
+    if settings.PORT_API_OFFLINE:
+        return _skip_log
+
     def send_log(message: str) -> None:
-        headers = get_port_api_headers()
+        with tracer.span("port.send_log"):
+            headers = get_port_api_headers()
 
-        requests.post(
-            f"{settings.PORT_API_BASE_URL}/v1/workflows/nodes/runs/{node_run_id}/logs",
-            json={"logs": [{"level": "INFO", "message": message}]},
-            headers=headers,
-        )
+            requests.post(
+                f"{settings.PORT_API_BASE_URL}/v1/workflows/nodes/runs/"
+                f"{node_run_id}/logs",
+                json={"logs": [{"level": "INFO", "message": message}]},
+                headers=headers,
+            )
 
     return send_log
 
 
-def report_run_status(run_id: str, data_to_patch: dict) -> Response:
-    headers = get_port_api_headers()
-    res = requests.patch(
-        f"{settings.PORT_API_BASE_URL}/v1/actions/runs/{run_id}",
-        json=data_to_patch,
-        headers=headers,
-    )
-    res.raise_for_status()
-    return res
+def report_run_status(run_id: str, data_to_patch: dict) -> Response | None:
+    if settings.PORT_API_OFFLINE:
+        return None
+    url = f"{settings.PORT_API_BASE_URL}/v1/actions/runs/{run_id}"
 
+    def send() -> Response:
+        headers = get_port_api_headers()
+        return requests.patch(url, json=data_to_patch, headers=headers)
 
-def report_run_response(run_id: str, response: dict | str | None) -> Response:
-    headers = get_port_api_headers()
-    res = requests.patch(
-        f"{settings.PORT_API_BASE_URL}/v1/actions/runs/{run_id}/response",
-        json={"response": response},
-        headers=headers,
-    )
+    res = port_api_retrier.call("PATCH", url, send, frozenset(data_to_patch))
+    if res is not None:
+        res.raise_for_status()
     return res
 
 
+def report_run_response(run_id: str, response: dict | str | None) -> Response | None:
+    if settings.PORT_API_OFFLINE:
+        return None
+    url = f"{settings.PORT_API_BASE_URL}/v1/actions/runs/{run_id}/response"
+
+    def send() -> Response:
+        headers = get_port_api_headers()
+        return requests.patch(url, json={"response": response}, headers=headers)
+
+    return port_api_retrier.call("PATCH", url, send, frozenset({"response"}))
+
+
 def get_kafka_credentials() -> tuple[list[str], str, str]:
     headers = get_port_api_headers()
     res = requests.get(
@@ -166,19 +441,23 @@ def ack_wf_node_run(node_run_identifier: str) -> bool:
 
 def report_wf_node_run_status(
     node_run_identifier: str, data_to_patch: dict
-) -> Response:
-    headers = get_port_api_headers()
-    res = requests.patch(
-        f"{settings.PORT_API_BASE_URL}/v1/workflows/nodes/runs/{node_run_identifier}",
-        json=data_to_patch,
-        headers=headers,
-    )
-    res.raise_for_status()
+) -> Response | None:
+    if settings.PORT_API_OFFLINE:
+        return None
+    url = f"{settings.PORT_API_BASE_URL}/v1/workflows/nodes/runs/{node_run_identifier}"
+
+    def send() -> Response:
+        headers = get_port_api_headers()
+        return requests.patch(url, json=data_to_patch, headers=headers)
+
+    res = port_api_retrier.call("PATCH", url, send, frozenset(data_to_patch))
+    if res is not None:
+        res.raise_for_status()
     return res
 
 
 def patch_org_streamer_setting(streamer_type: str) -> None:
-    if streamer_type not in consts.VALID_STREAMER_TYPES:
+    if streamer_type not in consts.PORT_STREAMER_TYPES:
         logger.warning(
             "Unknown streamer type %s, skipping org setting update", streamer_type
         )
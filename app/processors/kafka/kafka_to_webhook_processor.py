@@ -4,7 +4,6 @@ import logging
 from confluent_kafka import Message
 from core.config import settings
 from invokers.webhook_invoker import webhook_invoker
-from utils import log_by_detail_level
 
 logging.basicConfig(level=settings.LOG_LEVEL)
 logger = logging.getLogger(__name__)
@@ -12,20 +11,70 @@ logger = logging.getLogger(__name__)
 
 class KafkaToWebhookProcessor:
     @staticmethod
-    def msg_process(msg: Message, invocation_method: dict, topic: str) -> None:
-        log_by_detail_level(
-            logger.info,
+    def msg_process(
+        msg: Message,
+        invocation_method: dict,
+        topic: str,
+        msg_value: dict | None = None,
+    ) -> None:
+        # The raw value is logged by the streamer when the message is received
+        logger.info(
             "Processing message - topic: %s, partition: %d, offset: %d",
-            [topic, msg.partition(), msg.offset()],
-            "raw_value",
-            msg.value(),
+            topic,
+            msg.partition(),
+            msg.offset(),
         )
-        msg_value = json.loads(msg.value().decode())
+        if msg_value is None:
+            msg_value = json.loads(msg.value().decode())
 
-        if webhook_invoker.invoke(msg_value, invocation_method):
+        if webhook_invoker.invoke(msg_value, invocation_method, raw_msg=msg.value()):
             logger.info(
                 "Successfully processed message from topic %s, partition %d, offset %d",
                 topic,
                 msg.partition(),
                 msg.offset(),
             )
+
+    @staticmethod
+    def msg_process_batch(
+        batch: list[tuple[Message, dict, dict]],
+    ) -> list[tuple[Message, Exception]]:
+        """Process `(message, invocation method, parsed value)` triples at once.
+
+        Returns the messages that failed along with their error.
+        """
+        for msg, _, _ in batch:
+            logger.info(
+                "Processing message - topic: %s, partition: %d, offset: %d",
+                msg.topic(),
+                msg.partition(),
+                msg.offset(),
+            )
+
+        results = webhook_invoker.invoke_many(
+            [
+                (msg_value, invocation_method)
+                for _, invocation_method, msg_value in batch
+            ],
+            raw_msgs=[msg.value() for msg, _, _ in batch],
+        )
+        failures: list[tuple[Message, Exception]] = []
+        for (msg, _, _), result in zip(batch, results):
+            if result.error is not None:
+                failures.append((msg, result.error))
+                logger.error(
+                    "Failed process message from topic %s, partition %d, offset %d: %s",
+                    msg.topic(),
+                    msg.partition(),
+                    msg.offset(),
+                    str(result.error),
+                )
+            elif result.success:
+                logger.info(
+                    "Successfully processed message from topic %s, partition %d, "
+                    "offset %d",
+                    msg.topic(),
+                    msg.partition(),
+                    msg.offset(),
+                )
+        return failures
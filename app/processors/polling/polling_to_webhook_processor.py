@@ -1,13 +1,36 @@
 import logging
+from typing import Callable
 
 from core.config import settings
-from invokers.webhook_invoker import webhook_invoker
+from invokers.webhook_invoker import InvocationResult, webhook_invoker
 
 logging.basicConfig(level=settings.LOG_LEVEL)
 logger = logging.getLogger(__name__)
 
 
 class PollingToWebhookProcessor:
+    @staticmethod
+    def _build_run_message(run_id: str, run: dict, invocation_method: dict) -> dict:
+        """The message of the run, the run itself isn't modified.
+
+        Only the objects on the paths written to are copied, the rest of the
+        body, like the user inputs, is shared with the run.
+        """
+        body = run["payload"]["body"]
+        payload = body.get("payload", {})
+        return {
+            **body,
+            "headers": invocation_method.get("headers", {}),
+            "payload": {
+                **payload,
+                "action": {
+                    **payload.get("action", {}),
+                    "invocationMethod": invocation_method,
+                },
+            },
+            "context": {**body.get("context", {}), "runId": run_id},
+        }
+
     @staticmethod
     def process_run(run: dict, invocation_method: dict) -> None:
         run_id = run.get("id")
@@ -16,21 +39,9 @@ class PollingToWebhookProcessor:
             return
         logger.info("Processing action run: %s", run_id)
 
-        payload = run["payload"]
-        msg_value = payload["body"].copy()
-
-        msg_value["headers"] = invocation_method.get("headers", {})
-
-        if "payload" not in msg_value:
-            msg_value["payload"] = {}
-        if "action" not in msg_value["payload"]:
-            msg_value["payload"]["action"] = {}
-        msg_value["payload"]["action"]["invocationMethod"] = invocation_method
-
-        if "context" not in msg_value:
-            msg_value["context"] = {}
-        msg_value["context"]["runId"] = run_id
-
+        msg_value = PollingToWebhookProcessor._build_run_message(
+            run_id, run, invocation_method
+        )
         webhook_invoker.invoke(
             msg_value, invocation_method, skip_signature_validation=True
         )
@@ -38,15 +49,61 @@ class PollingToWebhookProcessor:
         logger.info("Successfully processed run %s", run_id)
 
     @staticmethod
-    def process_wf_node_run(node_run: dict, invocation_method: dict) -> None:
-        node_run_id = node_run.get("identifier")
-        if not node_run_id:
-            logger.error("Workflow node run missing identifier: %s", node_run)
-            return
-        logger.info("Processing workflow node run: %s", node_run_id)
+    def _invoke_batch(
+        runs: list[tuple[dict, dict]],
+        id_field: str,
+        build_message: Callable[[str, dict, dict], dict],
+    ) -> list[InvocationResult]:
+        """Invoke the runs together, a result per run in the order of `runs`.
+
+        A run whose message cannot be built fails alone, the others are still
+        invoked.
+        """
+        failed: dict[int, InvocationResult] = {}
+        messages: list[tuple[dict, dict]] = []
+        for index, (run, invocation_method) in enumerate(runs):
+            run_id = run.get(id_field)
+            try:
+                messages.append(
+                    (
+                        build_message(run[id_field], run, invocation_method),
+                        invocation_method,
+                    )
+                )
+            except Exception as error:
+                logger.error(
+                    "Failed to build the message of run %s: %s", run_id, str(error)
+                )
+                failed[index] = InvocationResult(run_id, error=error)
 
+        invoked = iter(
+            webhook_invoker.invoke_many(messages, skip_signature_validation=True)
+            if messages
+            else []
+        )
+        return [
+            failed[index] if index in failed else next(invoked)
+            for index in range(len(runs))
+        ]
+
+    @staticmethod
+    def process_runs(runs: list[tuple[dict, dict]]) -> list[InvocationResult]:
+        """Process `(run, invocation method)` pairs, the runs must have an id"""
+        logger.info("Processing %d action runs", len(runs))
+        results = PollingToWebhookProcessor._invoke_batch(
+            runs, "id", PollingToWebhookProcessor._build_run_message
+        )
+        for result in results:
+            if result.error is None:
+                logger.info("Successfully processed run %s", result.run_id)
+        return results
+
+    @staticmethod
+    def _build_wf_node_run_message(
+        node_run_id: str, node_run: dict, invocation_method: dict
+    ) -> dict:
         config = node_run.get("config") or {}
-        msg_value = {
+        return {
             "headers": invocation_method.get("headers", {}),
             "payload": {
                 "action": {"invocationMethod": invocation_method},
@@ -57,7 +114,36 @@ class PollingToWebhookProcessor:
             },
         }
 
+    @staticmethod
+    def process_wf_node_run(node_run: dict, invocation_method: dict) -> None:
+        node_run_id = node_run.get("identifier")
+        if not node_run_id:
+            logger.error("Workflow node run missing identifier: %s", node_run)
+            return
+        logger.info("Processing workflow node run: %s", node_run_id)
+
+        msg_value = PollingToWebhookProcessor._build_wf_node_run_message(
+            node_run_id, node_run, invocation_method
+        )
         if webhook_invoker.invoke(
             msg_value, invocation_method, skip_signature_validation=True
         ):
             logger.info("Successfully processed workflow node run %s", node_run_id)
+
+    @staticmethod
+    def process_wf_node_runs(
+        node_runs: list[tuple[dict, dict]],
+    ) -> list[InvocationResult]:
+        """Process `(node run, invocation method)` pairs with identifiers"""
+        logger.info("Processing %d workflow node runs", len(node_runs))
+        results = PollingToWebhookProcessor._invoke_batch(
+            node_runs,
+            "identifier",
+            PollingToWebhookProcessor._build_wf_node_run_message,
+        )
+        for result in results:
+            if result.success:
+                logger.info(
+                    "Successfully processed workflow node run %s", result.run_id
+                )
+        return results
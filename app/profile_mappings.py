@@ -0,0 +1,299 @@
+import argparse
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Iterator, TypeVar
+
+from consumers.file_consumer import read_recorded_messages
+from core.config import Mapping, settings
+from invokers.webhook_invoker import WebhookInvoker, _compile_jq
+from pydantic import parse_file_as
+from requests import Response
+from utils import get_invocation_method_object, response_to_dict
+
+logging.basicConfig(level=settings.LOG_LEVEL)
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass
+class Timings:
+    durations: list[float] = field(default_factory=list)
+
+    def percentile(self, percent: float) -> float:
+        if not self.durations:
+            return 0
+        ordered = sorted(self.durations)
+        return ordered[min(int(len(ordered) * percent / 100), len(ordered) - 1)]
+
+    def time(self, run: Callable[[], T], repeat: int) -> T:
+        for _ in range(repeat):
+            started_at = time.perf_counter()
+            result = run()
+            self.durations.append(time.perf_counter() - started_at)
+        return result
+
+    def __str__(self) -> str:
+        if not self.durations:
+            return "not run"
+        return (
+            f"p50 {self.percentile(50) * 1000:.3f}ms, "
+            f"p95 {self.percentile(95) * 1000:.3f}ms, "
+            f"max {max(self.durations) * 1000:.3f}ms"
+        )
+
+
+@dataclass
+class ExpressionProfile:
+    path: str
+    expression: str
+    compile_error: str | None = None
+    errors: int = 0
+    timings: Timings = field(default_factory=Timings)
+
+
+@dataclass
+class MappingProfile:
+    mapping: Mapping
+    expressions: list[ExpressionProfile]
+    matched: int = 0
+    selected: int = 0
+    enabled: Timings = field(default_factory=Timings)
+    payload: Timings = field(default_factory=Timings)
+    report: Timings = field(default_factory=Timings)
+    payload_sizes: list[int] = field(default_factory=list)
+
+
+def _leaves(value: Any, path: str) -> Iterator[tuple[str, str]]:
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from _leaves(item, f"{path}.{key}" if path else key)
+    elif isinstance(value, list):
+        for index, item in enumerate(value):
+            yield from _leaves(item, f"{path}[{index}]")
+    elif isinstance(value, str):
+        yield path, value
+
+
+def _expression_profiles(
+    mapping: Mapping, invoker: WebhookInvoker
+) -> list[ExpressionProfile]:
+    leaves = list(_leaves(mapping.payload_template, ""))
+    if mapping.report:
+        leaves += _leaves(mapping.report.template, "report")
+
+    profiles = []
+    for path, expression in leaves:
+        profile = ExpressionProfile(path, expression)
+        try:
+            _compile_jq(invoker.jq_backend, expression)
+        except Exception as e:
+            profile.compile_error = str(e)
+        profiles.append(profile)
+    return profiles
+
+
+def _sample_response(body: Any) -> Response:
+    response = Response()
+    response.status_code = 200
+    response.headers["Content-Type"] = "application/json"
+    response._content = json.dumps(body).encode()
+    return response
+
+
+def profile(
+    mappings: list[Mapping],
+    messages: list[dict],
+    response: Response,
+    invoker: WebhookInvoker,
+    repeat: int = 1,
+) -> tuple[list[MappingProfile], Timings]:
+    """Time the mappings on the sample messages, without any request.
+
+    Each mapping is evaluated on the messages its `enabled` expression
+    matches, whichever mapping `_find_mapping` selects for them, and every
+    expression of the mapping is also timed on its own. The jq programs are
+    compiled before, compiling isn't part of the timings.
+    """
+    if messages:
+        _warm_up(mappings, messages[0], response, invoker)
+    profiles = [
+        MappingProfile(mapping, _expression_profiles(mapping, invoker))
+        for mapping in mappings
+    ]
+    find_mapping = Timings()
+    for msg in messages:
+        selected = find_mapping.time(
+            lambda: invoker._find_mapping(msg, mappings), repeat
+        )
+        for mapping_profile in profiles:
+            mapping = mapping_profile.mapping
+            if mapping is selected:
+                mapping_profile.selected += 1
+            enabled = mapping.enabled
+            if not isinstance(enabled, bool):
+                expression = enabled
+                enabled = (
+                    mapping_profile.enabled.time(
+                        lambda: invoker._jq_exec(expression, msg), repeat
+                    )
+                    is True
+                )
+            if not enabled:
+                continue
+            mapping_profile.matched += 1
+            _profile_mapping(mapping_profile, msg, response, invoker, repeat)
+    return profiles, find_mapping
+
+
+def _warm_up(
+    mappings: list[Mapping], msg: dict, response: Response, invoker: WebhookInvoker
+) -> None:
+    for mapping in mappings:
+        if not isinstance(mapping.enabled, bool):
+            invoker._jq_exec(mapping.enabled, msg)
+        _profile_mapping(MappingProfile(mapping, []), msg, response, invoker, 1)
+
+
+def _profile_mapping(
+    mapping_profile: MappingProfile,
+    msg: dict,
+    response: Response,
+    invoker: WebhookInvoker,
+    repeat: int,
+) -> None:
+    mapping = mapping_profile.mapping
+    invocation_method = get_invocation_method_object(msg)
+    request_payload = mapping_profile.payload.time(
+        lambda: invoker._prepare_payload(mapping, msg, invocation_method), repeat
+    )
+    mapping_profile.payload_sizes.append(
+        len(json.dumps(request_payload.to_dict(), default=str))
+    )
+    mapping_profile.report.time(
+        lambda: invoker._prepare_report(mapping, response, request_payload, msg),
+        repeat,
+    )
+
+    report_context = {
+        "body": msg,
+        "request": request_payload.to_dict(),
+        "response": response_to_dict(response),
+    }
+    for expression_profile in mapping_profile.expressions:
+        if expression_profile.compile_error is not None:
+            continue
+        is_report = expression_profile.path.startswith("report.")
+        context = report_context if is_report else msg
+        for _ in range(repeat):
+            started_at = time.perf_counter()
+            try:
+                invoker._evaluate_jq(expression_profile.expression, context)
+            except Exception:
+                expression_profile.errors += 1
+            expression_profile.timings.durations.append(
+                time.perf_counter() - started_at
+            )
+
+
+def _shorten(text: str, length: int = 80) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= length else text[: length - 3] + "..."
+
+
+def print_profiles(
+    profiles: list[MappingProfile], find_mapping: Timings, messages: int
+) -> None:
+    print(
+        f"{len(profiles)} mappings, {messages} messages, "
+        f"JQ_BACKEND={settings.JQ_BACKEND}"
+    )
+    print(f"_find_mapping: {find_mapping}")
+    for index, mapping_profile in enumerate(profiles):
+        mapping = mapping_profile.mapping
+        match_rate = mapping_profile.matched / messages * 100 if messages else 0
+        print()
+        print(f"Mapping {index}, enabled: {_shorten(str(mapping.enabled))}")
+        print(
+            f"  matched {mapping_profile.matched}/{messages} messages "
+            f"({match_rate:.0f}%), selected for {mapping_profile.selected}"
+        )
+        print(f"  enabled: {mapping_profile.enabled}")
+        print(f"  _prepare_payload: {mapping_profile.payload}")
+        print(f"  _prepare_report: {mapping_profile.report}")
+        if mapping_profile.payload_sizes:
+            sizes = mapping_profile.payload_sizes
+            print(
+                f"  payload size: avg {sum(sizes) // len(sizes)} bytes, "
+                f"max {max(sizes)} bytes"
+            )
+
+        print("  expressions, slowest first:")
+        expressions = sorted(
+            mapping_profile.expressions,
+            key=lambda expression: expression.timings.percentile(50),
+            reverse=True,
+        )
+        for expression in expressions:
+            if expression.compile_error is not None:
+                print(
+                    f"    {expression.path}: compile error "
+                    f"{_shorten(expression.compile_error)}"
+                )
+                continue
+            errors = f", {expression.errors} errors" if expression.errors else ""
+            print(f"    {expression.path}: {expression.timings}{errors}")
+            print(f"      {_shorten(expression.expression)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Time the mappings of a control the payload config on sample "
+        "messages, locally and without calling Port or the webhooks"
+    )
+    parser.add_argument(
+        "messages",
+        type=Path,
+        help="A JSON lines file of messages, or a directory of them",
+    )
+    parser.add_argument(
+        "--config", type=Path, default=settings.CONTROL_THE_PAYLOAD_CONFIG_PATH
+    )
+    parser.add_argument(
+        "--response",
+        type=Path,
+        help="A JSON file with the webhook response body the reports run on",
+    )
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument(
+        "--verbose", action="store_true", help="Log the jq errors of the mappings"
+    )
+    args = parser.parse_args()
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+
+    if not args.verbose:
+        logging.getLogger("invokers.webhook_invoker").setLevel(logging.ERROR)
+
+    mappings = parse_file_as(list[Mapping], args.config)
+    messages = []
+    for msg in read_recorded_messages(args.messages):
+        if msg is not None:
+            messages.append(json.loads(msg.value()))
+    response_body = json.loads(args.response.read_text()) if args.response else {}
+
+    profiles, find_mapping = profile(
+        mappings,
+        messages,
+        _sample_response(response_body),
+        WebhookInvoker(),
+        args.repeat,
+    )
+    print_profiles(profiles, find_mapping, len(messages))
+
+
+if __name__ == "__main__":
+    main()
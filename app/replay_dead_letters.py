@@ -0,0 +1,74 @@
+import argparse
+import logging
+import sys
+from dataclasses import replace
+from pathlib import Path
+from typing import cast
+
+from confluent_kafka import Message
+from consumers.dead_letter import DeadLetter, FileDeadLetterSink
+from consumers.file_consumer import RecordedMessage
+from core.config import settings
+from streamers.kafka.kafka_streamer import KafkaStreamer
+
+logging.basicConfig(level=settings.LOG_LEVEL)
+logger = logging.getLogger(__name__)
+
+
+def replay(path: Path, failed_path: Path) -> int:
+    """Process the dead letters of the file again, returns how many failed.
+
+    The ones failing again are appended to `failed_path`.
+    """
+    streamer = KafkaStreamer()
+    failed_sink = FileDeadLetterSink(failed_path)
+    replayed = failed = 0
+    with path.open(encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            letter = DeadLetter.from_json(line)
+            try:
+                msg = RecordedMessage(
+                    letter.topic, letter.partition, letter.offset, letter.value
+                )
+                streamer.msg_process(cast(Message, msg))
+                replayed += 1
+            except Exception as error:
+                logger.error(
+                    "Replay failed for message from topic %s, partition %d, "
+                    "offset %d: %s",
+                    letter.topic,
+                    letter.partition,
+                    letter.offset,
+                    str(error),
+                )
+                failed_sink.write(
+                    replace(letter, error=str(error), attempts=letter.attempts + 1)
+                )
+                failed += 1
+
+    logger.info("Replayed %d dead letters, %d failed", replayed, failed)
+    return failed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Process the dead letters of a FILE dead-letter sink again"
+    )
+    parser.add_argument(
+        "path", nargs="?", type=Path, default=settings.DEAD_LETTER_FILE_PATH
+    )
+    parser.add_argument(
+        "--failed-path",
+        type=Path,
+        help="Where the dead letters failing again are kept, "
+        "defaults to the path with a .failed suffix",
+    )
+    args = parser.parse_args()
+    failed_path = args.failed_path or args.path.with_name(args.path.name + ".failed")
+    sys.exit(1 if replay(args.path, failed_path) else 0)
+
+
+if __name__ == "__main__":
+    main()
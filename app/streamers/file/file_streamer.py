@@ -0,0 +1,28 @@
+import logging
+
+from consumers.file_consumer import FileConsumer
+from core.config import settings
+from streamers.kafka.kafka_streamer import KafkaStreamer
+
+logging.basicConfig(level=settings.LOG_LEVEL)
+logger = logging.getLogger(__name__)
+
+
+class FileStreamer(KafkaStreamer):
+    """Replays recorded Kafka messages through the Kafka processing path.
+
+    Used for load tests, no connection to Kafka is made and with
+    `PORT_API_OFFLINE` none to the Port API either.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.file_consumer = FileConsumer(
+            self.msg_process,
+            settings.FILE_STREAMER_PATH,
+            settings.FILE_STREAMER_RATE_PER_SECOND,
+        )
+
+    def stream(self) -> None:
+        logger.info("Replaying recorded messages from %s", settings.FILE_STREAMER_PATH)
+        self.file_consumer.start()
@@ -13,10 +13,16 @@ logger = logging.getLogger(__name__)
 
 
 class KafkaStreamer(BaseStreamer):
-    def __init__(self, consumer: Consumer = None) -> None:
-        self.kafka_consumer = KafkaConsumer(self.msg_process, consumer)
+    def __init__(
+        self,
+        consumer: Consumer = None,
+        kafka_credentials: tuple[list[str], str, str] | None = None,
+    ) -> None:
+        self.consumer = consumer
+        self.kafka_credentials = kafka_credentials
 
-    def msg_process(self, msg: Message) -> None:
+    def _agent_invocation_method(self, msg: Message) -> tuple[dict, dict] | None:
+        """Parse the message, `None` if it isn't meant for the agent"""
         topic = msg.topic()
         log_by_detail_level(
             logger.info,
@@ -26,7 +32,8 @@ class KafkaStreamer(BaseStreamer):
             msg.value(),
         )
         msg_value = json.loads(msg.value().decode())
-        invocation_method = self.get_invocation_method(msg_value, topic)
+        # A copy, the message must stay as it was signed for its validation
+        invocation_method = dict(self.get_invocation_method(msg_value, topic))
 
         if not invocation_method.pop("agent", False):
             logger.info(
@@ -36,9 +43,41 @@ class KafkaStreamer(BaseStreamer):
                 msg.partition(),
                 msg.offset(),
             )
+            return None
+        return invocation_method, msg_value
+
+    def msg_process(self, msg: Message) -> None:
+        parsed = self._agent_invocation_method(msg)
+        if parsed is None:
             return
+        invocation_method, msg_value = parsed
+        KafkaToWebhookProcessor.msg_process(
+            msg, invocation_method, msg.topic(), msg_value
+        )
+
+    def msg_process_batch(self, msgs: list[Message]) -> list[tuple[Message, Exception]]:
+        """Process the messages at once, returns the ones that failed"""
+        batch: list[tuple[Message, dict, dict]] = []
+        failures: list[tuple[Message, Exception]] = []
+        for msg in msgs:
+            try:
+                parsed = self._agent_invocation_method(msg)
+            except Exception as parse_error:
+                logger.error(
+                    "Failed process message from topic %s, partition %d, offset %d: %s",
+                    msg.topic(),
+                    msg.partition(),
+                    msg.offset(),
+                    str(parse_error),
+                )
+                failures.append((msg, parse_error))
+                continue
+            if parsed is not None:
+                batch.append((msg, *parsed))
 
-        KafkaToWebhookProcessor.msg_process(msg, invocation_method, topic)
+        if batch:
+            failures.extend(KafkaToWebhookProcessor.msg_process_batch(batch))
+        return failures
 
     @staticmethod
     def get_invocation_method(msg_value: dict, topic: str) -> dict:
@@ -55,4 +94,12 @@ class KafkaStreamer(BaseStreamer):
         return {}
 
     def stream(self) -> None:
-        self.kafka_consumer.start()
+        # Created when streaming, processing messages alone (like replaying
+        # dead letters) needs no connection to Kafka
+        kafka_consumer = KafkaConsumer(
+            self.msg_process,
+            self.consumer,
+            self.kafka_credentials,
+            msg_process_batch=self.msg_process_batch,
+        )
+        kafka_consumer.start()
@@ -1,7 +1,9 @@
 import logging
+from typing import Callable
 
 from consumers.http_polling_consumer import HttpPollingConsumer
 from core.config import settings
+from invokers.webhook_invoker import InvocationResult
 from processors.polling.polling_to_webhook_processor import PollingToWebhookProcessor
 from streamers.base_streamer import BaseStreamer
 
@@ -12,15 +14,19 @@ logger = logging.getLogger(__name__)
 class PollingStreamer(BaseStreamer):
     def __init__(self) -> None:
         self.http_polling_consumer = HttpPollingConsumer(
-            self.process_run, self.process_wf_node_run
+            self.process_run,
+            self.process_wf_node_run,
+            runs_process=self.process_runs,
+            wf_node_runs_process=self.process_wf_node_runs,
         )
         self.processor = PollingToWebhookProcessor()
 
-    def process_run(self, run: dict) -> None:
+    @staticmethod
+    def _run_invocation_method(run: dict) -> dict | None:
         run_id = run.get("id")
         if not run_id:
             logger.error("Run missing id field: %s", run)
-            return
+            return None
         logger.info("Processing run: %s", run_id)
 
         payload = run["payload"]
@@ -35,15 +41,15 @@ class PollingStreamer(BaseStreamer):
 
         if not invocation_method.pop("agent", False):
             logger.warning("Skip process run %s: not for agent", run_id)
-            return
-
-        self.processor.process_run(run, invocation_method)
+            return None
+        return invocation_method
 
-    def process_wf_node_run(self, node_run: dict) -> None:
+    @staticmethod
+    def _wf_node_run_invocation_method(node_run: dict) -> dict | None:
         node_run_id = node_run.get("identifier")
         if not node_run_id:
             logger.error("Workflow node run missing identifier: %s", node_run)
-            return
+            return None
         logger.info("Processing workflow node run: %s", node_run_id)
 
         config = node_run.get("config") or {}
@@ -58,9 +64,55 @@ class PollingStreamer(BaseStreamer):
 
         if not invocation_method.pop("agent", False):
             logger.warning("Skip workflow node run %s: not for agent", node_run_id)
-            return
+            return None
+        return invocation_method
+
+    def process_run(self, run: dict) -> None:
+        invocation_method = self._run_invocation_method(run)
+        if invocation_method is not None:
+            self.processor.process_run(run, invocation_method)
+
+    def process_wf_node_run(self, node_run: dict) -> None:
+        invocation_method = self._wf_node_run_invocation_method(node_run)
+        if invocation_method is not None:
+            self.processor.process_wf_node_run(node_run, invocation_method)
+
+    @staticmethod
+    def _process_batch(
+        runs: list[dict],
+        get_invocation_method: Callable[[dict], dict | None],
+        process: Callable[[list[tuple[dict, dict]]], list[InvocationResult]],
+    ) -> list[Exception | None]:
+        errors: list[Exception | None] = [None] * len(runs)
+        indexes: list[int] = []
+        batch: list[tuple[dict, dict]] = []
+        for index, run in enumerate(runs):
+            try:
+                invocation_method = get_invocation_method(run)
+            except Exception as error:
+                logger.error("Failed to read the invocation method: %s", str(error))
+                errors[index] = error
+                continue
+            if invocation_method is not None:
+                indexes.append(index)
+                batch.append((run, invocation_method))
+
+        if batch:
+            for index, result in zip(indexes, process(batch)):
+                errors[index] = result.error
+        return errors
 
-        self.processor.process_wf_node_run(node_run, invocation_method)
+    def process_runs(self, runs: list[dict]) -> list[Exception | None]:
+        return self._process_batch(
+            runs, self._run_invocation_method, self.processor.process_runs
+        )
+
+    def process_wf_node_runs(self, node_runs: list[dict]) -> list[Exception | None]:
+        return self._process_batch(
+            node_runs,
+            self._wf_node_run_invocation_method,
+            self.processor.process_wf_node_runs,
+        )
 
     def stream(self) -> None:
         logger.info("Starting polling streamer")
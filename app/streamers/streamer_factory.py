@@ -1,16 +1,24 @@
 from core.consts import consts
 from streamers.base_streamer import BaseStreamer
+from streamers.file.file_streamer import FileStreamer
 from streamers.kafka.kafka_streamer import KafkaStreamer
 from streamers.polling.polling_streamer import PollingStreamer
 
 
 class StreamerFactory:
     @staticmethod
-    def get_streamer(streamer_type: str) -> BaseStreamer:
+    def get_streamer(
+        streamer_type: str,
+        kafka_credentials: tuple[list[str], str, str] | None = None,
+    ) -> BaseStreamer:
         if streamer_type not in consts.VALID_STREAMER_TYPES:
             raise ValueError(
                 f"STREAMER_NAME must be one of {consts.VALID_STREAMER_TYPES}, "
                 f"got: {streamer_type}"
             )
 
-        return KafkaStreamer() if streamer_type == "KAFKA" else PollingStreamer()
+        if streamer_type == "KAFKA":
+            return KafkaStreamer(kafka_credentials=kafka_credentials)
+        if streamer_type == "FILE":
+            return FileStreamer()
+        return PollingStreamer()
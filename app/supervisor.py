@@ -0,0 +1,189 @@
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from dataclasses import dataclass
+from multiprocessing.process import BaseProcess
+from typing import Any
+
+from consumers.base_consumer import BaseConsumer
+from core.config import settings
+from core.logs import configure_logging
+from core.profiling import profiler
+from port_client import get_kafka_credentials
+from streamers.streamer_factory import StreamerFactory
+
+logging.basicConfig(level=settings.LOG_LEVEL)
+logger = logging.getLogger(__name__)
+
+
+def run_worker(
+    worker_id: int,
+    heartbeat_value: Any,
+    kafka_credentials: tuple[list[str], str, str] | None,
+) -> None:
+    # First, SIGUSR1 would stop the process until it's handled
+    profiler.install_signal_handler()
+    configure_logging()
+    BaseConsumer.heartbeat_value = heartbeat_value
+    logger.info("Worker %d started - pid: %d", worker_id, os.getpid())
+    streamer = StreamerFactory.get_streamer(
+        settings.STREAMER_NAME, kafka_credentials=kafka_credentials
+    )
+    streamer.stream()
+
+
+@dataclass
+class _Worker:
+    worker_id: int
+    process: BaseProcess | None = None
+    heartbeat_value: Any = None
+    started_at: float = 0.0
+    restarts: int = 0
+    next_start_at: float = 0.0
+    finished: bool = False
+
+
+class WorkerSupervisor:
+    """Runs the streamer in several worker processes and keeps them alive.
+
+    Kafka workers join the same consumer group, so the topic partitions are
+    distributed between them by the broker. Polling workers claim runs
+    independently, the claim endpoint makes sure a run is handed to a single
+    worker.
+    """
+
+    def __init__(self, workers_count: int) -> None:
+        self.running = False
+        self.context = multiprocessing.get_context("spawn")
+        self.workers = [_Worker(worker_id) for worker_id in range(workers_count)]
+        self.kafka_credentials: tuple[list[str], str, str] | None = None
+
+        signal.signal(signal.SIGINT, self.exit_gracefully)
+        signal.signal(signal.SIGTERM, self.exit_gracefully)
+        signal.signal(signal.SIGUSR1, self.request_profile)
+
+    def _start_worker(self, worker: _Worker) -> None:
+        if worker.restarts and self.kafka_credentials is not None:
+            # The credentials may have been rotated since the last start
+            self.kafka_credentials = get_kafka_credentials()
+        worker.heartbeat_value = self.context.RawValue("d", time.time())
+        worker.process = self.context.Process(
+            target=run_worker,
+            args=(worker.worker_id, worker.heartbeat_value, self.kafka_credentials),
+            name=f"port-agent-worker-{worker.worker_id}",
+            daemon=True,
+        )
+        worker.process.start()
+        worker.started_at = time.time()
+        logger.info("Started worker %d - pid: %s", worker.worker_id, worker.process.pid)
+
+    def _schedule_restart(self, worker: _Worker, now: float) -> None:
+        if now - worker.started_at > settings.WORKERS_RESTART_MAX_BACKOFF_SECONDS:
+            worker.restarts = 0
+        backoff = min(2**worker.restarts, settings.WORKERS_RESTART_MAX_BACKOFF_SECONDS)
+        worker.restarts += 1
+        worker.process = None
+        worker.next_start_at = now + backoff
+        logger.info("Restarting worker %d in %d seconds", worker.worker_id, backoff)
+
+    def _check_worker(self, worker: _Worker, now: float) -> None:
+        if worker.finished:
+            return
+
+        process = worker.process
+        if process is None:
+            if now >= worker.next_start_at:
+                try:
+                    self._start_worker(worker)
+                except Exception as error:
+                    logger.error(
+                        "Failed to start worker %d: %s", worker.worker_id, str(error)
+                    )
+                    self._schedule_restart(worker, now)
+            return
+
+        if process.is_alive():
+            heartbeat_age = now - worker.heartbeat_value.value
+            timeout = settings.WORKERS_HEARTBEAT_TIMEOUT_SECONDS
+            if timeout and heartbeat_age > timeout:
+                logger.error(
+                    "Worker %d did not report a heartbeat for %d seconds, killing it",
+                    worker.worker_id,
+                    heartbeat_age,
+                )
+                process.kill()
+                process.join()
+                self._schedule_restart(worker, now)
+            return
+
+        if process.exitcode == 0:
+            logger.warning(
+                "Worker %d exited gracefully, it will not be restarted",
+                worker.worker_id,
+            )
+            worker.finished = True
+            return
+
+        logger.error(
+            "Worker %d crashed with exit code %s", worker.worker_id, process.exitcode
+        )
+        self._schedule_restart(worker, now)
+
+    def _stop_workers(self) -> None:
+        processes = [
+            worker.process
+            for worker in self.workers
+            if worker.process is not None and worker.process.is_alive()
+        ]
+        for process in processes:
+            process.terminate()
+
+        deadline = time.time() + settings.WORKERS_SHUTDOWN_TIMEOUT_SECONDS
+        for process in processes:
+            process.join(max(deadline - time.time(), 0))
+            if process.is_alive():
+                logger.warning(
+                    "Worker %s did not stop in time, killing it", process.name
+                )
+                process.kill()
+                process.join()
+
+    def run(self) -> None:
+        if settings.STREAMER_NAME == "KAFKA" and not settings.USING_LOCAL_PORT_INSTANCE:
+            logger.info("Getting Kafka credentials for the workers")
+            self.kafka_credentials = get_kafka_credentials()
+
+        self.running = True
+        try:
+            while self.running:
+                now = time.time()
+                for worker in self.workers:
+                    self._check_worker(worker, now)
+
+                if all(worker.finished for worker in self.workers):
+                    logger.warning("All workers exited, stopping the supervisor")
+                    break
+
+                time.sleep(settings.WORKERS_HEALTH_CHECK_INTERVAL_SECONDS)
+        finally:
+            self._stop_workers()
+
+    def request_profile(self, *_: Any) -> bool:
+        """Have the running workers capture a profile, `False` if none runs"""
+        pids = [
+            worker.process.pid
+            for worker in self.workers
+            if worker.process is not None
+            and worker.process.is_alive()
+            and worker.process.pid is not None
+        ]
+        for pid in pids:
+            os.kill(pid, signal.SIGUSR1)
+        logger.info("Requested a profile from %d workers", len(pids))
+        return bool(pids)
+
+    def exit_gracefully(self, *_: Any) -> None:
+        logger.info("Exiting gracefully...")
+        self.running = False
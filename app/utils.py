@@ -2,11 +2,16 @@ import base64
 import hashlib
 import hmac
 import logging
+import re
+from copy import copy
+from dataclasses import dataclass, field
+from functools import lru_cache
 from typing import Any, Callable, Dict, List, Optional
 
 from core.config import settings
+from core.consts import consts
+from core.logs import DetailedLogValue, sample_detailed_log
 from Crypto.Cipher import AES
-from glom import assign, glom
 from requests import Response
 
 logger = logging.getLogger(__name__)
@@ -22,20 +27,49 @@ def log_by_detail_level(
     """Log with detail level based on DETAILED_LOGGING config.
 
     Logs concisely (base message only) when DETAILED_LOGGING=False, or with one
-    additional optional field when DETAILED_LOGGING=True.
+    additional optional field when DETAILED_LOGGING=True. The field is only
+    added to a sample of the events and is truncated, see `DetailedLogValue`.
     """
     msg = base_message_format
     if (
         settings.DETAILED_LOGGING
         and optional_field_name
         and optional_field_value is not None
+        and sample_detailed_log()
     ):
         msg += f", {optional_field_name}: %s"
-        log_fn(msg, *base_format_args, optional_field_value)
+        log_fn(msg, *base_format_args, DetailedLogValue(optional_field_value))
     else:
         log_fn(msg, *base_format_args)
 
 
+def read_capped_response_body(response: Response, max_bytes: int) -> bool:
+    """Read a streamed response body, keeping at most `max_bytes` of it.
+
+    The kept bytes become the response content so `text` and `json()` keep
+    working, a truncated body ends with the truncation marker. Returns
+    whether the body was truncated.
+    """
+    chunks: list[bytes] = []
+    size = 0
+    truncated = False
+    try:
+        for chunk in response.iter_content(chunk_size=consts.RESPONSE_READ_CHUNK_SIZE):
+            if size + len(chunk) > max_bytes:
+                chunks.append(chunk[: max_bytes - size])
+                truncated = True
+                break
+            chunks.append(chunk)
+            size += len(chunk)
+    finally:
+        response.close()
+
+    if truncated:
+        chunks.append(consts.RESPONSE_TRUNCATION_MARKER.encode())
+    response._content = b"".join(chunks)
+    return truncated
+
+
 def response_to_dict(response: Response) -> dict:
     response_dict = {
         "statusCode": response.status_code,
@@ -65,14 +99,52 @@ def get_response_body(response: Response) -> dict | str | None:
         return response.text
 
 
-def sign_sha_256(input: str, secret: str, timestamp: str) -> str:
-    to_sign = f"{timestamp}.{input}"
+def sign_sha_256(input: str | bytes, secret: str, timestamp: str) -> str:
+    if isinstance(input, str):
+        input = input.encode("utf-8")
     new_hmac = hmac.new(bytes(secret, "utf-8"), digestmod=hashlib.sha256)
-    new_hmac.update(bytes(to_sign, "utf-8"))
+    new_hmac.update(f"{timestamp}.".encode("utf-8"))
+    new_hmac.update(input)
     signed = base64.b64encode(new_hmac.digest()).decode("utf-8")
     return f"v1,{signed}"
 
 
+@lru_cache
+def _json_member_pattern(key: str) -> re.Pattern[bytes]:
+    return re.compile(
+        b'"' + re.escape(key.encode()) + rb'":(?:"([^"\\]*)"|(-?[0-9]+))(?=[,}])'
+    )
+
+
+def remove_json_member(raw: bytes, key: str) -> tuple[bytes, str] | None:
+    """Remove the only `"<key>":<value>` member from compact JSON bytes.
+
+    Returns the bytes without the member and its separating comma along with
+    the value, or `None` unless the key appears exactly once with an
+    unescaped string or an integer value.
+    """
+    matches = _json_member_pattern(key).finditer(raw)
+    match = next(matches, None)
+    if match is None or next(matches, None) is not None:
+        return None
+
+    start, end = match.span()
+    if raw.endswith(b",", 0, start):
+        start -= 1
+    elif raw.startswith(b",", end):
+        end += 1
+    value = match.group(1) if match.group(1) is not None else match.group(2)
+    return raw[:start] + raw[end:], value.decode()
+
+
+@lru_cache
+def _derive_key(key: str) -> bytes:
+    key_bytes = key.encode("utf-8")
+    if len(key_bytes) < 32:
+        raise ValueError("Encryption key must be at least 32 bytes")
+    return key_bytes[:32]
+
+
 def decrypt_field(encrypted_value: str, key: str) -> str:
     encrypted_data = base64.b64decode(encrypted_value)
     if len(encrypted_data) < 32:
@@ -82,25 +154,80 @@ def decrypt_field(encrypted_value: str, key: str) -> str:
     ciphertext = encrypted_data[16:-16]
     tag = encrypted_data[-16:]
 
-    key_bytes = key.encode("utf-8")
-    if len(key_bytes) < 32:
-        raise ValueError("Encryption key must be at least 32 bytes")
-    key_bytes = key_bytes[:32]
-
-    cipher = AES.new(key_bytes, AES.MODE_GCM, nonce=iv)
+    cipher = AES.new(_derive_key(key), AES.MODE_GCM, nonce=iv)
     decrypted = cipher.decrypt_and_verify(ciphertext, tag)
     return decrypted.decode("utf-8")
 
 
+@dataclass
+class _DecryptionNode:
+    children: Dict[str, "_DecryptionNode"] = field(default_factory=dict)
+    decrypt: bool = False
+
+
+@lru_cache
+def _compile_decryption_paths(fields: tuple[str, ...]) -> _DecryptionNode:
+    """Merge the dotted paths into a tree so a payload is walked only once"""
+    root = _DecryptionNode()
+    for path in fields:
+        if not path:
+            continue
+        node = root
+        for segment in path.split("."):
+            node = node.children.setdefault(segment, _DecryptionNode())
+        node.decrypt = True
+    return root
+
+
+def _matching_keys(container: Any, segment: str) -> list:
+    if isinstance(container, dict):
+        if segment == "*":
+            return list(container)
+        return [segment] if segment in container else []
+    if isinstance(container, list):
+        if segment == "*":
+            return list(range(len(container)))
+        try:
+            index = int(segment)
+        except ValueError:
+            return []
+        return [index] if -len(container) <= index < len(container) else []
+    return []
+
+
+def _decrypt_node(
+    container: Any, node: _DecryptionNode, key: str, path: tuple[str, ...]
+) -> Any:
+    """The container with the node's fields decrypted, the same if none is"""
+    updated = None
+    for segment, child in node.children.items():
+        current = container if updated is None else updated
+        for child_key in _matching_keys(current, segment):
+            child_path = (*path, str(child_key))
+            value = new_value = current[child_key]
+            if child.decrypt and value is not None:
+                try:
+                    new_value = decrypt_field(value, key)
+                except Exception as e:
+                    logger.warning(
+                        "Decryption failed for '%s': %s", ".".join(child_path), e
+                    )
+            if child.children:
+                new_value = _decrypt_node(new_value, child, key, child_path)
+            if new_value is not value:
+                if updated is None:
+                    updated = current = copy(container)
+                updated[child_key] = new_value
+    return container if updated is None else updated
+
+
 def decrypt_payload_fields(
     payload: Dict[str, Any], fields: List[str], key: str
 ) -> Dict[str, Any]:
-    for path in fields:
-        encrypted = glom(payload, path, default=None)
-        if encrypted is not None:
-            try:
-                decrypted = decrypt_field(encrypted, key)
-                assign(payload, path, decrypted)
-            except Exception as e:
-                logger.warning("Decryption failed for '%s': %s", path, e)
-    return payload
+    """The payload with the fields at the given dotted paths decrypted.
+
+    A `*` segment matches every item of a list or every value of an object.
+    The payload isn't modified, only the objects and lists leading to a
+    decrypted field are copied, the rest is shared with the payload.
+    """
+    return _decrypt_node(payload, _compile_decryption_paths(tuple(fields)), key, ())
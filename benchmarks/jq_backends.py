@@ -0,0 +1,124 @@
+"""Compare the jq backends on the mappings of the agent.
+
+Usage, from the repository root:
+
+    python benchmarks/jq_backends.py [--sizes 10,100] [--repeat 200]
+
+The sizes are the approximate message sizes in KB. The JQ backend needs the
+jq package, it is skipped when it's not installed.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import timeit
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent / "app"
+os.environ.setdefault("STREAMER_NAME", "KAFKA")
+os.environ.setdefault("PORT_ORG_ID", "benchmark")
+os.environ.setdefault("PORT_CLIENT_ID", "benchmark")
+os.environ.setdefault("PORT_CLIENT_SECRET", "benchmark")
+os.environ.setdefault(
+    "CONTROL_THE_PAYLOAD_CONFIG_PATH", str(APP_DIR / "control_the_payload_config.json")
+)
+sys.path.insert(0, str(APP_DIR))
+
+from core.config import Mapping, control_the_payload_config  # noqa: E402
+from core.consts import consts  # noqa: E402
+from core.jq_backend import get_jq_backend  # noqa: E402
+from invokers.webhook_invoker import WebhookInvoker  # noqa: E402
+from pydantic import parse_obj_as  # noqa: E402
+
+# A mapping made of plain paths, the most common shape
+PATHS_MAPPING = parse_obj_as(
+    Mapping,
+    {
+        "enabled": True,
+        "url": ".payload.action.invocationMethod.url",
+        "body": {
+            "runId": ".context.runId",
+            "action": ".payload.action.identifier",
+            "branch": ".payload.properties.branch",
+            "entity": ".payload.entity.identifier",
+            "first": ".payload.properties.entities[0].identifier",
+            "title": '"Run \\(.context.runId) by \\(.trigger.by.email)"',
+        },
+        "headers": {"X-Run-Id": ".context.runId"},
+    },
+)
+
+
+def build_message(size_kb: int) -> dict:
+    entities = [
+        {
+            "identifier": f"entity-{index}",
+            "title": f"Entity {index}",
+            "properties": {"count": index, "ratio": index / 7, "tags": ["a", "b"]},
+        }
+        for index in range(size_kb * 1024 // 120)
+    ]
+    return {
+        "context": {"runId": "r_benchmark"},
+        "trigger": {"by": {"email": "user@example.com"}},
+        "payload": {
+            "action": {
+                "identifier": "deploy",
+                "invocationMethod": {
+                    "type": "GITLAB",
+                    "groupName": "group",
+                    "projectName": "project",
+                    "url": "http://localhost",
+                },
+            },
+            "entity": {"identifier": "service"},
+            "properties": {"branch": "main", "entities": entities},
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10,100")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    backends = [
+        name
+        for name in consts.VALID_JQ_BACKENDS
+        if name != "JQ" or importlib.util.find_spec("jq") is not None
+    ]
+    mappings = {
+        "config": control_the_payload_config[0],
+        "paths": PATHS_MAPPING,
+    }
+
+    print(f"{'size':>8} {'mapping':>8} " + " ".join(f"{name:>10}" for name in backends))
+    for size_kb in (int(size) for size in args.sizes.split(",")):
+        msg = build_message(size_kb)
+        for mapping_name, mapping in mappings.items():
+            timings = []
+            results = []
+            for name in backends:
+                invoker = WebhookInvoker(get_jq_backend(name))
+
+                def run() -> object:
+                    invoker._find_mapping(msg)
+                    return invoker._prepare_payload(mapping, msg, {}).dict()
+
+                results.append(json.dumps(run()))
+                timings.append(timeit.timeit(run, number=args.repeat))
+            if len(set(results)) > 1:
+                print(f"  the backends disagree on the {mapping_name} mapping")
+            print(
+                f"{len(json.dumps(msg)) // 1024:>6}KB {mapping_name:>8} "
+                + " ".join(
+                    f"{timing / args.repeat * 1000:>8.3f}ms" for timing in timings
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Compare the cost of validating Port's signature on large Kafka messages.
+
+Usage, from the repository root:
+
+    python benchmarks/signature_validation.py [--sizes 100,1000] [--repeat 200]
+
+The sizes are the approximate message sizes in KB.
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent / "app"
+os.environ.setdefault("STREAMER_NAME", "KAFKA")
+os.environ.setdefault("PORT_ORG_ID", "benchmark")
+os.environ.setdefault("PORT_CLIENT_ID", "benchmark")
+os.environ.setdefault("PORT_CLIENT_SECRET", "benchmark")
+os.environ.setdefault(
+    "CONTROL_THE_PAYLOAD_CONFIG_PATH", str(APP_DIR / "control_the_payload_config.json")
+)
+sys.path.insert(0, str(APP_DIR))
+
+from core.config import settings  # noqa: E402
+from invokers.webhook_invoker import WebhookInvoker  # noqa: E402
+from utils import sign_sha_256  # noqa: E402
+
+
+def build_message(size_kb: int) -> tuple[dict, bytes]:
+    entities = [
+        {
+            "identifier": f"entity-{index}",
+            "title": f"Entity {index} – ünïcode",
+            "properties": {"count": index, "ratio": index / 7, "tags": ["a", "b"]},
+        }
+        for index in range(size_kb * 1024 // 120)
+    ]
+    msg: dict = {
+        "context": {"runId": "r_benchmark"},
+        "payload": {"entities": entities},
+        "headers": {},
+    }
+    timestamp = "1713277889"
+    signature = sign_sha_256(
+        json.dumps(msg, separators=(",", ":"), ensure_ascii=False),
+        settings.PORT_CLIENT_SECRET,
+        timestamp,
+    )
+    msg["headers"] = {"X-Port-Signature": signature, "X-Port-Timestamp": timestamp}
+    raw = json.dumps(msg, separators=(",", ":"), ensure_ascii=False).encode()
+    return msg, raw
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="100,1000")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    invoker = WebhookInvoker()
+    print(f"{'size':>8} {'canonical dump':>16} {'raw bytes':>12} {'speedup':>8}")
+    for size_kb in (int(size) for size in args.sizes.split(",")):
+        msg, raw = build_message(size_kb)
+        assert invoker.verify_signature(msg, "WEBHOOK") is not None
+        assert invoker.verify_signature(msg, "WEBHOOK", raw) is not None
+
+        canonical = timeit.timeit(
+            lambda: invoker.verify_signature(msg, "WEBHOOK"), number=args.repeat
+        )
+        raw_bytes = timeit.timeit(
+            lambda: invoker.verify_signature(msg, "WEBHOOK", raw), number=args.repeat
+        )
+        print(
+            f"{len(raw) // 1024:>6}KB "
+            f"{canonical / args.repeat * 1000:>14.3f}ms "
+            f"{raw_bytes / args.repeat * 1000:>10.3f}ms "
+            f"{canonical / raw_bytes:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import pytest
+from core.config import Settings
+from pydantic import ValidationError
+
+
+def test_kafka_consumer_extra_config_accepts_tunable_options() -> None:
+    settings = Settings(
+        KAFKA_CONSUMER_PRESET="high-throughput",
+        KAFKA_CONSUMER_EXTRA_CONFIG={
+            "partition.assignment.strategy": "cooperative-sticky",
+            "fetch.min.bytes": 1024,
+            "socket.keepalive.enable": True,
+        },
+    )
+
+    assert settings.KAFKA_CONSUMER_EXTRA_CONFIG == {
+        "partition.assignment.strategy": "cooperative-sticky",
+        "fetch.min.bytes": 1024,
+        "socket.keepalive.enable": True,
+    }
+
+
+@pytest.mark.parametrize(
+    "extra_config",
+    [
+        {"group.id": "other_group"},
+        {"enable.auto.commit": True},
+        {"sasl.password": "secret"},
+        {"fetch.min.bytes": [1]},
+    ],
+)
+def test_kafka_consumer_extra_config_rejects_invalid_options(
+    extra_config: dict,
+) -> None:
+    with pytest.raises(ValidationError, match="KAFKA_CONSUMER_EXTRA_CONFIG"):
+        Settings(KAFKA_CONSUMER_EXTRA_CONFIG=extra_config)
+
+
+def test_kafka_consumer_preset_must_be_known() -> None:
+    with pytest.raises(ValidationError, match="KAFKA_CONSUMER_PRESET"):
+        Settings(KAFKA_CONSUMER_PRESET="fastest")
+
+
+def test_kafka_consumer_resume_in_flight_messages_defaults_to_half() -> None:
+    settings = Settings(KAFKA_CONSUMER_MAX_IN_FLIGHT_MESSAGES=10)
+
+    assert settings.KAFKA_CONSUMER_RESUME_IN_FLIGHT_MESSAGES == 5
+
+    with pytest.raises(ValidationError, match="must be lower"):
+        Settings(
+            KAFKA_CONSUMER_MAX_IN_FLIGHT_MESSAGES=10,
+            KAFKA_CONSUMER_RESUME_IN_FLIGHT_MESSAGES=10,
+        )
+
+
+def test_kafka_consumer_max_in_flight_messages_rejects_batches() -> None:
+    with pytest.raises(ValidationError, match="can't be used together"):
+        Settings(
+            KAFKA_CONSUMER_MAX_IN_FLIGHT_MESSAGES=10, KAFKA_CONSUMER_BATCH_SIZE=100
+        )
+
+
+def test_jq_backend_must_be_known() -> None:
+    with pytest.raises(ValidationError, match="JQ_BACKEND"):
+        Settings(JQ_BACKEND="jaq")
@@ -0,0 +1,46 @@
+import pytest
+from core.jq_analysis import referenced_root_keys
+
+
+@pytest.mark.parametrize(
+    "expression, expected",
+    [
+        ('"http://test.com"', set()),
+        (".response.json.web_url", {"response"}),
+        (".response.json.id | tostring", {"response"}),
+        (".body.x // .request.y", {"body", "request"}),
+        ("if .body.a then .request.b else null end", {"body", "request"}),
+        ('"\\(.response.statusCode) - \\(.body.context.runId)"', {"response", "body"}),
+        ('.body["x"]', {"body"}),
+        ("{link: .response.url}", {"response"}),
+        ('{"response"} | .response.statusCode', {"response"}),
+        ('{"link": .body.url, "response"}', {"body", "response"}),
+        (".body.url | @uri", {"body"}),
+        ("env.GITLAB_URL // $__loc__.file", set()),
+        (".body as $body | .request.url", {"body", "request"}),
+    ],
+)
+def test_referenced_root_keys(expression: str, expected: set[str]) -> None:
+    assert referenced_root_keys(expression) == expected
+
+
+@pytest.mark.parametrize(
+    "expression",
+    [
+        ".",
+        "..",
+        '.["response"]',
+        "keys",
+        "tojson",
+        "@base64",
+        "{response}",
+        '{"\\(.body.key)"}',
+        "map(.body)",
+        ".body as $body | keys",
+        '"\\(.)"',
+        "def f: .response; f",
+        '"unterminated',
+    ],
+)
+def test_referenced_root_keys_whole_input(expression: str) -> None:
+    assert referenced_root_keys(expression) is None
@@ -0,0 +1,146 @@
+from typing import Any
+
+import pyjq as jq
+import pytest
+from core.jq_fast_path import FastPathUnsupported, compile_fast_path
+
+CONTEXTS: list[Any] = [
+    {
+        "payload": {
+            "properties": {"branch": "main", "count": 3, "ratio": 0.5},
+            "entity": None,
+            "items": [{"name": "first"}, {"name": "second", "x": 1.0}],
+            "flag": True,
+            "empty": {},
+        },
+        "context": {"runId": "r_1", "by": {"email": "a@b.c"}},
+        "key with spaces": "spaces",
+        "big": 2**31,
+        "exact": 2**31 - 1,
+        "float": 2.0,
+        "unicode": "é\n\x7f",
+    },
+    {"payload": "not an object", "context": [1, 2, 3]},
+    {"payload": {"properties": [], "items": {"0": "zero"}}},
+    {},
+    None,
+    [1, {"a": 2}, [3]],
+]
+
+EXPRESSIONS = [
+    ".",
+    ".payload",
+    ".payload.properties.branch",
+    ".payload.properties.count",
+    ".payload.properties.ratio",
+    ".payload.entity.identifier",
+    ".payload.items[0].name",
+    ".payload.items[-1]",
+    ".payload.items[5]",
+    ".payload.items[-5]",
+    '.payload["properties"]["branch"]',
+    '.["key with spaces"]',
+    '."key with spaces"',
+    '.payload."properties".branch',
+    ".payload.empty",
+    ".payload.flag",
+    ".context.runId",
+    ".[0]",
+    ".[1].a",
+    ".big",
+    ".exact",
+    ".float",
+    ".missing.deeply.nested",
+    "  .context.runId  # a comment",
+    '"http://localhost"',
+    '"escaped \\" \\u00e9 \\n"',
+    "42",
+    "-1",
+    "1.0",
+    "1.5",
+    "1e3",
+    "1e20",
+    "true",
+    "false",
+    "null",
+    '"\\(.context.runId)"',
+    '"run \\(.context.runId) by \\(.context.by.email)!"',
+    '"\\(.payload.properties.count) \\(.payload.flag) \\(.payload.entity)"',
+    '"\\(.payload.properties.ratio)"',
+    '"\\(.payload.items)"',
+    '"\\(.float) \\(.big) \\(.unicode)"',
+    '"\\(.payload)"',
+    '"\\(1) \\("x")"',
+]
+
+
+def _jq_first(expression: str, context: Any) -> tuple[str, Any]:
+    try:
+        return "value", jq.compile(expression).first(context)
+    except Exception as e:
+        return "error", str(e)
+
+
+def _fast_path_first(expression: str, context: Any) -> tuple[str, Any] | None:
+    fast_path = compile_fast_path(expression)
+    assert fast_path is not None
+    try:
+        return "value", fast_path(context)
+    except FastPathUnsupported:
+        return None
+
+
+@pytest.mark.parametrize("expression", EXPRESSIONS)
+@pytest.mark.parametrize("context", CONTEXTS)
+def test_fast_path_matches_jq(expression: str, context: Any) -> None:
+    result = _fast_path_first(expression, context)
+
+    if result is not None:
+        assert result == _jq_first(expression, context)
+        assert type(result[1]) is type(_jq_first(expression, context)[1])
+
+
+def test_fast_path_defers_errors_to_jq() -> None:
+    fast_path = compile_fast_path(".payload.branch")
+    assert fast_path is not None
+
+    with pytest.raises(FastPathUnsupported):
+        fast_path({"payload": "not an object"})
+
+
+def test_fast_path_returns_copies() -> None:
+    context = {"payload": {"headers": {"a": "b"}}}
+    fast_path = compile_fast_path(".payload.headers")
+    assert fast_path is not None
+
+    headers = fast_path(context)
+    headers["c"] = "d"
+
+    assert context == {"payload": {"headers": {"a": "b"}}}
+
+
+@pytest.mark.parametrize(
+    "expression",
+    [
+        ".payload | .branch",
+        ".payload.branch // null",
+        ".payload[]",
+        ".payload[1:2]",
+        ".payload[.i]",
+        ".payload.branch?",
+        ".payload.items[0.5]",
+        '.payload["\\(.key)"]',
+        '"\\(.payload | length)"',
+        '"\\(.payload)" + "x"',
+        "..",
+        "$__loc__",
+        "env.HOME",
+        "{a: .b}",
+        "[.a]",
+        "-.a",
+        "not",
+        '"unterminated',
+    ],
+)
+def test_other_expressions_have_no_fast_path(expression: str) -> None:
+    assert compile_fast_path(expression) is None
@@ -0,0 +1,128 @@
+import json
+import logging
+from typing import Any, Iterator
+from unittest import mock
+
+import pytest
+from core.config import settings
+from core.consts import consts
+from core.logs import (
+    DetailedLogValue,
+    JsonFormatter,
+    configure_logging,
+    stop_logging,
+    truncate_log_value,
+)
+from pytest import CaptureFixture, MonkeyPatch
+from utils import log_by_detail_level
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "text",
+        b"raw \x00 bytes",
+        {"a": [1, 2.5, None, True], "b": {"c": "it's"}},
+        ["x" * 100, {"y": b"z" * 100}],
+        ("a", "tuple"),
+        12345,
+    ],
+)
+@pytest.mark.parametrize("max_length", [0, 10, 50, 1000])
+def test_truncate_log_value_is_a_prefix_of_str(value: Any, max_length: int) -> None:
+    text = str(value)
+
+    truncated = truncate_log_value(value, max_length)
+
+    if max_length == 0 or len(text) <= max_length:
+        assert truncated == text
+    else:
+        assert truncated == text[:max_length] + consts.LOG_TRUNCATION_MARKER
+
+
+def test_truncate_log_value_renders_only_up_to_the_limit() -> None:
+    def items() -> Iterator[int]:
+        yield from range(3)
+        raise AssertionError("rendered past the limit")
+
+    class Items(list):
+        def __iter__(self) -> Iterator[int]:
+            return items()
+
+    body = {"big": "x" * 10_000_000, "items": Items()}
+
+    assert truncate_log_value(body, 20) == (
+        "{'big': 'xxxxxxxxxxx" + consts.LOG_TRUNCATION_MARKER
+    )
+
+
+def test_log_by_detail_level_samples_and_truncates_the_field(
+    monkeypatch: MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "DETAILED_LOGGING_MAX_FIELD_LENGTH", 5)
+    log_fn = mock.Mock()
+
+    log_by_detail_level(log_fn, "message %s", ["a"], "body", "0123456789")
+
+    msg, arg, detail = log_fn.call_args.args
+    assert (msg, arg) == ("message %s, body: %s", "a")
+    assert isinstance(detail, DetailedLogValue)
+    assert str(detail) == "01234" + consts.LOG_TRUNCATION_MARKER
+
+    monkeypatch.setattr(settings, "DETAILED_LOGGING_SAMPLE_RATE", 0)
+    log_by_detail_level(log_fn, "message %s", ["a"], "body", "0123456789")
+
+    log_fn.assert_called_with("message %s", "a")
+
+
+def test_json_formatter() -> None:
+    try:
+        raise ValueError("boom")
+    except ValueError as error:
+        record = logging.LogRecord(
+            "agent",
+            logging.ERROR,
+            __file__,
+            1,
+            "failed %s",
+            ("run",),
+            (ValueError, error, error.__traceback__),
+        )
+
+    entry = json.loads(JsonFormatter().format(record))
+
+    assert entry["level"] == "ERROR"
+    assert entry["logger"] == "agent"
+    assert entry["message"] == "failed run"
+    assert "ValueError: boom" in entry["exception"]
+
+
+@pytest.fixture
+def root_logger() -> Iterator[logging.Logger]:
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    yield root
+    stop_logging()
+    root.handlers[:] = handlers
+    root.setLevel(level)
+
+
+def test_configure_logging_writes_json_from_a_background_thread(
+    root_logger: logging.Logger, monkeypatch: MonkeyPatch, capsys: CaptureFixture
+) -> None:
+    monkeypatch.setattr(settings, "LOG_FORMAT", "JSON")
+    monkeypatch.setattr(settings, "LOG_ASYNC", True)
+    configure_logging()
+    logger = logging.getLogger("test_configure_logging")
+    mutable = {"state": "logged"}
+
+    logger.info("mutable: %s", mutable)
+    mutable["state"] = "changed"
+    logger.info("detailed: %s", DetailedLogValue({"body": "x" * 5000}))
+    stop_logging()
+
+    entries = [json.loads(line) for line in capsys.readouterr().err.splitlines()]
+    assert [entry["message"] for entry in entries] == [
+        "mutable: {'state': 'logged'}",
+        "detailed: {'body': '" + "x" * 1990 + consts.LOG_TRUNCATION_MARKER,
+    ]
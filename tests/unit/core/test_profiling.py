@@ -0,0 +1,95 @@
+import os
+import signal
+import threading
+import time
+from pathlib import Path
+from typing import Iterator
+from unittest import mock
+
+import pytest
+import requests
+from core.admin import AdminServer
+from core.config import settings
+from core.profiling import Profiler
+from pytest import MonkeyPatch
+
+
+def _busy_work(stop: threading.Event) -> None:
+    allocations = []
+    while not stop.is_set():
+        allocations.append(bytearray(1024))
+        time.sleep(0.001)
+
+
+@pytest.fixture
+def busy_thread() -> Iterator[None]:
+    stop = threading.Event()
+    thread = threading.Thread(target=_busy_work, args=(stop,), name="busy")
+    thread.start()
+    yield
+    stop.set()
+    thread.join()
+
+
+def test_capture_writes_stacks_and_memory(
+    tmp_path: Path, monkeypatch: MonkeyPatch, busy_thread: None
+) -> None:
+    monkeypatch.setattr(settings, "PROFILING_OUTPUT_DIR", tmp_path)
+    monkeypatch.setattr(settings, "PROFILING_SAMPLE_INTERVAL_SECONDS", 0.001)
+    profiler = Profiler()
+
+    assert profiler.capture(0.2)
+    assert not profiler.capture(0.2)
+    assert profiler._thread is not None
+    profiler._thread.join()
+
+    (stacks_path,) = tmp_path.glob("*.collapsed")
+    stacks = stacks_path.read_text().splitlines()
+    busy = [line for line in stacks if line.startswith("busy;")]
+    assert busy
+    assert all("_busy_work (test_profiling.py:" in line for line in busy)
+    assert all(int(line.rsplit(" ", 1)[1]) > 0 for line in stacks)
+    (memory_path,) = tmp_path.glob("*.memory.txt")
+    assert "test_profiling.py" in memory_path.read_text()
+    assert not profiler.running
+
+
+def test_sigusr1_starts_a_capture() -> None:
+    profiler = Profiler()
+    previous = signal.getsignal(signal.SIGUSR1)
+    try:
+        with mock.patch.object(profiler, "capture") as capture:
+            profiler.install_signal_handler()
+            os.kill(os.getpid(), signal.SIGUSR1)
+    finally:
+        signal.signal(signal.SIGUSR1, previous)
+
+    capture.assert_called_once_with()
+
+
+def test_sigusr1_during_a_capture_start_does_not_block() -> None:
+    profiler = Profiler()
+    previous = signal.getsignal(signal.SIGUSR1)
+    try:
+        profiler.install_signal_handler()
+        with profiler._lock, mock.patch.object(threading, "Thread") as thread:
+            os.kill(os.getpid(), signal.SIGUSR1)
+    finally:
+        signal.signal(signal.SIGUSR1, previous)
+
+    thread.assert_not_called()
+
+
+def test_admin_server_starts_captures() -> None:
+    capture_profile = mock.Mock(side_effect=[True, False])
+    server = AdminServer("127.0.0.1", 0, capture_profile)
+    server.start()
+    url = f"http://127.0.0.1:{server.port}"
+    try:
+        assert requests.post(f"{url}/profile").status_code == 202
+        assert requests.post(f"{url}/profile").status_code == 409
+        assert requests.post(f"{url}/other").status_code == 404
+    finally:
+        server.stop()
+
+    assert capture_profile.call_count == 2
@@ -0,0 +1,106 @@
+import threading
+import time
+from unittest import mock
+
+from core.shutdown import ShutdownCoordinator
+
+
+def test_drain_waits_for_in_flight_runs() -> None:
+    coordinator = ShutdownCoordinator()
+    started = threading.Event()
+    report_failure = mock.Mock()
+
+    def run() -> None:
+        with coordinator.track("r_1", report_failure):
+            started.set()
+            time.sleep(0.1)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    started.wait()
+
+    coordinator.drain(timeout=5)
+
+    assert coordinator.in_flight_count == 0
+    assert coordinator.stopping.is_set()
+    report_failure.assert_not_called()
+    thread.join()
+
+
+def test_drain_reports_failure_for_unfinished_runs() -> None:
+    coordinator = ShutdownCoordinator()
+    release = threading.Event()
+    started = threading.Event()
+    report_failure = mock.Mock()
+
+    def run() -> None:
+        with coordinator.track("r_1", report_failure):
+            started.set()
+            release.wait()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    started.wait()
+
+    coordinator.drain(timeout=0.05)
+
+    report_failure.assert_called_once_with()
+    release.set()
+    thread.join()
+
+
+def test_drain_settles_the_runs_reported_as_failed() -> None:
+    coordinator = ShutdownCoordinator()
+    release = threading.Event()
+    started = threading.Event()
+    calls = mock.Mock()
+
+    def run() -> None:
+        with coordinator.on_failure_reported(calls.settle):
+            with coordinator.track("r_1", calls.report_failure):
+                started.set()
+                release.wait()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    started.wait()
+
+    coordinator.drain(timeout=0.05)
+
+    assert [name for name, _, _ in calls.mock_calls] == ["report_failure", "settle"]
+    release.set()
+    thread.join()
+
+
+def test_drain_flushes_buffers_with_remaining_time() -> None:
+    coordinator = ShutdownCoordinator()
+    flush = mock.Mock()
+    coordinator.register_flush(flush)
+
+    coordinator.drain(timeout=5)
+
+    flush.assert_called_once()
+    assert 0 < flush.call_args[0][0] <= 5
+
+
+def test_drain_ignores_failing_callbacks() -> None:
+    coordinator = ShutdownCoordinator()
+    coordinator.register_flush(mock.Mock(side_effect=Exception("flush failed")))
+    started = threading.Event()
+    release = threading.Event()
+
+    def run() -> None:
+        with coordinator.track(
+            "r_1", mock.Mock(side_effect=Exception("report failed"))
+        ):
+            started.set()
+            release.wait()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    started.wait()
+
+    coordinator.drain(timeout=0.01)
+
+    release.set()
+    thread.join()
@@ -0,0 +1,158 @@
+import json
+import re
+from pathlib import Path
+from typing import Any
+from unittest import mock
+
+import pytest
+from core.config import Mapping, settings
+from core.tracing import (
+    FileSpanExporter,
+    HttpSpanExporter,
+    SpanExporter,
+    Tracer,
+    _SpanWriter,
+    tracer,
+)
+from invokers.webhook_invoker import WebhookInvoker
+from pydantic import parse_obj_as
+from pytest import MonkeyPatch
+from pytest_mock import MockFixture
+from requests import Response
+
+
+class _MemoryExporter(SpanExporter):
+    def __init__(self) -> None:
+        self.spans: list[dict[str, Any]] = []
+
+    def export(self, spans: list[dict[str, Any]]) -> None:
+        self.spans.extend(spans)
+
+
+def test_tracer_is_off_without_exporter() -> None:
+    off = Tracer()
+
+    with off.span("run", {"run.id": "r_1"}) as span:
+        span.set_attribute("ignored", True)
+        assert off.current_span() is None
+        assert off.propagation_headers() == {}
+
+    assert not off.enabled
+    assert not tracer.enabled
+
+
+def test_spans_are_exported_with_their_parents(tmp_path: Path) -> None:
+    path = tmp_path / "port-agent" / "traces.jsonl"
+    file_tracer = Tracer(FileSpanExporter(path))
+
+    with file_tracer.span("run", {"run.id": "r_1"}) as run:
+        with pytest.raises(ValueError):
+            with file_tracer.span("webhook.request") as request_span:
+                assert file_tracer.current_span() is request_span
+                assert file_tracer.propagation_headers() == {
+                    "traceparent": request_span.traceparent
+                }
+                raise ValueError("boom")
+        with file_tracer.span("run.linked", root=True):
+            pass
+    with file_tracer.span("kafka.commit"):
+        pass
+    file_tracer.stop()
+
+    request, linked, run_span, commit = [
+        json.loads(line) for line in path.read_text().splitlines()
+    ]
+    assert run_span["spanId"] == run.span_id
+    assert run_span["parentSpanId"] is None
+    assert run_span["links"] == []
+    assert run_span["attributes"] == {"run.id": "r_1"}
+    assert run_span["status"] == {"code": "OK"}
+    assert request["traceId"] == run_span["traceId"]
+    assert request["parentSpanId"] == run_span["spanId"]
+    assert request["status"] == {"code": "ERROR", "message": "ValueError: boom"}
+    assert request["endTimeUnixNano"] >= request["startTimeUnixNano"]
+    assert commit["traceId"] != run_span["traceId"]
+    assert linked["traceId"] != run_span["traceId"]
+    assert linked["parentSpanId"] is None
+    assert linked["links"] == [
+        {"traceId": run_span["traceId"], "spanId": run_span["spanId"]}
+    ]
+    assert re.fullmatch(r"00-[0-9a-f]{32}-[0-9a-f]{16}-01", run.traceparent)
+
+
+def test_http_exporter_posts_the_spans(mocker: MockFixture) -> None:
+    post = mocker.patch("core.tracing.requests.post")
+
+    HttpSpanExporter("http://collector/v1/spans").export([{"name": "run"}])
+
+    assert post.call_args.args == ("http://collector/v1/spans",)
+    assert json.loads(post.call_args.kwargs["data"]) == {
+        "resource": {"service.name": "port-agent"},
+        "spans": [{"name": "run"}],
+    }
+
+
+def _response(status_code: int) -> Response:
+    response = Response()
+    response.status_code = status_code
+    response.raw = mock.Mock(stream=lambda *args, **kwargs: iter([b"{}"]))
+    return response
+
+
+def test_runs_are_traced_and_propagated_to_the_webhook(
+    mocker: MockFixture, monkeypatch: MonkeyPatch
+) -> None:
+    exporter = _MemoryExporter()
+    monkeypatch.setattr(tracer, "_writer", _SpanWriter(exporter))
+    monkeypatch.setattr(settings, "PORT_API_OFFLINE", True)
+    mapping = parse_obj_as(Mapping, {"url": '"http://webhook"'})
+    mocker.patch("invokers.webhook_invoker.control_the_payload_config", [mapping])
+    request_mock = mocker.patch(
+        "invokers.webhook_invoker.requests.request",
+        side_effect=lambda *args, **kwargs: _response(200),
+    )
+    invoker = WebhookInvoker()
+
+    with tracer.span("kafka.receive_batch"):
+        results = invoker.invoke_many(
+            [({"context": {"runId": f"r_{index}"}}, {}) for index in range(3)],
+            skip_signature_validation=True,
+        )
+    tracer.stop()
+
+    assert all(result.success for result in results)
+    spans = {
+        (span["name"], span["attributes"].get("run.id")): span
+        for span in exporter.spans
+    }
+    batch = spans[("kafka.receive_batch", None)]
+    requests_by_span_id = {
+        span["spanId"]: span
+        for span in exporter.spans
+        if span["name"] == "webhook.request"
+    }
+    assert len(requests_by_span_id) == 3
+    run_trace_ids = set()
+    for index in range(3):
+        run = spans[("run", f"r_{index}")]
+        assert run["parentSpanId"] is None
+        assert run["links"] == [
+            {"traceId": batch["traceId"], "spanId": batch["spanId"]}
+        ]
+        run_trace_ids.add(run["traceId"])
+    assert len(run_trace_ids) == 3
+    assert batch["traceId"] not in run_trace_ids
+    for call in request_mock.call_args_list:
+        _, trace_id, span_id, _ = call.kwargs["headers"]["traceparent"].split("-")
+        request = requests_by_span_id[span_id]
+        assert request["traceId"] == trace_id
+        assert trace_id in run_trace_ids
+        assert request["attributes"]["http.response.status_code"] == 200
+    assert {span["name"] for span in exporter.spans} == {
+        "kafka.receive_batch",
+        "mapping.select",
+        "run",
+        "payload.prepare",
+        "webhook.request",
+        "report.prepare",
+    }
@@ -1,18 +1,46 @@
+import io
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
 from typing import Any, Dict, List
 from unittest import mock
 
 import pytest
+import requests
+from core.config import ActionReport
+from core.config import Mapping as CoreMapping
+from core.config import settings
+from core.consts import consts
+from core.jq_backend import get_jq_backend
+from core.logs import LazyLogValue
 from glom import assign, glom
 from glom.core import PathAssignError
-from invokers.webhook_invoker import WebhookInvoker
+from invokers.webhook_invoker import (
+    InvocationResult,
+    ReportPayload,
+    RequestPayload,
+    WebhookInvoker,
+    _compile_jq,
+    _fuse_mapping,
+)
+from pydantic import parse_obj_as
+from pytest_mock import MockFixture
+from requests import Response
+from utils import (
+    read_capped_response_body,
+    remove_json_member,
+    sign_sha_256,
+)
 
 from app.core.config import Mapping
 from app.utils import decrypt_field, decrypt_payload_fields
 
 
-def inplace_decrypt_mock(
+def decrypt_mock(
     payload: Dict[str, Any], fields: List[str], key: str
 ) -> Dict[str, Any]:
+    payload = deepcopy(payload)
     for field_path in fields:
         if not field_path:
             continue
@@ -24,9 +52,7 @@ def inplace_decrypt_mock(
     return payload
 
 
-@mock.patch(
-    "invokers.webhook_invoker.decrypt_payload_fields", side_effect=inplace_decrypt_mock
-)
+@mock.patch("invokers.webhook_invoker.decrypt_payload_fields", side_effect=decrypt_mock)
 def test_decrypt_simple_fields(_mock_decrypt: object) -> None:
     invoker = WebhookInvoker()
     message: Dict[str, Any] = {
@@ -35,14 +61,13 @@ def test_decrypt_simple_fields(_mock_decrypt: object) -> None:
     }
     mapping = Mapping.construct()
     object.__setattr__(mapping, "fieldsToDecryptPaths", ["field1", "field2"])
-    invoker._replace_encrypted_fields(message, mapping)
-    assert message["field1"] == "decrypted_encrypted_value1"
-    assert message["field2"] == "decrypted_encrypted_value2"
+    decrypted = invoker._replace_encrypted_fields(message, mapping)
+    assert decrypted["field1"] == "decrypted_encrypted_value1"
+    assert decrypted["field2"] == "decrypted_encrypted_value2"
+    assert message["field1"] == "encrypted_value1"
 
 
-@mock.patch(
-    "invokers.webhook_invoker.decrypt_payload_fields", side_effect=inplace_decrypt_mock
-)
+@mock.patch("invokers.webhook_invoker.decrypt_payload_fields", side_effect=decrypt_mock)
 def test_decrypt_complex_fields(_mock_decrypt: object) -> None:
     invoker = WebhookInvoker()
     msg: Dict[str, Any] = {
@@ -53,15 +78,13 @@ def test_decrypt_complex_fields(_mock_decrypt: object) -> None:
     object.__setattr__(
         mapping, "fieldsToDecryptPaths", ["nested.field1", "nested.field2", "field3"]
     )
-    invoker._replace_encrypted_fields(msg, mapping)
-    assert msg["nested"]["field1"] == "decrypted_encrypted_value1"
-    assert msg["nested"]["field2"] == "decrypted_encrypted_value2"
-    assert msg["field3"] == "decrypted_encrypted_value3"
+    decrypted = invoker._replace_encrypted_fields(msg, mapping)
+    assert decrypted["nested"]["field1"] == "decrypted_encrypted_value1"
+    assert decrypted["nested"]["field2"] == "decrypted_encrypted_value2"
+    assert decrypted["field3"] == "decrypted_encrypted_value3"
 
 
-@mock.patch(
-    "invokers.webhook_invoker.decrypt_payload_fields", side_effect=inplace_decrypt_mock
-)
+@mock.patch("invokers.webhook_invoker.decrypt_payload_fields", side_effect=decrypt_mock)
 def test_partial_decryption(_mock_decrypt: object) -> None:
     invoker = WebhookInvoker()
     msg: Dict[str, Any] = {
@@ -71,15 +94,13 @@ def test_partial_decryption(_mock_decrypt: object) -> None:
     }
     mapping = Mapping.construct()
     object.__setattr__(mapping, "fieldsToDecryptPaths", ["field1", "field2"])
-    invoker._replace_encrypted_fields(msg, mapping)
-    assert msg["field1"] == "decrypted_encrypted_value1"
-    assert msg["field2"] == "decrypted_encrypted_value2"
-    assert msg["field3"] == "plain_value3"
+    decrypted = invoker._replace_encrypted_fields(msg, mapping)
+    assert decrypted["field1"] == "decrypted_encrypted_value1"
+    assert decrypted["field2"] == "decrypted_encrypted_value2"
+    assert decrypted["field3"] == "plain_value3"
 
 
-@mock.patch(
-    "invokers.webhook_invoker.decrypt_payload_fields", side_effect=inplace_decrypt_mock
-)
+@mock.patch("invokers.webhook_invoker.decrypt_payload_fields", side_effect=decrypt_mock)
 def test_decrypt_with_complex_jq(_mock_decrypt: object) -> None:
     invoker = WebhookInvoker()
     msg: Dict[str, Any] = {
@@ -89,11 +110,11 @@ def test_decrypt_with_complex_jq(_mock_decrypt: object) -> None:
     }
     mapping = Mapping.construct()
     object.__setattr__(mapping, "fieldsToDecryptPaths", ["field1", "nested.field2"])
-    invoker._replace_encrypted_fields(msg, mapping)
-    assert msg["field1"] == "decrypted_encrypted_value1"
-    assert msg["nested"]["field2"] == "decrypted_encrypted_value2"
-    assert msg["field3"] == "plain_value3"
-    assert msg == {
+    decrypted = invoker._replace_encrypted_fields(msg, mapping)
+    assert decrypted["field1"] == "decrypted_encrypted_value1"
+    assert decrypted["nested"]["field2"] == "decrypted_encrypted_value2"
+    assert decrypted["field3"] == "plain_value3"
+    assert decrypted == {
         "field1": "decrypted_encrypted_value1",
         "nested": {"field2": "decrypted_encrypted_value2"},
         "field3": "plain_value3",
@@ -198,3 +219,500 @@ def test_get_nested_and_set_nested() -> None:
         assign(data, "a.b.2", "fail")
     assign(data, "a.b.1.d", "fail")
     assert dict(data["a"]["b"][1])["d"] == "fail"
+
+
+def _streamed_response(body: bytes) -> Response:
+    response = Response()
+    response.status_code = 200
+    response.raw = io.BytesIO(body)
+    return response
+
+
+def test_read_capped_response_body_keeps_small_bodies() -> None:
+    response = _streamed_response(b'{"id": 1}')
+
+    assert not read_capped_response_body(response, 1024)
+    assert response.json() == {"id": 1}
+
+
+def test_read_capped_response_body_truncates_large_bodies() -> None:
+    response = _streamed_response(b"a" * 100)
+
+    assert read_capped_response_body(response, 10)
+    assert response.text == "a" * 10 + consts.RESPONSE_TRUNCATION_MARKER
+
+
+def _request_payload() -> RequestPayload:
+    return RequestPayload(
+        method="POST", url="http://test.com", body={}, headers={}, query={}
+    )
+
+
+@mock.patch("invokers.webhook_invoker.response_to_dict")
+def test_prepare_report_builds_only_referenced_context(
+    response_to_dict_mock: mock.Mock,
+) -> None:
+    mapping = parse_obj_as(CoreMapping, {"report": {"link": '.body.url + "/runs"'}})
+    request_payload = mock.Mock(wraps=_request_payload())
+
+    report = WebhookInvoker()._prepare_report(
+        mapping, _streamed_response(b""), request_payload, {"url": "http://test.com"}
+    )
+
+    assert report.link == "http://test.com/runs"
+    response_to_dict_mock.assert_not_called()
+    request_payload.to_dict.assert_not_called()
+
+
+def test_prepare_report_builds_referenced_response() -> None:
+    mapping = parse_obj_as(
+        CoreMapping, {"report": {"link": ".response.json.url + .request.url"}}
+    )
+    response = _streamed_response(b'{"url": "http://test.com"}')
+    read_capped_response_body(response, 1024)
+
+    report = WebhookInvoker()._prepare_report(mapping, response, _request_payload(), {})
+
+    assert report.link == "http://test.comhttp://test.com"
+
+
+@pytest.mark.parametrize(
+    "report, expected",
+    [
+        ({}, frozenset()),
+        ({"status": '"SUCCESS"'}, frozenset()),
+        (
+            {"status": ".response.ok", "link": ".body.url"},
+            frozenset({"response", "body"}),
+        ),
+        ({"status": ".response.ok", "summary": "."}, None),
+    ],
+)
+def test_action_report_context_keys(
+    report: dict, expected: frozenset[str] | None
+) -> None:
+    assert ActionReport(**report).context_keys == expected
+
+
+@mock.patch("invokers.webhook_invoker.requests.request")
+def test_request_signs_the_sent_bytes(request_mock: mock.Mock) -> None:
+    request_mock.return_value = _streamed_response(b"")
+    request_payload = _request_payload()
+    request_payload.body = {"name": "ñ", "values": [1, 2]}
+
+    WebhookInvoker._request(request_payload, lambda _: None)
+
+    sent = request_mock.call_args.kwargs
+    assert sent["data"] == b'{"name":"\\u00f1","values":[1,2]}'
+    assert sent["headers"]["Content-Type"] == "application/json"
+    assert sent["headers"]["X-Port-Signature"] == sign_sha_256(
+        sent["data"], "test", sent["headers"]["X-Port-Timestamp"]
+    )
+
+
+@mock.patch("invokers.webhook_invoker.requests.request")
+def test_request_keeps_custom_content_type(request_mock: mock.Mock) -> None:
+    request_mock.return_value = _streamed_response(b"")
+    request_payload = _request_payload()
+    request_payload.headers = {"content-type": "application/vnd.api+json"}
+
+    WebhookInvoker._request(request_payload, lambda _: None)
+
+    assert request_mock.call_args.kwargs["headers"]["content-type"] == (
+        "application/vnd.api+json"
+    )
+    assert "Content-Type" not in request_mock.call_args.kwargs["headers"]
+
+
+def _signed_message(invocation_method_name: str = "WEBHOOK") -> dict:
+    msg: dict[str, Any] = {
+        "context": {"runId": "r_1"},
+        "payload": {"name": "ñ", "values": [1, 2.5]},
+        "headers": {"X-Custom": "value"},
+    }
+    signed = (
+        {key: value for key, value in msg.items() if key != "headers"}
+        if invocation_method_name == "GITLAB"
+        else msg
+    )
+    msg["headers"] = {
+        **msg["headers"],
+        "X-Port-Signature": sign_sha_256(
+            json.dumps(signed, separators=(",", ":"), ensure_ascii=False),
+            "test",
+            "1713277889",
+        ),
+        "X-Port-Timestamp": 1713277889,
+    }
+    return msg
+
+
+def _compact(msg: dict) -> bytes:
+    return json.dumps(msg, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+@pytest.mark.parametrize("invocation_method_name", ["WEBHOOK", "GITLAB"])
+def test_verify_signature_does_not_mutate_the_message(
+    invocation_method_name: str,
+) -> None:
+    msg = _signed_message(invocation_method_name)
+    original = deepcopy(msg)
+
+    verified = WebhookInvoker().verify_signature(msg, invocation_method_name)
+
+    assert msg == original
+    assert verified is not None
+    expected_headers = (
+        None if invocation_method_name == "GITLAB" else {"X-Custom": "value"}
+    )
+    assert verified.get("headers") == expected_headers
+
+
+def test_verify_signature_uses_raw_bytes() -> None:
+    msg = _signed_message()
+    raw = _compact(msg)
+
+    with mock.patch("invokers.webhook_invoker.json.dumps") as dumps_mock:
+        verified = WebhookInvoker().verify_signature(msg, "WEBHOOK", raw)
+
+    assert verified is not None
+    assert verified["headers"] == {"X-Custom": "value"}
+    dumps_mock.assert_not_called()
+
+
+def test_verify_signature_falls_back_for_other_raw_layouts() -> None:
+    msg = _signed_message()
+
+    assert WebhookInvoker().verify_signature(msg, "WEBHOOK", json.dumps(msg).encode())
+
+
+def test_verify_signature_rejects_tampered_raw_bytes() -> None:
+    msg = _signed_message()
+    msg["payload"]["name"] = "other"
+
+    assert WebhookInvoker().verify_signature(msg, "WEBHOOK", _compact(msg)) is None
+
+
+def test_verify_signature_rejects_raw_members_outside_headers() -> None:
+    msg = _signed_message()
+    raw = _compact(msg)
+    signature = msg["headers"]["X-Port-Signature"]
+    # The members that the raw check removes don't belong to the parsed headers
+    msg["headers"]["X-Port-Signature"] = signature + "x"
+
+    assert WebhookInvoker().verify_signature(msg, "WEBHOOK", raw) is None
+
+
+@pytest.mark.parametrize(
+    "raw, expected",
+    [
+        (b'{"a":1,"key":"v","b":2}', (b'{"a":1,"b":2}', "v")),
+        (b'{"key":12,"b":2}', (b'{"b":2}', "12")),
+        (b'{"a":{"key":"v"}}', (b'{"a":{}}', "v")),
+        (b'{"key":"v","x":{"key":"v"}}', None),
+        (b'{"key":"v\\"w"}', None),
+        (b'{"key":1.5}', None),
+        (b'{"a":"key"}', None),
+    ],
+)
+def test_remove_json_member(raw: bytes, expected: tuple[bytes, str] | None) -> None:
+    assert remove_json_member(raw, "key") == expected
+
+
+def test_decrypt_payload_fields_wildcards() -> None:
+    key = "a" * 32
+    encrypted_value = encrypt_field("secret_value", key)
+    payload = {
+        "list": [{"secret": encrypted_value}, {"other": "foo"}],
+        "map": {"x": {"secret": encrypted_value}, "y": {"secret": encrypted_value}},
+    }
+
+    result = decrypt_payload_fields(payload, ["list.*.secret", "map.*.secret"], key)
+
+    assert result == {
+        "list": [{"secret": "secret_value"}, {"other": "foo"}],
+        "map": {"x": {"secret": "secret_value"}, "y": {"secret": "secret_value"}},
+    }
+
+
+def test_decrypt_payload_fields_ignores_missing_paths() -> None:
+    key = "a" * 32
+    encrypted_value = encrypt_field("secret_value", key)
+    payload: Dict[str, Any] = {"a": [encrypted_value], "b": "plain"}
+
+    result = decrypt_payload_fields(
+        payload, ["a.1", "a.x", "b.c", "missing.path", ""], key
+    )
+
+    assert result == {"a": [encrypted_value], "b": "plain"}
+
+
+def test_decrypt_payload_fields_indexes_lists_from_the_end() -> None:
+    key = "a" * 32
+    encrypted_value = encrypt_field("secret_value", key)
+    payload: Dict[str, Any] = {"a": ["plain", encrypted_value]}
+
+    result = decrypt_payload_fields(payload, ["a.-1"], key)
+
+    assert result == {"a": ["plain", "secret_value"]}
+
+
+def test_invoke_many_returns_a_result_per_message(mocker: MockFixture) -> None:
+    invoker = WebhookInvoker()
+    mapping = CoreMapping()
+    mocker.patch.object(invoker, "_find_mapping", return_value=mapping)
+    error = requests.HTTPError("failed")
+
+    def dispatch(msg: dict, _mapping: CoreMapping, _method: dict) -> bool:
+        if msg["context"]["runId"] == "r_failed":
+            raise error
+        return msg["context"]["runId"] != "r_skipped"
+
+    mocker.patch.object(invoker, "_dispatch", side_effect=dispatch)
+    batch = [
+        ({"context": {"runId": run_id}}, {"type": "WEBHOOK"})
+        for run_id in ("r_ok", "r_failed", "r_skipped")
+    ]
+
+    results = invoker.invoke_many(batch, skip_signature_validation=True)
+
+    assert results == [
+        InvocationResult("r_ok", success=True),
+        InvocationResult("r_failed", error=error),
+        InvocationResult("r_skipped"),
+    ]
+
+
+def test_invoke_many_skips_unsigned_messages(mocker: MockFixture) -> None:
+    invoker = WebhookInvoker()
+    dispatch = mocker.patch.object(invoker, "_dispatch")
+
+    results = invoker.invoke_many([({"context": {"runId": "r_1"}}, {})])
+
+    assert results == [InvocationResult("r_1")]
+    dispatch.assert_not_called()
+
+
+def test_jq_programs_are_compiled_once(mocker: MockFixture) -> None:
+    _compile_jq.cache_clear()
+    compile_mock = mocker.patch("core.jq_backend.pyjq.compile")
+
+    WebhookInvoker()._jq_exec(".body.a", {"body": {"a": 1}})
+    WebhookInvoker()._jq_exec(".body.a", {"body": {"a": 2}})
+
+    compile_mock.assert_called_once_with(".body.a")
+    _compile_jq.cache_clear()
+
+
+FUSED_TEMPLATE: dict = {
+    "method": '"PUT"',
+    "url": '.payload.url // "http://localhost"',
+    "body": {
+        "sum": ".payload.count + 1",
+        "nested": {"first": ".payload.items[]", "none": "empty", "empty": {}},
+        "list": [".payload.items", {"deep": ".payload.name | ascii_upcase"}, 7],
+        "constant": True,
+        "error": ".payload.name + 1",
+        "late_error": '1, error("late")',
+        "compile_error": ".payload +",
+        "comment": ".payload.count # trailing comment",
+    },
+    "headers": {"X-Name": ".payload.name"},
+    "query": "{}",
+}
+
+
+@pytest.mark.parametrize(
+    "context",
+    [
+        {"payload": {"url": "http://a", "count": 1, "items": [1, 2], "name": "n"}},
+        {"payload": {"count": "x", "items": 3, "name": None}},
+        {},
+    ],
+)
+def test_fused_mapping_matches_field_by_field_evaluation(context: dict) -> None:
+    invoker = WebhookInvoker()
+
+    expected = {
+        key: invoker._apply_jq_on_field(value, context)
+        for key, value in FUSED_TEMPLATE.items()
+    }
+
+    assert invoker._apply_jq_on_mapping(FUSED_TEMPLATE, context) == expected
+
+
+@pytest.mark.parametrize("backend", ["PYJQ", "JQ"])
+@pytest.mark.parametrize(
+    "context",
+    [
+        {"payload": {"url": "http://a", "count": 1, "items": [1, 2], "name": "n"}},
+        {"payload": {"count": "x", "items": 3, "name": None}},
+    ],
+)
+def test_jq_backends_give_the_same_results(backend: str, context: dict) -> None:
+    if backend == "JQ":
+        pytest.importorskip("jq")
+    expected = WebhookInvoker()._apply_jq_on_mapping(FUSED_TEMPLATE, context)
+
+    invoker = WebhookInvoker(get_jq_backend(backend))
+
+    assert invoker._apply_jq_on_mapping(FUSED_TEMPLATE, context) == expected
+    assert invoker._find_mapping(context) == WebhookInvoker()._find_mapping(context)
+
+
+def test_fused_mapping_runs_a_single_program(mocker: MockFixture) -> None:
+    invoker = WebhookInvoker()
+    jq_exec = mocker.spy(invoker, "_jq_exec")
+    mapping = parse_obj_as(
+        CoreMapping, {"body": {"a": ".body.a", "b": ".body.b"}, "url": ".url"}
+    )
+
+    payload = invoker._prepare_payload(
+        mapping, {"body": {"a": 1, "b": 2}, "url": "http://u"}, {}
+    )
+
+    assert payload.body == {"a": 1, "b": 2}
+    assert payload.url == "http://u"
+    jq_exec.assert_not_called()
+
+
+def test_simple_mapping_runs_no_jq_program() -> None:
+    template = {
+        "url": '"http://\\(.payload.host)/runs"',
+        "body": {"branch": ".payload.properties.branch", "first": ".items[0]"},
+        "headers": {"X-Run-Id": ".context.runId"},
+    }
+    context = {
+        "payload": {"host": "localhost", "properties": {"branch": "main"}},
+        "items": [1.0],
+        "context": {"runId": "r_1"},
+    }
+
+    invoker = WebhookInvoker()
+    assert _fuse_mapping(invoker.jq_backend, json.dumps(template)).program is None
+    assert invoker._apply_jq_on_mapping(template, context) == {
+        "url": "http://localhost/runs",
+        "body": {"branch": "main", "first": 1},
+        "headers": {"X-Run-Id": "r_1"},
+    }
+
+
+def test_report_payload_to_dict_keeps_set_fields_with_port_names() -> None:
+    report = ReportPayload(status="SUCCESS", external_run_id=0)
+
+    assert report.to_dict() == {"status": "SUCCESS", "externalRunId": 0}
+
+
+def test_mapping_templates_are_computed_at_load() -> None:
+    mapping = parse_obj_as(
+        CoreMapping,
+        {
+            "enabled": ".a",
+            "url": ".url",
+            "body": {"a": ".a"},
+            "report": {"externalRunId": ".response.json.id"},
+            "fieldsToDecryptPaths": ["a"],
+        },
+    )
+
+    assert mapping.payload_template == {"url": ".url", "body": {"a": ".a"}}
+    assert mapping.report is not None
+    assert mapping.report.template == {"external_run_id": ".response.json.id"}
+
+
+def test_lazy_log_value_is_computed_only_when_logged(
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    compute = mock.Mock(return_value={"a": 1})
+    logger = logging.getLogger("test_lazy_log_value")
+    logger.setLevel(logging.WARNING)
+
+    logger.info("value: %s", LazyLogValue(compute))
+    compute.assert_not_called()
+
+    logger.warning("value: %s", LazyLogValue(compute))
+    assert "value: {'a': 1}" in caplog.text
+
+
+def test_decrypt_payload_fields_copies_only_the_decrypted_paths() -> None:
+    key = "a" * 32
+    payload: Dict[str, Any] = {
+        "secrets": {"token": encrypt_field("secret_value", key)},
+        "entity": {"identifier": "service"},
+    }
+    original = deepcopy(payload)
+
+    result = decrypt_payload_fields(payload, ["secrets.token"], key)
+
+    assert result["secrets"] == {"token": "secret_value"}
+    assert payload == original
+    assert result["entity"] is payload["entity"]
+    assert decrypt_payload_fields(payload, ["entity.missing"], key) is payload
+
+
+@mock.patch("invokers.webhook_invoker.requests.request")
+def test_request_does_not_mutate_the_payload(request_mock: mock.Mock) -> None:
+    request_mock.return_value = _streamed_response(b"")
+    request_payload = _request_payload()
+    request_payload.headers = {"X-Custom": "value"}
+
+    WebhookInvoker._request(request_payload, lambda _: None)
+
+    assert request_payload.headers == {"X-Custom": "value"}
+    assert "X-Port-Signature" in request_mock.call_args.kwargs["headers"]
+
+
+def test_concurrent_invocations_share_the_message_safely(
+    mocker: MockFixture, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    secret = "k" * 32
+    monkeypatch.setattr(settings, "PORT_CLIENT_SECRET", secret)
+    monkeypatch.setattr(settings, "PORT_API_OFFLINE", True)
+    mapping = parse_obj_as(
+        CoreMapping,
+        {
+            "url": '"http://webhook"',
+            "body": {"token": ".payload.secrets.token", "payload": ".payload"},
+            "headers": ".headers",
+            "fieldsToDecryptPaths": ["payload.secrets.token"],
+        },
+    )
+    mocker.patch("invokers.webhook_invoker.control_the_payload_config", [mapping])
+    request_mock = mocker.patch(
+        "invokers.webhook_invoker.requests.request",
+        side_effect=lambda *args, **kwargs: _streamed_response(b"{}"),
+    )
+    msg: dict[str, Any] = {
+        "context": {"runId": "r_1"},
+        "payload": {
+            "secrets": {"token": encrypt_field("secret_value", secret)},
+            "entity": {"identifier": "service"},
+        },
+        "headers": {"X-Custom": "value"},
+    }
+    msg["headers"] = {
+        **msg["headers"],
+        "X-Port-Signature": sign_sha_256(
+            json.dumps(msg, separators=(",", ":"), ensure_ascii=False),
+            secret,
+            "1713277889",
+        ),
+        "X-Port-Timestamp": "1713277889",
+    }
+    original = deepcopy(msg)
+    invoker = WebhookInvoker()
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(
+            executor.map(lambda _: invoker.invoke(msg, {"type": "WEBHOOK"}), range(200))
+        )
+
+    assert all(results)
+    assert msg == original
+    assert request_mock.call_count == 200
+    for call in request_mock.call_args_list:
+        body = json.loads(call.kwargs["data"])
+        assert body["token"] == "secret_value"
+        assert body["payload"]["secrets"]["token"] == "secret_value"
+        assert call.kwargs["headers"]["X-Custom"] == "value"
+        assert "X-Port-Signature" in call.kwargs["headers"]
@@ -1,12 +1,14 @@
 import json
 import os
-from signal import SIGINT
-from typing import Any, Callable, Generator, Optional
+import time
+from signal import SIGINT, getsignal
+from typing import Any, Callable, Generator, Iterator, Optional
 
 import port_client
 import pytest
 import requests
 from _pytest.monkeypatch import MonkeyPatch
+from confluent_kafka import TIMESTAMP_CREATE_TIME
 from confluent_kafka import Consumer as _Consumer
 from core.config import Mapping
 from pydantic import parse_obj_as
@@ -27,6 +29,12 @@ def mock_requests(monkeypatch: MonkeyPatch, request: Any) -> None:
         def ok(self) -> bool:
             return 200 <= self.status_code <= 299
 
+        def iter_content(self, *args: Any, **kwargs: Any) -> Iterator[bytes]:
+            yield self.text.encode()
+
+        def close(self) -> None:
+            pass
+
         def raise_for_status(self) -> None:
             if 400 <= self.status_code <= 599:
                 raise Exception(self.text)
@@ -43,6 +51,14 @@ def mock_requests(monkeypatch: MonkeyPatch, request: Any) -> None:
 
 
 def terminate_consumer() -> None:
+    # A signal sent before the consumer of the test starts running would be
+    # handled by the consumer of a previous test and lost
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        handler = getsignal(SIGINT)
+        if getattr(getattr(handler, "__self__", None), "running", False):
+            break
+        time.sleep(0.001)
     os.kill(os.getpid(), SIGINT)
 
 
@@ -80,6 +96,9 @@ def mock_kafka(monkeypatch: MonkeyPatch, request: Any) -> None:
         def offset(self, *args: Any, **kwargs: Any) -> int:
             return 0
 
+        def timestamp(self) -> tuple[int, int]:
+            return TIMESTAMP_CREATE_TIME, 1713277889000
+
         def value(self) -> bytes:
             return request.getfixturevalue(request.param[0])(request.param[1])
 
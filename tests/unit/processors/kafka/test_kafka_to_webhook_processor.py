@@ -141,6 +141,7 @@ def test_single_stream_success_control_the_payload(
 
     expected_headers["X-Port-Timestamp"] = ANY
     expected_headers["X-Port-Signature"] = ANY
+    expected_headers["Content-Type"] = "application/json"
     Timer(0.01, terminate_consumer).start()
     request_mock = mocker.patch("requests.request")
     request_mock.return_value.headers = {}
@@ -155,11 +156,12 @@ def test_single_stream_success_control_the_payload(
         request_mock.assert_called_once_with(
             "POST",
             ANY,
-            json=expected_body,
+            data=json.dumps(expected_body, separators=(",", ":")).encode(),
             headers=expected_headers,
             params=expected_query,
             timeout=settings.WEBHOOK_INVOKER_TIMEOUT,
             verify=settings.WEBHOOK_VERIFY_SSL,
+            stream=True,
         )
 
         mock_error.assert_not_called()
@@ -210,17 +212,19 @@ def test_invocation_method_synchronized(
 
     expected_headers["X-Port-Timestamp"] = ANY
     expected_headers["X-Port-Signature"] = ANY
+    expected_headers["Content-Type"] = "application/json"
     with mock.patch.object(consumer_logger, "error") as mock_error:
         streamer = KafkaStreamer(Consumer())
         streamer.stream()
         request_mock.assert_called_once_with(
             "POST",
             ANY,
-            json=expected_body,
+            data=json.dumps(expected_body, separators=(",", ":")).encode(),
             headers=expected_headers,
             params=expected_query,
             timeout=settings.WEBHOOK_INVOKER_TIMEOUT,
             verify=settings.WEBHOOK_VERIFY_SSL,
+            stream=True,
         )
 
         request_patch_mock.assert_has_calls(
@@ -235,7 +239,7 @@ def test_invocation_method_synchronized(
                 call(
                     f"{settings.PORT_API_BASE_URL}/v1/actions/runs/"
                     f"{webhook_run_payload['context']['runId']}",
-                    json={"status": "SUCCESS"},
+                    json={"status": "SUCCESS", "link": "http://test.com"},
                     headers={},
                 ),
                 call().raise_for_status(),
@@ -294,6 +298,7 @@ def test_invocation_method_method_override(
     expected_headers["X-Port-Signature"] = sign_sha_256(
         json.dumps(expected_body, separators=(",", ":")), "test", str(time.time())
     )
+    expected_headers["Content-Type"] = "application/json"
 
     expected_query: dict[str, ANY] = {}
     Timer(0.01, terminate_consumer).start()
@@ -305,13 +310,14 @@ def test_invocation_method_method_override(
         request_mock.assert_called_once_with(
             "GET",
             ANY,
-            json=expected_body,
+            data=json.dumps(expected_body, separators=(",", ":")).encode(),
             # we are removing the signature headers from the
             # body is it shouldn't concern the invoked webhook
             headers=expected_headers,
             params=expected_query,
             timeout=settings.WEBHOOK_INVOKER_TIMEOUT,
             verify=settings.WEBHOOK_VERIFY_SSL,
+            stream=True,
         )
 
         mock_error.assert_not_called()
@@ -1,6 +1,8 @@
-from unittest.mock import patch
+from copy import deepcopy
+from unittest.mock import MagicMock, patch
 
 import pytest
+from invokers.webhook_invoker import InvocationResult
 from processors.polling.polling_to_webhook_processor import PollingToWebhookProcessor
 
 _INVOKER = "processors.polling.polling_to_webhook_processor.webhook_invoker"
@@ -236,3 +238,68 @@ def test_process_wf_node_run_empty_config(mock_invoker):
     call_args = mock_invoker.invoke.call_args
     msg_value = call_args[0][0]
     assert msg_value["context"]["nodeConfig"] == {}
+
+
+@patch("processors.polling.polling_to_webhook_processor.webhook_invoker")
+def test_process_runs_invokes_the_whole_batch(
+    mock_invoker: MagicMock, sample_run: dict
+) -> None:
+    second_run = {**deepcopy(sample_run), "id": "run_456"}
+    invocation_method = {"type": "WEBHOOK", "url": "http://localhost:8080/webhook"}
+    mock_invoker.invoke_many.return_value = [
+        InvocationResult("run_123", success=True),
+        InvocationResult("run_456", error=Exception("Processing failed")),
+    ]
+
+    results = PollingToWebhookProcessor.process_runs(
+        [(sample_run, invocation_method), (second_run, invocation_method)]
+    )
+
+    assert results == mock_invoker.invoke_many.return_value
+    batch = mock_invoker.invoke_many.call_args[0][0]
+    assert [msg["context"]["runId"] for msg, _ in batch] == ["run_123", "run_456"]
+    assert mock_invoker.invoke_many.call_args.kwargs == {
+        "skip_signature_validation": True
+    }
+
+
+def test_build_run_message_shares_the_untouched_body(sample_run: dict) -> None:
+    original = deepcopy(sample_run)
+    invocation_method = {"type": "WEBHOOK", "url": "http://localhost:8080/webhook"}
+
+    msg_value = PollingToWebhookProcessor._build_run_message(
+        "run_123", sample_run, invocation_method
+    )
+
+    assert sample_run == original
+    body = sample_run["payload"]["body"]
+    assert msg_value["payload"]["properties"] is body["payload"]["properties"]
+    assert msg_value["trigger"] is body["trigger"]
+    assert msg_value["payload"]["action"] == {
+        "identifier": "deploy",
+        "invocationMethod": invocation_method,
+    }
+    assert msg_value["context"] == {
+        "entity": "entity_123",
+        "blueprint": "microservice",
+        "runId": "run_123",
+    }
+
+
+@patch(_INVOKER)
+def test_process_runs_isolates_runs_without_body(
+    mock_invoker: MagicMock, sample_run: dict
+) -> None:
+    first_run = {"id": "run_000", "payload": {"type": "WEBHOOK"}}
+    invocation_method = {"type": "WEBHOOK", "url": "http://localhost:8080/webhook"}
+    mock_invoker.invoke_many.return_value = [InvocationResult("run_123", success=True)]
+
+    results = PollingToWebhookProcessor.process_runs(
+        [(first_run, invocation_method), (sample_run, invocation_method)]
+    )
+
+    assert results[0].run_id == "run_000"
+    assert isinstance(results[0].error, KeyError)
+    assert results[1] == InvocationResult("run_123", success=True)
+    batch = mock_invoker.invoke_many.call_args[0][0]
+    assert [msg["context"]["runId"] for msg, _ in batch] == ["run_123"]
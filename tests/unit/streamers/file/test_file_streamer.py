@@ -0,0 +1,117 @@
+import base64
+import io
+import json
+import time
+from pathlib import Path
+from unittest import mock
+
+import pytest
+import requests
+from core.config import settings
+from pytest import MonkeyPatch
+from pytest_mock import MockFixture
+from streamers.file.file_streamer import FileStreamer
+from streamers.streamer_factory import StreamerFactory
+
+from app.utils import sign_sha_256
+
+
+def _signed_run_message(run_id: str) -> bytes:
+    message: dict = {
+        "context": {"runId": run_id},
+        "payload": {
+            "action": {
+                "invocationMethod": {
+                    "type": "WEBHOOK",
+                    "agent": True,
+                    "url": "http://localhost:80/api/test",
+                }
+            }
+        },
+        "headers": {},
+    }
+    signature = sign_sha_256(
+        json.dumps(message, separators=(",", ":")), "test", "1713277889"
+    )
+    message["headers"] = {
+        "X-Port-Signature": signature,
+        "X-Port-Timestamp": 1713277889,
+    }
+    return json.dumps(message, separators=(",", ":")).encode()
+
+
+def _response(*args: object, **kwargs: object) -> requests.Response:
+    response = requests.Response()
+    response.status_code = 200
+    response.raw = io.BytesIO(b"{}")
+    return response
+
+
+@pytest.fixture
+def offline(monkeypatch: MonkeyPatch, mocker: MockFixture) -> mock.MagicMock:
+    monkeypatch.setattr(settings, "PORT_API_OFFLINE", True)
+    return mocker.patch("requests.request", side_effect=_response)
+
+
+def _streamer(monkeypatch: MonkeyPatch, path: Path, rate: float = 0) -> FileStreamer:
+    monkeypatch.setattr(settings, "FILE_STREAMER_PATH", path)
+    monkeypatch.setattr(settings, "FILE_STREAMER_RATE_PER_SECOND", rate)
+    return FileStreamer()
+
+
+def test_replays_recorded_messages_through_the_invoker(
+    offline: mock.MagicMock, monkeypatch: MonkeyPatch, tmp_path: Path
+) -> None:
+    path = tmp_path / "messages.jsonl"
+    path.write_bytes(
+        b"\n".join(_signed_run_message(f"r_{index}") for index in range(3)) + b"\n"
+    )
+    streamer = _streamer(monkeypatch, path)
+
+    streamer.stream()
+
+    assert offline.call_count == 3
+    assert streamer.file_consumer.stats.processed == 3
+    assert streamer.file_consumer.stats.failed == 0
+    assert len(streamer.file_consumer.stats.durations) == 3
+
+
+def test_replays_a_directory_of_captured_messages(
+    offline: mock.MagicMock, monkeypatch: MonkeyPatch, tmp_path: Path
+) -> None:
+    pretty = json.dumps(json.loads(_signed_run_message("r_1")), indent=2)
+    (tmp_path / "1.json").write_text(pretty)
+    dead_letter = {
+        "topic": settings.KAFKA_RUNS_TOPIC,
+        "partition": 0,
+        "offset": 10,
+        "value": base64.b64encode(_signed_run_message("r_2")).decode(),
+    }
+    (tmp_path / "2.jsonl").write_text(json.dumps(dead_letter) + "\nnot json\n")
+    streamer = _streamer(monkeypatch, tmp_path)
+
+    streamer.stream()
+
+    assert offline.call_count == 2
+    assert streamer.file_consumer.stats.processed == 2
+    assert streamer.file_consumer.stats.failed == 1
+
+
+def test_replays_at_the_configured_rate(
+    offline: mock.MagicMock, monkeypatch: MonkeyPatch, tmp_path: Path
+) -> None:
+    path = tmp_path / "messages.jsonl"
+    path.write_bytes(
+        b"\n".join(_signed_run_message(f"r_{index}") for index in range(3))
+    )
+    streamer = _streamer(monkeypatch, path, rate=50)
+
+    started_at = time.monotonic()
+    streamer.stream()
+
+    assert time.monotonic() - started_at >= 0.04
+    assert offline.call_count == 3
+
+
+def test_factory_creates_file_streamer() -> None:
+    assert isinstance(StreamerFactory.get_streamer("FILE"), FileStreamer)
@@ -1,12 +1,14 @@
 import json
 import os
-from signal import SIGINT
-from typing import Any, Callable, Generator, Optional
+import time
+from signal import SIGINT, getsignal
+from typing import Any, Callable, Generator, Iterator, Optional
 
 import port_client
 import pytest
 import requests
 from _pytest.monkeypatch import MonkeyPatch
+from confluent_kafka import TIMESTAMP_CREATE_TIME
 from confluent_kafka import Consumer as _Consumer
 
 from app.utils import sign_sha_256
@@ -33,6 +35,12 @@ def mock_requests(monkeypatch: MonkeyPatch, request: Any) -> None:
         def ok(self) -> bool:
             return 200 <= self.status_code <= 299
 
+        def iter_content(self, *args: Any, **kwargs: Any) -> Iterator[bytes]:
+            yield self.text.encode()
+
+        def close(self) -> None:
+            pass
+
         def raise_for_status(self) -> None:
             if 400 <= self.status_code <= 599:
                 raise Exception(self.text)
@@ -49,6 +57,14 @@ def mock_requests(monkeypatch: MonkeyPatch, request: Any) -> None:
 
 
 def terminate_consumer() -> None:
+    # A signal sent before the consumer of the test starts running would be
+    # handled by the consumer of a previous test and lost
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        handler = getsignal(SIGINT)
+        if getattr(getattr(handler, "__self__", None), "running", False):
+            break
+        time.sleep(0.001)
     os.kill(os.getpid(), SIGINT)
 
 
@@ -86,6 +102,9 @@ def mock_kafka(monkeypatch: MonkeyPatch, request: Any) -> None:
         def offset(self, *args: Any, **kwargs: Any) -> int:
             return 0
 
+        def timestamp(self) -> tuple[int, int]:
+            return TIMESTAMP_CREATE_TIME, 1713277889000
+
         def value(self) -> bytes:
             return request.getfixturevalue(request.param[0])(request.param[1])
 
@@ -104,6 +123,12 @@ def mock_kafka(monkeypatch: MonkeyPatch, request: Any) -> None:
     def mock_poll(self: Any, timeout: Any = None) -> Optional[MockKafkaMessage]:
         return next(kafka_messages_generator)
 
+    def mock_consume(
+        self: Any, num_messages: int = 1, timeout: Any = None
+    ) -> list[MockKafkaMessage]:
+        msg = next(kafka_messages_generator)
+        return [msg] if msg is not None else []
+
     def mock_commit(self: Any, message: Any = None, *args: Any, **kwargs: Any) -> None:
         return None
 
@@ -112,6 +137,7 @@ def mock_kafka(monkeypatch: MonkeyPatch, request: Any) -> None:
 
     monkeypatch.setattr(Consumer, "subscribe", mock_subscribe)
     monkeypatch.setattr(Consumer, "poll", mock_poll)
+    monkeypatch.setattr(Consumer, "consume", mock_consume)
     monkeypatch.setattr(Consumer, "commit", mock_commit)
     monkeypatch.setattr(Consumer, "close", mock_close)
 
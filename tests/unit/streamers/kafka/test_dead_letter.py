@@ -0,0 +1,155 @@
+import json
+import time
+from pathlib import Path
+from unittest import mock
+
+from confluent_kafka import TIMESTAMP_CREATE_TIME, Consumer
+from consumers.dead_letter import (
+    DeadLetter,
+    FailedMessageHandler,
+    FileDeadLetterSink,
+)
+from consumers.kafka_consumer import KafkaConsumer
+from core.config import settings
+from core.retry import BackoffPolicy
+from pytest import MonkeyPatch
+from replay_dead_letters import replay
+
+
+def _message(value: bytes | None = b'{"context": {}}', offset: int = 7) -> mock.Mock:
+    msg = mock.Mock()
+    msg.error.return_value = None
+    msg.topic.return_value = settings.KAFKA_RUNS_TOPIC
+    msg.partition.return_value = 0
+    msg.offset.return_value = offset
+    msg.value.return_value = value
+    msg.timestamp.return_value = (TIMESTAMP_CREATE_TIME, 1713277889000)
+    return msg
+
+
+def _handler(
+    msg_process: mock.Mock, path: Path, max_retries: int, backoff: float = 0.001
+) -> FailedMessageHandler:
+    return FailedMessageHandler(
+        msg_process,
+        FileDeadLetterSink(path),
+        max_retries,
+        BackoffPolicy(backoff, backoff, 1, 0),
+        max_pending=10,
+    )
+
+
+def _read_letters(path: Path) -> list[DeadLetter]:
+    if not path.exists():
+        return []
+    return [DeadLetter.from_json(line) for line in path.read_text().splitlines()]
+
+
+def _wait_for_letters(path: Path, count: int) -> list[DeadLetter]:
+    deadline = time.monotonic() + 5
+    while len(_read_letters(path)) < count and time.monotonic() < deadline:
+        time.sleep(0.001)
+    return _read_letters(path)
+
+
+def test_failed_message_is_retried_then_dead_lettered(tmp_path: Path) -> None:
+    path = tmp_path / "dead_letters.jsonl"
+    msg_process = mock.Mock(side_effect=RuntimeError("Webhook is down"))
+    handler = _handler(msg_process, path, max_retries=2)
+    handler.start()
+
+    handler.handle(_message(), RuntimeError("Webhook is down"))
+    letters = _wait_for_letters(path, 1)
+    handler.stop()
+
+    assert msg_process.call_count == 2
+    assert len(letters) == 1
+    assert letters[0].topic == settings.KAFKA_RUNS_TOPIC
+    assert letters[0].offset == 7
+    assert letters[0].value == b'{"context": {}}'
+    assert letters[0].error == "Webhook is down"
+    assert letters[0].attempts == 3
+
+
+def test_successful_retry_is_not_dead_lettered(tmp_path: Path) -> None:
+    path = tmp_path / "dead_letters.jsonl"
+    processed = mock.Mock()
+    handler = _handler(processed, path, max_retries=3)
+    handler.start()
+
+    handler.handle(_message(), RuntimeError("Webhook is down"))
+    deadline = time.monotonic() + 5
+    while not processed.called and time.monotonic() < deadline:
+        time.sleep(0.001)
+    handler.stop()
+
+    processed.assert_called_once()
+    assert _read_letters(path) == []
+
+
+def test_malformed_message_is_dead_lettered_without_retries(tmp_path: Path) -> None:
+    path = tmp_path / "dead_letters.jsonl"
+    msg_process = mock.Mock()
+    handler = _handler(msg_process, path, max_retries=3)
+
+    handler.handle(_message(b"not json"), json.JSONDecodeError("Expecting", "", 0))
+
+    msg_process.assert_not_called()
+    assert [letter.attempts for letter in _read_letters(path)] == [1]
+
+
+def test_tombstone_is_dead_lettered_with_a_null_value(tmp_path: Path) -> None:
+    path = tmp_path / "port-agent" / "dead_letters.jsonl"
+    sink = FileDeadLetterSink(path)
+
+    sink.write(DeadLetter.from_message(_message(None), ValueError("No value"), 1))
+
+    assert json.loads(path.read_text())["value"] is None
+    [letter] = _read_letters(path)
+    assert letter.value is None
+    assert letter.error == "No value"
+
+
+def test_pending_retries_are_dead_lettered_on_stop(tmp_path: Path) -> None:
+    path = tmp_path / "dead_letters.jsonl"
+    msg_process = mock.Mock()
+    handler = _handler(msg_process, path, max_retries=3, backoff=60)
+    handler.start()
+
+    handler.handle(_message(offset=1), RuntimeError("Webhook is down"))
+    handler.handle(_message(offset=2), RuntimeError("Webhook is down"))
+    handler.stop()
+
+    msg_process.assert_not_called()
+    assert [letter.offset for letter in _read_letters(path)] == [1, 2]
+
+
+def test_consumer_dead_letters_failed_messages(
+    monkeypatch: MonkeyPatch, tmp_path: Path
+) -> None:
+    path = tmp_path / "dead_letters.jsonl"
+    monkeypatch.setattr(settings, "DEAD_LETTER_SINK", "FILE")
+    monkeypatch.setattr(settings, "DEAD_LETTER_FILE_PATH", path)
+    msg_process = mock.Mock(side_effect=RuntimeError("Webhook is down"))
+    kafka_consumer = KafkaConsumer(msg_process, mock.MagicMock(spec=Consumer))
+
+    kafka_consumer._process_message(_message())
+
+    assert [letter.error for letter in _read_letters(path)] == ["Webhook is down"]
+
+
+def test_replay_processes_dead_letters_again(tmp_path: Path) -> None:
+    path = tmp_path / "dead_letters.jsonl"
+    failed_path = tmp_path / "dead_letters.jsonl.failed"
+    not_for_agent = json.dumps(
+        {"payload": {"action": {"invocationMethod": {"agent": False}}}}
+    ).encode()
+    sink = FileDeadLetterSink(path)
+    sink.write(DeadLetter.from_message(_message(not_for_agent, 1), RuntimeError(), 1))
+    sink.write(DeadLetter.from_message(_message(b"not json", 2), ValueError(), 1))
+
+    failed = replay(path, failed_path)
+
+    assert failed == 1
+    letters = _read_letters(failed_path)
+    assert [(letter.offset, letter.attempts) for letter in letters] == [(2, 2)]
@@ -0,0 +1,290 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from confluent_kafka import TIMESTAMP_CREATE_TIME, Consumer, TopicPartition
+from consumers.kafka_consumer import KafkaConsumer, _OffsetTracker
+from consumers.kafka_consumer import logger as consumer_logger
+from consumers.kafka_stats import KafkaStatsCollector
+from core.config import settings
+from core.metrics import Metrics, MetricsReporter, metrics
+from core.shutdown import ShutdownCoordinator, shutdown_coordinator
+from pytest import MonkeyPatch
+
+
+def _message(offset: int, partition: int = 0) -> mock.Mock:
+    msg = mock.Mock()
+    msg.error.return_value = None
+    msg.topic.return_value = "test_org.runs"
+    msg.partition.return_value = partition
+    msg.offset.return_value = offset
+    msg.timestamp.return_value = (TIMESTAMP_CREATE_TIME, 1713277889000)
+    return msg
+
+
+def test_offset_tracker_commits_up_to_first_unfinished_message() -> None:
+    tracker = _OffsetTracker()
+    msgs = [_message(offset) for offset in range(3)]
+    generations = [tracker.start(msg) for msg in msgs]
+
+    tracker.finish(msgs[1], generations[1])
+    assert tracker.committable() == []
+    assert tracker.in_flight == 2
+
+    tracker.finish(msgs[0], generations[0])
+    assert tracker.committable() == [TopicPartition("test_org.runs", 0, 2)]
+    assert tracker.committable() == []
+
+    tracker.finish(msgs[2], generations[2])
+    assert tracker.committable() == [TopicPartition("test_org.runs", 0, 3)]
+    assert tracker.in_flight == 0
+
+
+def test_offset_tracker_forgets_revoked_partitions() -> None:
+    tracker = _OffsetTracker()
+    msg = _message(0, partition=1)
+    generation = tracker.start(msg)
+
+    tracker.forget([TopicPartition("test_org.runs", 1)])
+    tracker.finish(msg, generation)
+
+    assert tracker.committable() == []
+    assert tracker.in_flight == 0
+
+
+def test_offset_tracker_ignores_late_finish_after_reassignment() -> None:
+    tracker = _OffsetTracker()
+    stale = _message(0)
+    stale_generation = tracker.start(stale)
+
+    tracker.forget([TopicPartition("test_org.runs", 0)])
+    # The partition is assigned back and the message is consumed again
+    redelivered = _message(0)
+    generation = tracker.start(redelivered)
+    tracker.finish(stale, stale_generation)
+
+    assert tracker.committable() == []
+    assert tracker.in_flight == 1
+
+    tracker.finish(redelivered, generation)
+    assert tracker.committable() == [TopicPartition("test_org.runs", 0, 1)]
+
+
+def test_failure_handler_stops_after_the_final_commit(
+    monkeypatch: MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "METRICS_LOG_INTERVAL_SECONDS", 0)
+    calls = mock.Mock()
+    consumer = mock.MagicMock(spec=Consumer)
+    consumer.commit = calls.commit
+    kafka_consumer = KafkaConsumer(lambda msg: None, consumer)
+    consumer.poll.side_effect = lambda timeout: kafka_consumer.exit_gracefully()
+    monkeypatch.setattr(kafka_consumer, "_failures", calls.failures)
+    monkeypatch.setattr(shutdown_coordinator, "drain", calls.drain)
+
+    kafka_consumer.start()
+
+    assert [name for name, _, _ in calls.mock_calls] == [
+        "failures.start",
+        "drain",
+        "commit",
+        "failures.stop",
+    ]
+
+
+def test_concurrent_consumer_commits_runs_failed_on_shutdown(
+    monkeypatch: MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "METRICS_LOG_INTERVAL_SECONDS", 0)
+    monkeypatch.setattr(settings, "KAFKA_CONSUMER_MAX_IN_FLIGHT_MESSAGES", 2)
+    monkeypatch.setattr(settings, "SHUTDOWN_GRACE_PERIOD_SECONDS", 0.05)
+    coordinator = ShutdownCoordinator()
+    monkeypatch.setattr("consumers.kafka_consumer.shutdown_coordinator", coordinator)
+    report_failure = mock.Mock()
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_run(msg: mock.Mock) -> None:
+        with coordinator.track("r_1", report_failure):
+            started.set()
+            release.wait(5)
+
+    consumer = mock.MagicMock(spec=Consumer)
+    kafka_consumer = KafkaConsumer(slow_run, consumer)
+
+    def poll(timeout: float) -> mock.Mock | None:
+        if consumer.poll.call_count == 1:
+            return _message(0)
+        started.wait(5)
+        kafka_consumer.exit_gracefully()
+        return None
+
+    consumer.poll.side_effect = poll
+
+    try:
+        kafka_consumer.start()
+    finally:
+        release.set()
+
+    report_failure.assert_called_once_with()
+    consumer.commit.assert_called_once_with(
+        offsets=[TopicPartition("test_org.runs", 0, 1)], asynchronous=False
+    )
+
+
+def test_concurrent_consumer_pauses_and_resumes_partitions(
+    monkeypatch: MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "KAFKA_CONSUMER_MAX_IN_FLIGHT_MESSAGES", 2)
+    monkeypatch.setattr(settings, "KAFKA_CONSUMER_RESUME_IN_FLIGHT_MESSAGES", 1)
+    assignment = [TopicPartition("test_org.runs", 0)]
+    consumer = mock.MagicMock(spec=Consumer)
+    consumer.assignment.return_value = assignment
+    consumer.poll.side_effect = [_message(0), _message(1), None, None]
+    release = threading.Event()
+    kafka_consumer = KafkaConsumer(lambda msg: release.wait(5), consumer)
+    offsets = _OffsetTracker()
+    kafka_consumer._offsets = offsets
+
+    with ThreadPoolExecutor(2) as executor:
+        kafka_consumer._poll_concurrently(executor, offsets)
+        consumer.pause.assert_not_called()
+        kafka_consumer._poll_concurrently(executor, offsets)
+
+        consumer.pause.assert_called_once_with(assignment)
+        assert metrics.get("kafka_consumer.paused_partitions") == 1
+
+        # Polling goes on while paused to stay in the group
+        kafka_consumer._poll_concurrently(executor, offsets)
+        assert consumer.poll.call_count == 3
+        consumer.resume.assert_not_called()
+
+        release.set()
+        deadline = time.monotonic() + 5
+        while offsets.in_flight and time.monotonic() < deadline:
+            time.sleep(0.001)
+        kafka_consumer._poll_concurrently(executor, offsets)
+
+    consumer.resume.assert_called_once_with(assignment)
+    consumer.commit.assert_called_once_with(
+        offsets=[TopicPartition("test_org.runs", 0, 2)], asynchronous=False
+    )
+    assert metrics.get("kafka_consumer.paused_partitions") == 0
+
+
+def test_consumer_config_applies_preset_and_extra_config(
+    monkeypatch: MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "KAFKA_CONSUMER_PRESET", "high-throughput")
+    monkeypatch.setattr(
+        settings,
+        "KAFKA_CONSUMER_EXTRA_CONFIG",
+        {
+            "fetch.wait.max.ms": 100,
+            "partition.assignment.strategy": "cooperative-sticky",
+        },
+    )
+
+    with mock.patch(
+        "consumers.kafka_consumer.Consumer"
+    ) as consumer_cls, mock.patch.object(consumer_logger, "info") as mock_info:
+        KafkaConsumer(mock.Mock(), None, (["broker:9092"], "user", "password"))
+
+    conf = consumer_cls.call_args[0][0]
+    assert conf["fetch.min.bytes"] == 64 * 1024
+    assert conf["fetch.wait.max.ms"] == 100
+    assert conf["partition.assignment.strategy"] == "cooperative-sticky"
+    assert conf["sasl.password"] == "password"
+    logged_conf = next(
+        c.args[1] for c in mock_info.call_args_list if "config" in c.args[0]
+    )
+    assert logged_conf["sasl.password"] == "****"
+    assert logged_conf["fetch.wait.max.ms"] == 100
+
+
+def test_empty_incremental_assignment_keeps_consuming() -> None:
+    consumer = mock.MagicMock(spec=Consumer)
+    consumer.assignment.return_value = [TopicPartition("test_org.runs", 0)]
+    kafka_consumer = KafkaConsumer(mock.Mock(), consumer)
+    kafka_consumer.running = True
+
+    kafka_consumer._on_assign(consumer, [])
+
+    assert kafka_consumer.running
+
+    consumer.assignment.return_value = []
+    kafka_consumer._on_assign(consumer, [])
+
+    assert not kafka_consumer.running
+
+
+def _stats(partitions: dict) -> str:
+    return json.dumps(
+        {
+            "topics": {
+                "test_org.runs": {
+                    "partitions": {
+                        "-1": {"consumer_lag": -1, "hi_offset": -1},
+                        **partitions,
+                    }
+                }
+            }
+        }
+    )
+
+
+def test_stats_collector_publishes_partition_lag() -> None:
+    registry = Metrics()
+    collector = KafkaStatsCollector(registry)
+
+    collector.collect(
+        _stats(
+            {
+                "0": {"consumer_lag": 5, "hi_offset": 15, "committed_offset": 10},
+                "1": {"consumer_lag": 2, "hi_offset": 4, "committed_offset": 2},
+                "2": {"consumer_lag": -1, "hi_offset": 7, "committed_offset": -1001},
+            }
+        )
+    )
+
+    assert registry.get("kafka_consumer.lag") == 7
+    assert registry.get("kafka_consumer.lag.test_org.runs.0") == 5
+    assert registry.get("kafka_consumer.high_watermark.test_org.runs.0") == 15
+    assert registry.get("kafka_consumer.committed_offset.test_org.runs.1") == 2
+    assert registry.get("kafka_consumer.lag.test_org.runs.2") is None
+
+    collector.collect(
+        _stats({"1": {"consumer_lag": 0, "hi_offset": 4, "committed_offset": 4}})
+    )
+
+    assert registry.get("kafka_consumer.lag") == 0
+    assert registry.get("kafka_consumer.lag.test_org.runs.0") is None
+
+
+def test_stats_collector_parses_on_background_thread() -> None:
+    registry = Metrics()
+    collector = KafkaStatsCollector(registry)
+    collector.start()
+
+    collector(_stats({"0": {"consumer_lag": 3, "hi_offset": 3, "committed_offset": 0}}))
+    collector.stop()
+
+    assert registry.get("kafka_consumer.lag") == 3
+
+
+def test_processed_messages_record_rate_and_latency(monkeypatch: MonkeyPatch) -> None:
+    registry = Metrics()
+    monkeypatch.setattr("consumers.kafka_consumer.metrics", registry)
+    monkeypatch.setattr("time.time", lambda: 1713277890)
+    reporter = MetricsReporter(registry, 60)
+    kafka_consumer = KafkaConsumer(mock.Mock(), mock.MagicMock(spec=Consumer))
+
+    kafka_consumer._process_message(_message(0))
+    kafka_consumer._process_message(_message(1))
+    report = reporter.report()
+
+    assert report["kafka_consumer.processed_messages"] == 2
+    assert report["kafka_consumer.processed_messages.rate"] > 0
+    assert report["kafka_consumer.latency_ms.avg"] == 1000
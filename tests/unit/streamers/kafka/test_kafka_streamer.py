@@ -8,6 +8,9 @@ from unittest.mock import ANY, call
 import pytest
 from consumers.kafka_consumer import logger as consumer_logger
 from core.config import settings
+from processors.kafka.kafka_to_webhook_processor import KafkaToWebhookProcessor
+from processors.kafka.kafka_to_webhook_processor import logger as processor_logger
+from pytest import MonkeyPatch
 from pytest_mock import MockFixture
 from streamers.kafka.kafka_streamer import KafkaStreamer
 from streamers.kafka.kafka_streamer import logger as streamer_logger
@@ -206,3 +209,45 @@ def test_wf_node_run_stream_skips_non_agent(
             0,
             0,
         )
+
+
+@pytest.mark.parametrize("mock_requests", [{"status_code": 200}], indirect=True)
+@pytest.mark.parametrize(
+    "mock_kafka",
+    [
+        (
+            "mock_webhook_run_message",
+            {"type": "WEBHOOK", "agent": True, "url": "http://localhost:80/api/test"},
+            settings.KAFKA_RUNS_TOPIC,
+        ),
+    ],
+    indirect=True,
+)
+@pytest.mark.parametrize("mock_timestamp", [{}], indirect=True)
+def test_batch_stream_success(
+    mock_requests: None,
+    mock_kafka: None,
+    mock_timestamp: None,
+    monkeypatch: MonkeyPatch,
+    mocker: MockFixture,
+) -> None:
+    monkeypatch.setattr(settings, "KAFKA_CONSUMER_BATCH_SIZE", 10)
+    monkeypatch.setattr(settings, "KAFKA_CONSUMER_BATCH_MAX_WAIT_SECONDS", 0.01)
+    poll = mocker.spy(Consumer, "poll")
+    commit = mocker.spy(Consumer, "commit")
+    process_batch = mocker.spy(KafkaToWebhookProcessor, "msg_process_batch")
+    Timer(0.01, terminate_consumer).start()
+
+    with mock.patch.object(consumer_logger, "error") as mock_error, mock.patch.object(
+        processor_logger, "error"
+    ) as mock_processor_error:
+        streamer = KafkaStreamer(Consumer())
+        streamer.stream()
+
+        mock_error.assert_not_called()
+        mock_processor_error.assert_not_called()
+
+    poll.assert_not_called()
+    process_batch.assert_called_once()
+    # Once for the batch and once for the final offsets on shutdown
+    assert commit.call_count == 2
@@ -1,4 +1,5 @@
 from threading import Timer
+from unittest.mock import MagicMock
 
 from consumers.http_polling_consumer import HttpPollingConsumer
 
@@ -352,3 +353,40 @@ def test_http_polling_consumer_both_action_and_workflow_runs(
     assert processed_runs[0]["id"] == "run_123"
     assert len(processed_node_runs) >= 1
     assert processed_node_runs[0]["identifier"] == "wfnr_abc123"
+
+
+def test_http_polling_consumer_batch_processing_reports_failed_runs(
+    mock_claim_pending_runs: MagicMock,
+    mock_ack_runs: MagicMock,
+    mock_claim_pending_wf_node_runs: MagicMock,
+    mock_time_sleep: MagicMock,
+    mock_report_run_status: MagicMock,
+    sample_run: dict,
+) -> None:
+    failed_run = {**sample_run, "id": "run_456"}
+    mock_claim_pending_runs.return_value = [sample_run, failed_run]
+    mock_ack_runs.return_value = 1
+    batches: list[list[dict]] = []
+
+    def runs_process(runs: list[dict]) -> list[Exception | None]:
+        batches.append(runs)
+        return [None, Exception("Processing failed")]
+
+    msg_process = MagicMock()
+    consumer = HttpPollingConsumer(msg_process, runs_process=runs_process)
+
+    Timer(0.1, lambda: consumer.exit_gracefully()).start()
+    consumer.start()
+
+    assert batches[0] == [sample_run, failed_run]
+    msg_process.assert_not_called()
+    mock_report_run_status.assert_called_with(
+        "run_456",
+        {
+            "status": "FAILURE",
+            "summary": "Agent failed to process the run",
+        },
+    )
+    assert "run_123" not in [
+        call.args[0] for call in mock_report_run_status.call_args_list
+    ]
@@ -1,6 +1,8 @@
 from threading import Timer
+from typing import Any
 from unittest.mock import MagicMock, patch
 
+from invokers.webhook_invoker import InvocationResult
 from streamers.polling.polling_streamer import PollingStreamer
 
 
@@ -165,3 +167,60 @@ def test_polling_streamer_process_wf_node_run_missing_identifier(
         streamer.process_wf_node_run(node_run)
 
         mock_processor.process_wf_node_run.assert_not_called()
+
+
+@patch("streamers.polling.polling_streamer.PollingToWebhookProcessor")
+def test_polling_streamer_process_runs_skips_and_maps_errors(
+    mock_processor_class: MagicMock,
+) -> None:
+    mock_processor = MagicMock()
+    mock_processor_class.return_value = mock_processor
+    error = Exception("Processing failed")
+    mock_processor.process_runs.return_value = [
+        InvocationResult("run_1", success=True),
+        InvocationResult("run_3", error=error),
+    ]
+    payload: dict[str, Any] = {
+        "type": "WEBHOOK",
+        "url": "http://localhost:8080/webhook",
+    }
+    runs = [
+        {"id": "run_1", "payload": {**payload, "agent": True}},
+        {"id": "run_2", "payload": {**payload, "agent": False}},
+        {"id": "run_3", "payload": {**payload, "agent": True}},
+        {"payload": {**payload, "agent": True}},
+    ]
+
+    with patch("streamers.polling.polling_streamer.HttpPollingConsumer"):
+        streamer = PollingStreamer()
+        errors = streamer.process_runs(runs)
+
+    assert errors == [None, None, error, None]
+    batch = mock_processor.process_runs.call_args[0][0]
+    assert [run["id"] for run, _ in batch] == ["run_1", "run_3"]
+    assert all("agent" not in invocation_method for _, invocation_method in batch)
+
+
+@patch("streamers.polling.polling_streamer.PollingToWebhookProcessor")
+def test_polling_streamer_process_runs_isolates_malformed_runs(
+    mock_processor_class: MagicMock,
+) -> None:
+    mock_processor = MagicMock()
+    mock_processor_class.return_value = mock_processor
+    mock_processor.process_runs.return_value = [InvocationResult("run_1", success=True)]
+    runs = [
+        {
+            "id": "run_1",
+            "payload": {"type": "WEBHOOK", "url": "http://localhost", "agent": True},
+        },
+        {"id": "run_2", "payload": {"url": "http://localhost", "agent": True}},
+    ]
+
+    with patch("streamers.polling.polling_streamer.HttpPollingConsumer"):
+        streamer = PollingStreamer()
+        errors = streamer.process_runs(runs)
+
+    assert errors[0] is None
+    assert isinstance(errors[1], KeyError)
+    batch = mock_processor.process_runs.call_args[0][0]
+    assert [run["id"] for run, _ in batch] == ["run_1"]
@@ -0,0 +1,192 @@
+import threading
+from unittest import mock
+
+import port_client
+import pytest
+import requests
+from core.retry import BackoffPolicy, RetryBudget
+from port_client import PortApiRetrier
+from pytest_mock import MockFixture
+
+
+def _response(status_code: int, headers: dict | None = None) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    return response
+
+
+def _retrier(max_retries: int = 3, budget: int = 10) -> PortApiRetrier:
+    return PortApiRetrier(
+        BackoffPolicy(
+            initial_seconds=0.01, max_seconds=0.05, factor=2, jitter_factor=0
+        ),
+        RetryBudget(budget, 60),
+        max_retries,
+    )
+
+
+def _wait_for(event: threading.Event) -> None:
+    assert event.wait(5), "retry was not attempted in time"
+
+
+def test_successful_call_is_not_retried() -> None:
+    retrier = _retrier()
+    send = mock.Mock(return_value=_response(200))
+
+    assert retrier.call("PATCH", "url", send) is send.return_value
+    send.assert_called_once_with()
+    assert retrier.pending_count == 0
+
+
+def test_retries_server_error_in_background() -> None:
+    retrier = _retrier()
+    done = threading.Event()
+    responses = [_response(503), _response(200)]
+
+    def send() -> requests.Response:
+        response = responses.pop(0)
+        if not responses:
+            done.set()
+        return response
+
+    assert retrier.call("PATCH", "url", send) is None
+    _wait_for(done)
+
+
+def test_retries_connection_errors() -> None:
+    retrier = _retrier()
+    done = threading.Event()
+    attempts: list[Exception | requests.Response] = [
+        requests.ConnectionError("reset"),
+        _response(200),
+    ]
+
+    def send() -> requests.Response:
+        attempt = attempts.pop(0)
+        if isinstance(attempt, Exception):
+            raise attempt
+        done.set()
+        return attempt
+
+    assert retrier.call("PATCH", "url", send) is None
+    _wait_for(done)
+
+
+def test_does_not_retry_client_errors_or_non_idempotent_methods() -> None:
+    retrier = _retrier()
+    send = mock.Mock(return_value=_response(400))
+    assert retrier.call("PATCH", "url", send) is send.return_value
+
+    send = mock.Mock(return_value=_response(503))
+    assert retrier.call("POST", "url", send) is send.return_value
+
+    send = mock.Mock(side_effect=requests.ConnectionError("reset"))
+    with pytest.raises(requests.ConnectionError):
+        retrier.call("POST", "url", send)
+    assert retrier.pending_count == 0
+
+
+def test_gives_up_when_budget_is_exhausted() -> None:
+    retrier = _retrier(budget=0)
+    send = mock.Mock(return_value=_response(503))
+
+    assert retrier.call("PATCH", "url", send) is send.return_value
+    assert retrier.pending_count == 0
+
+
+def test_honors_retry_after_header(mocker: MockFixture) -> None:
+    retrier = _retrier()
+    retrier.policy = BackoffPolicy(0.01, 120, 2, 0)
+    mocker.patch.object(retrier, "_run")
+
+    retrier.call(
+        "PATCH", "url", mock.Mock(return_value=_response(429, {"Retry-After": "30"}))
+    )
+
+    assert retrier._pending[0].due_at - port_client.time.monotonic() > 29
+
+
+def test_newer_call_supersedes_pending_retry() -> None:
+    retrier = _retrier()
+    stale_send = mock.Mock(return_value=_response(503))
+    done = threading.Event()
+
+    def fresh_send() -> requests.Response:
+        done.set()
+        return _response(200)
+
+    with mock.patch.object(retrier, "_run"):
+        assert retrier.call("PATCH", "url", stale_send) is None
+    retrier.call("PATCH", "url", fresh_send)
+    _wait_for(done)
+
+    retrier.flush(1)
+    stale_send.assert_called_once_with()
+
+
+def test_newer_call_keeps_retries_of_other_fields() -> None:
+    retrier = _retrier()
+    retrier.policy = BackoffPolicy(60, 120, 2, 0)
+    link_send = mock.Mock(side_effect=[_response(503), _response(200)])
+    status_send = mock.Mock(side_effect=[_response(503), _response(200)])
+    fresh_status_send = mock.Mock(return_value=_response(200))
+
+    with mock.patch.object(retrier, "_run"):
+        retrier.call("PATCH", "url", link_send, frozenset({"link", "externalRunId"}))
+        retrier.call("PATCH", "url", status_send, frozenset({"status"}))
+    retrier.call("PATCH", "url", fresh_status_send, frozenset({"status", "summary"}))
+    retrier.flush(1)
+
+    assert link_send.call_count == 2
+    status_send.assert_called_once_with()
+
+
+def test_retry_thread_is_restarted_when_it_died() -> None:
+    retrier = _retrier()
+    with mock.patch.object(retrier, "_run"):
+        retrier.call(
+            "PATCH", "url", mock.Mock(side_effect=[_response(503), _response(200)])
+        )
+    assert retrier._thread is not None
+    retrier._thread.join()
+    done = threading.Event()
+    responses = iter([_response(503), _response(200)])
+
+    def send() -> requests.Response:
+        response = next(responses)
+        if response.ok:
+            done.set()
+        return response
+
+    retrier.call("PATCH", "other_url", send)
+
+    _wait_for(done)
+
+
+def test_flush_attempts_pending_retries_immediately(mocker: MockFixture) -> None:
+    retrier = _retrier()
+    retrier.policy = BackoffPolicy(60, 120, 2, 0)
+    mocker.patch.object(retrier, "_run")
+    send = mock.Mock(side_effect=[_response(503), _response(200)])
+
+    assert retrier.call("PATCH", "url", send) is None
+    retrier.flush(1)
+
+    assert send.call_count == 2
+    assert retrier.pending_count == 0
+
+
+def test_offline_mode_skips_port_api_calls(mocker: MockFixture) -> None:
+    mocker.patch.object(port_client.settings, "PORT_API_OFFLINE", True)
+    post = mocker.patch("requests.post")
+    patch = mocker.patch("requests.patch")
+
+    port_client.run_logger_factory("r_1")("A log")
+    port_client.wf_node_run_logger_factory("wfnr_1")("A log")
+
+    assert port_client.report_run_status("r_1", {"status": "SUCCESS"}) is None
+    assert port_client.report_run_response("r_1", {}) is None
+    assert port_client.report_wf_node_run_status("wfnr_1", {}) is None
+    post.assert_not_called()
+    patch.assert_not_called()
@@ -0,0 +1,71 @@
+import json
+from pathlib import Path
+
+import profile_mappings
+from core.config import Mapping
+from invokers.webhook_invoker import WebhookInvoker
+from profile_mappings import _sample_response, profile
+from pydantic import parse_obj_as
+from pytest import CaptureFixture, MonkeyPatch
+
+MAPPINGS = parse_obj_as(
+    list[Mapping],
+    [
+        {
+            "enabled": '.payload.type == "GITLAB"',
+            "url": '"http://gitlab"',
+            "body": {"ref": ".payload.ref", "broken": ".payload +", "n": ".n + 1"},
+            "report": {"link": ".response.json.url"},
+        },
+        {"enabled": True, "url": ".payload.url"},
+    ],
+)
+MESSAGES = [
+    {"payload": {"type": "GITLAB", "ref": "main"}, "n": 1},
+    {"payload": {"type": "GITLAB", "ref": "dev"}, "n": "x"},
+    {"payload": {"type": "WEBHOOK", "url": "http://webhook"}},
+]
+
+
+def test_profile_mappings() -> None:
+    profiles, find_mapping = profile(
+        MAPPINGS, MESSAGES, _sample_response({}), WebhookInvoker()
+    )
+
+    gitlab, default = profiles
+    assert (gitlab.matched, gitlab.selected) == (2, 2)
+    assert (default.matched, default.selected) == (3, 1)
+    assert len(find_mapping.durations) == 3
+    assert len(gitlab.payload.durations) == len(gitlab.report.durations) == 2
+    assert len(gitlab.payload_sizes) == 2
+    expressions = {expression.path: expression for expression in gitlab.expressions}
+    assert set(expressions) == {
+        "url",
+        "body.ref",
+        "body.broken",
+        "body.n",
+        "report.link",
+    }
+    assert expressions["body.broken"].compile_error is not None
+    assert expressions["body.n"].errors == 1
+    assert len(expressions["report.link"].timings.durations) == 2
+
+
+def test_profile_mappings_cli(
+    tmp_path: Path, monkeypatch: MonkeyPatch, capsys: CaptureFixture
+) -> None:
+    config_path = tmp_path / "config.json"
+    config_path.write_text(json.dumps([mapping.dict() for mapping in MAPPINGS]))
+    messages_path = tmp_path / "messages.jsonl"
+    messages_path.write_text("\n".join(json.dumps(msg) for msg in MESSAGES))
+    monkeypatch.setattr(
+        "sys.argv",
+        ["profile_mappings.py", str(messages_path), "--config", str(config_path)],
+    )
+
+    profile_mappings.main()
+
+    output = capsys.readouterr().out
+    assert "2 mappings, 3 messages" in output
+    assert "matched 2/3 messages (67%), selected for 2" in output
+    assert "body.broken: compile error" in output
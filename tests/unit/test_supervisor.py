@@ -0,0 +1,167 @@
+import signal
+import time
+from types import SimpleNamespace
+from typing import Any
+from unittest import mock
+
+import pytest
+from core.config import settings
+from pytest_mock import MockFixture
+from supervisor import WorkerSupervisor, _Worker
+
+
+class FakeProcess:
+    def __init__(self, alive: bool = True, exitcode: int | None = None) -> None:
+        self.alive = alive
+        self.exitcode = exitcode
+        self.name = "fake-worker"
+        self.pid = 1
+        self.killed = False
+
+    def start(self) -> None:
+        pass
+
+    def is_alive(self) -> bool:
+        return self.alive
+
+    def kill(self) -> None:
+        self.killed = True
+        self.alive = False
+
+    def terminate(self) -> None:
+        self.alive = False
+
+    def join(self, timeout: Any = None) -> None:
+        pass
+
+
+@pytest.fixture
+def supervisor(mocker: MockFixture) -> WorkerSupervisor:
+    mocker.patch("signal.signal")
+    return WorkerSupervisor(2)
+
+
+def _running_worker(process: FakeProcess, heartbeat: float) -> _Worker:
+    return _Worker(
+        worker_id=0,
+        process=process,  # type: ignore[arg-type]
+        heartbeat_value=SimpleNamespace(value=heartbeat),
+        started_at=time.time(),
+    )
+
+
+def test_starts_pending_workers(supervisor: WorkerSupervisor) -> None:
+    with mock.patch.object(supervisor, "_start_worker") as start_worker:
+        now = time.time()
+        for worker in supervisor.workers:
+            supervisor._check_worker(worker, now)
+
+    assert start_worker.call_count == 2
+
+
+def test_restarts_crashed_worker_with_backoff(supervisor: WorkerSupervisor) -> None:
+    now = time.time()
+    worker = _running_worker(FakeProcess(alive=False, exitcode=1), now)
+
+    supervisor._check_worker(worker, now)
+    assert worker.process is None
+    assert worker.next_start_at == now + 1
+
+    worker.process = FakeProcess(alive=False, exitcode=-9)  # type: ignore
+    supervisor._check_worker(worker, now)
+    assert worker.next_start_at == now + 2
+
+    with mock.patch.object(supervisor, "_start_worker") as start_worker:
+        supervisor._check_worker(worker, now + 1)
+        start_worker.assert_not_called()
+        supervisor._check_worker(worker, now + 2)
+        start_worker.assert_called_once_with(worker)
+
+
+def test_restarted_worker_gets_fresh_kafka_credentials(
+    supervisor: WorkerSupervisor, mocker: MockFixture
+) -> None:
+    get_kafka_credentials = mocker.patch(
+        "supervisor.get_kafka_credentials",
+        side_effect=[Exception("Port is down"), (["broker"], "user", "rotated")],
+    )
+    mocker.patch.object(supervisor.context, "Process", return_value=FakeProcess())
+    supervisor.kafka_credentials = (["broker"], "user", "expired")
+    now = time.time()
+    worker = _running_worker(FakeProcess(alive=False, exitcode=1), now)
+    supervisor._check_worker(worker, now)
+
+    supervisor._check_worker(worker, now + 1)
+    assert worker.process is None
+    assert worker.next_start_at == now + 3
+
+    supervisor._check_worker(worker, now + 3)
+    assert get_kafka_credentials.call_count == 2
+    assert supervisor.context.Process.call_args.kwargs["args"][2] == (
+        ["broker"],
+        "user",
+        "rotated",
+    )
+
+
+def test_does_not_restart_gracefully_exited_worker(
+    supervisor: WorkerSupervisor,
+) -> None:
+    now = time.time()
+    worker = _running_worker(FakeProcess(alive=False, exitcode=0), now)
+
+    supervisor._check_worker(worker, now)
+
+    assert worker.finished
+    with mock.patch.object(supervisor, "_start_worker") as start_worker:
+        supervisor._check_worker(worker, now + 100)
+        start_worker.assert_not_called()
+
+
+def test_kills_worker_with_stale_heartbeat(supervisor: WorkerSupervisor) -> None:
+    now = time.time()
+    process = FakeProcess()
+    worker = _running_worker(
+        process, now - settings.WORKERS_HEARTBEAT_TIMEOUT_SECONDS - 1
+    )
+
+    supervisor._check_worker(worker, now)
+
+    assert process.killed
+    assert worker.process is None
+
+
+def test_keeps_healthy_worker(supervisor: WorkerSupervisor) -> None:
+    now = time.time()
+    process = FakeProcess()
+    worker = _running_worker(process, now)
+
+    supervisor._check_worker(worker, now)
+
+    assert not process.killed
+    assert worker.process is process
+
+
+def test_stops_all_workers_on_exit(supervisor: WorkerSupervisor) -> None:
+    processes = [FakeProcess(), FakeProcess()]
+    for worker, process in zip(supervisor.workers, processes):
+        worker.process = process  # type: ignore[assignment]
+
+    supervisor._stop_workers()
+
+    assert not any(process.is_alive() for process in processes)
+
+
+def test_forwards_profile_requests_to_running_workers(
+    supervisor: WorkerSupervisor, mocker: MockFixture
+) -> None:
+    kill = mocker.patch("supervisor.os.kill")
+    supervisor.workers[0].process = FakeProcess()  # type: ignore[assignment]
+    supervisor.workers[1].process = FakeProcess(alive=False)  # type: ignore
+
+    assert supervisor.request_profile()
+
+    kill.assert_called_once_with(1, signal.SIGUSR1)
+
+    supervisor.workers[0].process = None
+    assert not supervisor.request_profile()